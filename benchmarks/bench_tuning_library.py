@@ -0,0 +1,374 @@
+"""
+Benchmarks for tuning_library.
+
+Can be run as
+
+    $ python3 bench_tuning_library.py
+
+which times each benchmark and prints a table of results. Results can be saved
+as JSON with --output and compared against a previous run with --compare, for
+example to check a change for performance regressions
+
+    $ git checkout main && pip install . && python3 bench_tuning_library.py -o main.json
+    $ git checkout my-branch && pip install . && python3 bench_tuning_library.py -c main.json
+
+Benchmarks can be selected by passing substrings of their names, e.g.
+
+    $ python3 bench_tuning_library.py parse tuning_init
+
+The full set of command line options is shown by running
+
+    $ python3 bench_tuning_library.py --help
+
+Example output:
+
+    $ python3 bench_tuning_library.py parse_scl -c main.json
+    benchmark                               min          median       loops     change
+    parse_scl_data[12]                      9.58 us      9.66 us      10000     0.98x
+    parse_scl_data[31]                      25.14 us     25.30 us     1000      1.01x
+    parse_scl_data[128]                     110.86 us    114.54 us    1000      0.99x
+    parse_scl_data[311]                     232.84 us    234.28 us    100       1.02x
+    parse_scl_data[1024]                    853.47 us    868.04 us    100       1.00x
+
+"""
+
+import argparse
+import functools
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import timeit
+from fractions import Fraction
+from pathlib import Path
+
+import tuning_library as tl
+
+SCALE_SIZES = (12, 31, 128, 311, 1024)
+ARCHIVE_SIZE = 500
+SIMILARITY_SIZE = 100_000
+
+KBM_TEXT = """! test.kbm
+12
+0
+127
+60
+69
+440.0
+12
+0
+1
+2
+3
+4
+5
+6
+7
+8
+9
+10
+11
+"""
+
+
+def ji_scale_text(count):
+    """SCL text for a scale of `count` harmonics over the octave."""
+    tones = sorted(set(Fraction(count + i, count) for i in range(1, count + 1)))
+    lines = [f"! harmonics_{count}.scl", f"Harmonics {count} to {2 * count}"]
+    lines.append(f" {len(tones)}")
+    lines.append("!")
+    lines.extend(f" {t.numerator}/{t.denominator}" for t in tones)
+    return "\n".join(lines) + "\n"
+
+
+def edo_subset_scales(size, seed=0):
+    """`size` scales of random subsets of the steps of equal temperaments."""
+    rng = random.Random(seed)
+    scales = []
+    for _ in range(size):
+        edo = rng.randrange(5, 73)
+        steps = sorted(rng.sample(range(1, edo), rng.randrange(1, min(edo, 25))))
+        lines = ["! subset.scl", f"{len(steps)} of {edo} equal", f" {len(steps) + 1}", "!"]
+        lines.extend(f" {1200 * s / edo:.5f}" for s in steps)
+        lines.append(" 2/1")
+        scales.append(tl.parse_scl_data("\n".join(lines) + "\n"))
+    return scales
+
+
+def write_archive(directory, size=ARCHIVE_SIZE):
+    """Write a synthetic archive of `size` scl files, alternating EDOs and JI."""
+    directory = Path(directory)
+    for i in range(size):
+        count = 5 + i % 60
+        if i % 2:
+            text = tl.even_division_of_span_by_m(2 + i // 2 % 2, count).raw_text
+        else:
+            text = ji_scale_text(count)
+        (directory / f"scale_{i:05d}.scl").write_text(text)
+    return sorted(directory.glob("scale_*.scl"))
+
+
+def get_benchmarks(archive_dir):
+    """
+    Build the benchmarks to run.
+
+    Returns
+    -------
+    dict of str to callable
+        Benchmark name and a zero argument callable timing one operation.
+    """
+    benchmarks = {}
+
+    kbm_text = KBM_TEXT
+    benchmarks["parse_kbm_data"] = lambda: tl.parse_kbm_data(kbm_text)
+
+    for size in SCALE_SIZES:
+        scale = tl.even_division_of_span_by_m(2, size)
+        text = scale.raw_text
+        benchmarks[f"parse_scl_data[{size}]"] = lambda text=text: tl.parse_scl_data(
+            text
+        )
+        data = text.encode()
+        benchmarks[f"parse_scl_data_bytes[{size}]"] = (
+            lambda data=data: tl.parse_scl_data(data)
+        )
+        benchmarks[f"even_division_of_span_by_m[{size}]"] = (
+            lambda size=size: tl.even_division_of_span_by_m(2, size)
+        )
+        benchmarks[f"tuning_init[{size}]"] = lambda scale=scale: tl.Tuning(scale)
+        benchmarks[f"scale_tones[{size}]"] = lambda scale=scale: scale.tones
+
+    divisions = list(range(5, 1001))
+    benchmarks["even_divisions_of_span_by_m[5-1000]"] = (
+        lambda: tl.even_divisions_of_span_by_m(2, divisions)
+    )
+    frequencies = [400 + i / 100 for i in range(10000)]
+    benchmarks["tune_notes_to[10000]"] = lambda: tl.tune_notes_to(69, frequencies)
+
+    mapping = tl.parse_kbm_data(kbm_text)
+    scale = tl.even_division_of_span_by_m(2, 12)
+    benchmarks["tuning_init_with_mapping"] = lambda: tl.Tuning(scale, mapping)
+
+    tuning = tl.Tuning(tl.even_division_of_span_by_m(2, 31))
+    benchmarks["frequency_for_midi_note"] = lambda: tuning.frequency_for_midi_note(69)
+    benchmarks["frequency_for_midi_note[x128]"] = lambda: [
+        tuning.frequency_for_midi_note(i) for i in range(128)
+    ]
+    benchmarks["log_scaled_frequency_for_midi_note"] = (
+        lambda: tuning.log_scaled_frequency_for_midi_note(69)
+    )
+    benchmarks["scale_position_for_midi_note"] = (
+        lambda: tuning.scale_position_for_midi_note(69)
+    )
+    benchmarks["tuning_scale"] = lambda: tuning.scale
+    benchmarks["grid_layout[9x9]"] = lambda: tl.grid_layout(
+        tuning, 9, 9, 1, 5, first_note=11, row_stride=10
+    )
+
+    scl_files = sorted(Path(archive_dir).glob("scale_*.scl"))
+    scl_file = Path(archive_dir) / "12edo.scl"
+    kbm_file = Path(archive_dir) / "mapping.kbm"
+    benchmarks["read_scl_file"] = lambda: tl.read_scl_file(scl_file)
+    benchmarks["read_kbm_file"] = lambda: tl.read_kbm_file(kbm_file)
+    benchmarks["scala_files_to_frequencies"] = lambda: tl.scala_files_to_frequencies(
+        scl_file
+    )
+    benchmarks["scala_files_to_frequencies_with_kbm"] = (
+        lambda: tl.scala_files_to_frequencies(scl_file, kbm_file)
+    )
+    benchmarks[f"archive_read_scl_files[{len(scl_files)}]"] = lambda: [
+        tl.read_scl_file(fn) for fn in scl_files
+    ]
+    benchmarks[f"archive_to_frequencies[{len(scl_files)}]"] = lambda: [
+        tl.scala_files_to_frequencies(fn) for fn in scl_files
+    ]
+
+    # Built on first use, so runs of other benchmarks don't pay for it
+    @functools.lru_cache(maxsize=None)
+    def similarity_index():
+        scales = edo_subset_scales(SIMILARITY_SIZE)
+        return scales, tl.SimilarityIndex(scales)
+
+    target = tl.read_scl_file(scl_file)
+    size = SIMILARITY_SIZE
+    benchmarks[f"scale_features[{size}]"] = lambda: tl.scale_features(
+        similarity_index()[0]
+    )
+    benchmarks[f"similarity_query[{size}]"] = lambda: similarity_index()[1].query(
+        target
+    )
+    benchmarks[f"similarity_query_exact[{size}]"] = lambda: similarity_index()[1].query(
+        target, max_leaves=None
+    )
+
+    deviation_tunings = [
+        tl.Tuning(s) for s in tl.even_divisions_of_span_by_m(2, range(5, 505))
+    ]
+    size = len(deviation_tunings)
+    benchmarks[f"tuning_deviations[{size}]"] = lambda: tl.tuning_deviations(
+        tuning, deviation_tunings
+    )
+    benchmarks[f"tuning_deviation_matrix[{size}x{size}]"] = (
+        lambda: tl.tuning_deviation_matrix(deviation_tunings)
+    )
+
+    bank_tunings = {
+        channel: tl.Tuning(tl.even_division_of_span_by_m(2, 12 + channel))
+        for channel in range(16)
+    }
+    bank = tl.TuningBank(list(bank_tunings.values()))
+    events = [(i % 16, (i * 7) % 128) for i in range(1000)]
+    channels = [c for c, _ in events]
+    notes = [n for _, n in events]
+    benchmarks["tuning_dict_lookup[x1000]"] = lambda: [
+        bank_tunings[c].frequency_for_midi_note(n) for c, n in events
+    ]
+    benchmarks["tuning_bank_frequencies[x1000]"] = lambda: bank.frequencies(
+        channels, notes
+    )
+    benchmarks["tuning_bank_swap"] = lambda: bank.swap(0, tuning)
+
+    # Each of these starts a new interpreter, so compare them against
+    # python_startup to get the time spent importing
+    def run_python(code):
+        return lambda: subprocess.run([sys.executable, "-c", code], check=True)
+
+    benchmarks["python_startup"] = run_python("pass")
+    benchmarks["import_tuning_library"] = run_python("import tuning_library")
+    benchmarks["import_and_read_scl_file"] = run_python(
+        f"import tuning_library as tl; tl.read_scl_file({str(scl_file)!r})"
+    )
+
+    return benchmarks
+
+
+def time_benchmark(func, repeat, min_time):
+    """
+    Time `func`, returning statistics of the time per call in seconds.
+    """
+    # Call once first, so setup done on first use isn't timed
+    func()
+    timer = timeit.Timer(func)
+    loops = 1
+    while True:
+        if timer.timeit(loops) >= min_time:
+            break
+        loops *= 10
+    times = [t / loops for t in timer.repeat(repeat=repeat, number=loops)]
+    return {
+        "min": min(times),
+        "median": statistics.median(times),
+        "mean": statistics.mean(times),
+        "stdev": statistics.stdev(times) if len(times) > 1 else 0.0,
+        "loops": loops,
+        "repeat": repeat,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def metadata():
+    return {
+        "git_revision": git_revision(),
+        "python": sys.version,
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+    }
+
+
+def format_time(seconds):
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f} {unit}"
+    return f"{seconds / 1e-9:.2f} ns"
+
+
+def print_results(results, baseline=None):
+    header = f"{'benchmark':<40}{'min':<13}{'median':<13}{'loops':<10}"
+    if baseline is not None:
+        header += "change"
+    print(header)
+    for name, r in results.items():
+        line = (
+            f"{name:<40}{format_time(r['min']):<13}"
+            f"{format_time(r['median']):<13}{r['loops']:<10}"
+        )
+        if baseline is not None and name in baseline:
+            line += f"{r['median'] / baseline[name]['median']:.2f}x"
+        print(line)
+
+
+def run(patterns=(), repeat=5, min_time=0.2):
+    """
+    Run benchmarks whose names contain any of `patterns` (all by default).
+
+    Returns
+    -------
+    dict
+        Machine readable results, with run metadata under "meta" and the timing
+        statistics for each benchmark (seconds per call) under "benchmarks".
+    """
+    with tempfile.TemporaryDirectory() as archive_dir:
+        write_archive(archive_dir)
+        (Path(archive_dir) / "mapping.kbm").write_text(KBM_TEXT)
+        (Path(archive_dir) / "12edo.scl").write_text(
+            tl.even_temperament_12_note_scale().raw_text
+        )
+        benchmarks = get_benchmarks(archive_dir)
+        results = {}
+        for name, func in benchmarks.items():
+            if patterns and not any(p in name for p in patterns):
+                continue
+            results[name] = time_benchmark(func, repeat, min_time)
+    return {"meta": metadata(), "benchmarks": results}
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description="Benchmark tuning_library")
+    parser.add_argument(
+        "patterns", nargs="*", help="Only run benchmarks with names containing these"
+    )
+    parser.add_argument("--output", "-o", help="Write JSON results to this file")
+    parser.add_argument(
+        "--compare", "-c", help="JSON results from a previous run to compare against"
+    )
+    parser.add_argument(
+        "--repeat", "-r", type=int, default=5, help="Number of timing repeats"
+    )
+    parser.add_argument(
+        "--min-time",
+        type=float,
+        default=0.2,
+        help="Minimum time in seconds for each timing repeat",
+    )
+    return parser
+
+
+def main():
+    args = get_parser().parse_args()
+    results = run(args.patterns, args.repeat, args.min_time)
+    baseline = None
+    if args.compare is not None:
+        baseline = json.loads(Path(args.compare).read_text())["benchmarks"]
+    print_results(results["benchmarks"], baseline)
+    if args.output is not None:
+        Path(args.output).write_text(json.dumps(results, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Find duplicate scales in a directory of scl files.
+
+Can be run as
+
+    $ python3 duplicates.py
+
+to find all scl files in the current directory (and subdirectories) which are
+the same scale as some other scl file, where a scale is the same as all of its
+modes. Prints each group of duplicate scales on one line. A directory can be
+specified with --scale-dir.
+
+To only count scales with exactly the same tones as duplicates, and not modes
+of each other, run
+
+    $ python3 duplicates.py --exact
+
+The cent resolution for comparing steps can be set as follows:
+
+    $ python3 duplicates.py --resolution 0.01
+
+Example output for a directory containing 12 equal and 19 equal scales, and
+some scales and modes of 5-limit just intonation major:
+
+    $ python3 duplicates.py --scale-dir scl | column -t
+    scl/12tet.scl   scl/ed2-12.scl
+    scl/dorian.scl  scl/ionian.scl  scl/major.scl
+
+    $ python3 duplicates.py --scale-dir scl --exact | column -t
+    scl/12tet.scl   scl/ed2-12.scl
+    scl/ionian.scl  scl/major.scl
+
+"""
+
+import argparse
+from collections import defaultdict
+from pathlib import Path
+
+import tuning_library as tl
+
+
+def find_duplicate_scales(scale_directory=None, mode_invariant=True, resolution=1e-3):
+    """
+    Find groups of duplicate scales.
+
+    Parameters
+    ----------
+    scale_directory : str or Path, optional
+        Directory to search for scl files. Defaults to the current directory.
+    mode_invariant : bool, optional
+        Whether modes of a scale count as duplicates of the scale.
+    resolution : float, optional
+        Cent resolution for comparing steps when `mode_invariant` is True.
+
+    Returns
+    -------
+    list of list of tuning_library.Scale
+        Groups of two or more duplicate scales.
+    """
+    directory = Path(scale_directory) if scale_directory is not None else Path.cwd()
+    scales = [tl.read_scl_file(fn) for fn in sorted(directory.rglob("*.scl"))]
+    labels = tl.scale_equivalence_classes(scales, mode_invariant, resolution)
+    groups = defaultdict(list)
+    for scale, label in zip(scales, labels):
+        groups[label].append(scale)
+    return [group for group in groups.values() if len(group) > 1]
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description="Find duplicate scales")
+    parser.add_argument(
+        "--scale-dir", "-s", help="Directory containing scl files to search"
+    )
+    parser.add_argument(
+        "--exact",
+        "-e",
+        action="store_true",
+        help="Only count scales with the same tones as duplicates, not modes",
+    )
+    parser.add_argument(
+        "--resolution",
+        "-r",
+        type=float,
+        default=1e-3,
+        help="Resolution in cents for comparing steps",
+    )
+    return parser
+
+
+def main():
+    args = get_parser().parse_args()
+    groups = find_duplicate_scales(args.scale_dir, not args.exact, args.resolution)
+    for group in groups:
+        print("\t".join(scale.name for scale in group))
+
+
+if __name__ == "__main__":
+    main()
@@ -44,23 +44,17 @@ def map_scale(scale, x, y, t, base_freq):
     mapping = tl.start_scale_on_and_tune_note_to(0, 0, base_freq)
     tuning = tl.Tuning(scale, mapping)
 
-    frequencies = []
-    degrees = {}
-    for n in range(128):
-        # With t=0, bottom left key (midi note 11) should map to degree 0
-        j, i = divmod(n, 10)
-        d = (i - 1) * x + (j - 1) * y + t
-        frequencies.append(tuning.frequency_for_midi_note(d))
-        degrees[i, j] = d % scale.count
+    # With t=0, bottom left key (midi note 11) should map to degree 0
+    layout = tl.grid_layout(tuning, 9, 9, x, y, t, first_note=11, row_stride=10)
 
     labels = [" 1/1"] + [t.string_rep for t in scale.tones]
     print()
-    for j in range(9, 0, -1):
-        print("\t".join(labels[degrees[i, j]] for i in range(1, 10)))
+    for row in layout["labels"][::-1]:
+        print("\t".join(labels[i] for i in row))
     print()
 
     with mts.Master():
-        mts.set_note_tunings(frequencies)
+        mts.set_note_tunings(layout["note_frequencies"].tolist())
         signal.pause()
 
 
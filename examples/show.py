@@ -31,28 +31,22 @@ Example output:
 """
 
 import argparse
-import math
 from fractions import Fraction
 
 import tuning_library as tl
 
 
-def freq_mult(tone):
-    if tone.type == tl.Type.kToneRatio:
-        return Fraction(tone.ratio_n, tone.ratio_d)
-    return 2 ** (tone.cents / 1200)
+def get_table(method):
+    """Cents, ratio numerators and ratio denominators from a Scale table method."""
+    return (method(), *method(exact=True))
 
 
-def get_freq_mults(scale):
-    return [Fraction(1)] + [freq_mult(t) for t in scale.tones]
+def ratio_str(cents, numerator, denominator):
+    return str(Fraction(int(numerator), int(denominator))) if denominator else "."
 
 
-def ratio_str(x):
-    return str(x) if isinstance(x, Fraction) else "."
-
-
-def cents_str(x):
-    return str(int(round(1200 * math.log2(x))))
+def cents_str(cents, numerator, denominator):
+    return str(int(round(cents)))
 
 
 FORMATTERS = (ratio_str, cents_str)
@@ -60,37 +54,34 @@ FORMATTERS = (ratio_str, cents_str)
 SEP = "\t"
 
 
-def print_steps(freq_mults, formatters=FORMATTERS):
+def format_row(f, row, sep=SEP):
+    return sep.join(f(*x) for x in zip(*row))
+
+
+def print_steps(scale, formatters=FORMATTERS):
     print()
-    steps = [x / y for x, y in zip(freq_mults[1:], freq_mults)]
+    pitches = [x[0] for x in get_table(scale.interval_matrix)]
+    steps = get_table(scale.step_vector)
     for f in formatters:
-        print((2 * SEP).join(map(f, freq_mults)))
+        print(format_row(f, pitches, 2 * SEP))
     for f in formatters:
-        print(SEP + (2 * SEP).join(f(x) for x in steps))
+        print(SEP + format_row(f, steps, 2 * SEP))
     print()
 
 
-def print_interval_table(freq_mults, formatters=FORMATTERS):
+def print_interval_table(scale, formatters=FORMATTERS):
     print()
-    for x in freq_mults:
-        intervals = [y / x for y in freq_mults]
+    for row in zip(*get_table(scale.interval_matrix)):
         for f in formatters:
-            print(SEP.join(map(f, intervals)))
+            print(format_row(f, row))
         print()
 
 
-def rotate(freq_mults, n):
-    period = freq_mults[-1]
-    new_freq_mults = freq_mults[n:-1] + [period * x for x in freq_mults[:n]]
-    return [x / new_freq_mults[0] for x in new_freq_mults] + [period]
-
-
-def print_modes(freq_mults, formatters=FORMATTERS):
+def print_modes(scale, formatters=FORMATTERS):
     print()
-    for i in range(len(freq_mults) - 1):
-        mode = rotate(freq_mults, i)
+    for mode in zip(*get_table(scale.modes)):
         for f in formatters:
-            print(SEP.join(map(f, mode)))
+            print(format_row(f, mode))
         print()
 
 
@@ -122,7 +113,6 @@ def get_parser():
 def main():
     args = get_parser().parse_args()
     scale = tl.read_scl_file(args.scl_filename)
-    freq_mults = get_freq_mults(scale)
 
     if args.ratios_only:
         formatters = (ratio_str,)
@@ -141,7 +131,7 @@ def main():
         printers = (print_steps, print_interval_table, print_modes)
 
     for p in printers:
-        p(freq_mults, formatters)
+        p(scale, formatters)
 
 
 if __name__ == "__main__":
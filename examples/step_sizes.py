@@ -35,14 +35,14 @@ import tuning_library as tl
 
 def find_scales_with_stepsize_count(count, scale_directory=None, rounding=3):
     directory = Path(scale_directory) if scale_directory is not None else Path.cwd()
+    scales = [tl.read_scl_file(fn) for fn in directory.rglob("*.scl")]
+    signatures = tl.step_size_signatures(scales, tolerance=10**-rounding)
+    offsets = signatures["offsets"]
     results = []
-    for fn in directory.rglob("*.scl"):
-        scale = tl.read_scl_file(fn)
-        tuning = tl.Tuning(scale)
-        xs = [1200 * tuning.log_scaled_frequency_for_midi_note(i) for i in range(128)]
-        step_sizes = sorted(set(round(x - y, rounding) for x, y in zip(xs[1:], xs)))
-        if len(step_sizes) == count:
-            results.append((scale, step_sizes))
+    for i, n in enumerate(signatures["num_sizes"]):
+        if n == count:
+            sizes = signatures["sizes"][offsets[i] : offsets[i + 1]]
+            results.append((scales[i], [round(float(x), rounding) for x in sizes]))
     return results
 
 
@@ -1,15 +1,55 @@
+import importlib
+import os
+
 from ._tuning_library import *
 from ._tuning_library import _read_scl_file, _read_kbm_file
 
-# Allow calling read_scl_file and read_kbm_file with Path arguments
+# Submodules which import numpy or other slow to import modules are loaded on
+# first use, so importing tuning_library stays fast. Maps each lazily loaded
+# name to the submodule defining it.
+_LAZY_ATTRIBUTES = {
+    "iter_archive": "archive",
+    "iter_kbm_archive": "archive",
+    "iter_scl_archive": "archive",
+    "CompactScales": "compact",
+    "export_frequencies": "export",
+    "JIIndex": "ji",
+    "TuningClient": "serve",
+    "SimilarityIndex": "similarity",
+    "DirectoryWatcher": "watch",
+}
+_LAZY_SUBMODULES = {"archive", "compact", "export", "ji", "serve", "similarity", "watch"}
+
+
+def __getattr__(name):
+    if name in _LAZY_SUBMODULES:
+        return importlib.import_module(f".{name}", __name__)
+    if name in _LAZY_ATTRIBUTES:
+        module = importlib.import_module(f".{_LAZY_ATTRIBUTES[name]}", __name__)
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | _LAZY_ATTRIBUTES.keys() | _LAZY_SUBMODULES)
+
+
+# Allow calling read_scl_file and read_kbm_file with Path arguments, or with
+# an mmap or other bytes like object holding the contents of a file
 
 
 def read_scl_file(fname):
-    return _read_scl_file(str(fname))
+    if isinstance(fname, (str, os.PathLike)):
+        return _read_scl_file(str(fname))
+    return parse_scl_data(fname)
 
 
 def read_kbm_file(fname):
-    return _read_kbm_file(str(fname))
+    if isinstance(fname, (str, os.PathLike)):
+        return _read_kbm_file(str(fname))
+    return parse_kbm_data(fname)
 
 
 def scala_files_to_frequencies(scl_filename, kbm_filename=None):
@@ -0,0 +1,26 @@
+"""
+Command line tools, run as ``python -m tuning_library <command>``.
+
+export
+    Write the frequency tables of scl files to a npy, csv or binary file.
+serve
+    Serve tuning frequency tables over a Unix domain socket.
+"""
+
+import importlib
+import sys
+
+COMMANDS = {"export": "export", "serve": "serve"}
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or argv[0] not in COMMANDS:
+        print(__doc__.strip(), file=sys.stderr)
+        sys.exit(0 if argv and argv[0] in ("-h", "--help") else 2)
+    module = importlib.import_module(f".{COMMANDS[argv[0]]}", __package__)
+    module.main(argv[1:])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,440 @@
+#pragma once
+
+#include <algorithm>
+#include <cstdint>
+#include <cmath>
+#include <cstddef>
+#include <cstring>
+#include <functional>
+#include <limits>
+#include <map>
+#include <numeric>
+#include <string>
+#include <vector>
+#include "Tunings.h"
+
+/*
+ * Structural computations on scales which would otherwise be done in Python
+ * one tone at a time.
+ *
+ * A scale of count tones has count + 1 pitches, the unison 1/1 followed by the
+ * tones, and the last tone is the period of the scale.
+ */
+namespace analysis
+{
+
+// An exact ratio, with d == 0 marking a value which is not an exact ratio
+struct Ratio
+{
+    int64_t n{1}, d{1};
+    bool exact() const { return d != 0; }
+};
+
+inline constexpr Ratio inexact{0, 0};
+
+inline bool mul_overflows(int64_t a, int64_t b)
+{
+    constexpr auto hi = std::numeric_limits<int64_t>::max();
+    constexpr auto lo = std::numeric_limits<int64_t>::min();
+    if (a > 0)
+        return b > 0 ? a > hi / b : b < lo / a;
+    return b > 0 ? a < lo / b : (a != 0 && b < hi / a);
+}
+
+inline int64_t checked_mul(int64_t a, int64_t b)
+{
+    if (mul_overflows(a, b))
+        throw Tunings::TuningError("Ratio of " + std::to_string(a) + " * " + std::to_string(b) +
+                                   " does not fit in 64 bits");
+    return a * b;
+}
+
+inline Ratio reduced(int64_t n, int64_t d)
+{
+    if (d == 0)
+        return inexact;
+    auto g = std::gcd(n, d);
+    if (d < 0)
+        g = -g;
+    return {n / g, d / g};
+}
+
+inline Ratio multiply(Ratio a, Ratio b)
+{
+    if (!a.exact() || !b.exact())
+        return inexact;
+    // Cancel common factors first to keep the products small
+    auto g1 = std::gcd(a.n, b.d), g2 = std::gcd(b.n, a.d);
+    return reduced(checked_mul(a.n / g1, b.n / g2), checked_mul(a.d / g2, b.d / g1));
+}
+
+inline Ratio divide(Ratio a, Ratio b)
+{
+    if (!b.exact() || b.n == 0)
+        return inexact;
+    return multiply(a, {b.d, b.n});
+}
+
+inline std::vector<double> pitch_cents(const Tunings::Scale &s)
+{
+    std::vector<double> c(s.tones.size() + 1, 0.0);
+    for (size_t i = 0; i < s.tones.size(); i++)
+        c[i + 1] = s.tones[i].cents;
+    return c;
+}
+
+inline std::vector<Ratio> pitch_ratios(const Tunings::Scale &s)
+{
+    std::vector<Ratio> r(s.tones.size() + 1);
+    for (size_t i = 0; i < s.tones.size(); i++)
+    {
+        const auto &t = s.tones[i];
+        r[i + 1] = t.type == Tunings::Tone::kToneRatio ? reduced(t.ratio_n, t.ratio_d) : inexact;
+    }
+    return r;
+}
+
+/*
+ * The value of pitch k of mode i, i.e. the interval from pitch i up to pitch
+ * i + k, wrapping around the period, for 0 <= i < count and 0 <= k <= count.
+ * The last pitch of every mode is the period.
+ */
+template <typename T, typename Div, typename Mul>
+T mode_interval(const std::vector<T> &p, size_t i, size_t k, Div div, Mul mul)
+{
+    auto n = p.size() - 1;
+    auto j = i + k;
+    if (k == n)
+        return div(p[n], p[0]);
+    if (j <= n)
+        return div(p[j], p[i]);
+    return div(mul(p[n], p[j - n]), p[i]);
+}
+
+enum Table
+{
+    kSteps,     // count steps between successive pitches
+    kIntervals, // (count + 1) x (count + 1) intervals from pitch i to pitch j
+    kModes      // count x (count + 1) pitches of the mode starting on pitch i
+};
+
+inline std::vector<std::ptrdiff_t> table_shape(size_t count, Table t)
+{
+    auto n = static_cast<std::ptrdiff_t>(count);
+    switch (t)
+    {
+    case kSteps:
+        return {n};
+    case kIntervals:
+        return {n + 1, n + 1};
+    case kModes:
+        return {n, n + 1};
+    }
+    return {};
+}
+
+/*
+ * Fill out, which must hold the number of elements given by table_shape, with
+ * table t of pitches p, where div and mul give the interval between and the
+ * stacking of two values.
+ */
+template <typename T, typename Div, typename Mul>
+void fill_table(const std::vector<T> &p, Table t, T *out, Div div, Mul mul)
+{
+    auto n = p.size() - 1;
+    switch (t)
+    {
+    case kSteps:
+        for (size_t k = 0; k < n; k++)
+            out[k] = div(p[k + 1], p[k]);
+        break;
+    case kIntervals:
+        for (size_t i = 0; i <= n; i++)
+            for (size_t j = 0; j <= n; j++)
+                out[i * (n + 1) + j] = div(p[j], p[i]);
+        break;
+    case kModes:
+        for (size_t i = 0; i < n; i++)
+            for (size_t k = 0; k <= n; k++)
+                out[i * (n + 1) + k] = mode_interval(p, i, k, div, mul);
+        break;
+    }
+}
+
+enum StepSizeClass
+{
+    kStepsEmpty,      // a scale with no tones
+    kStepsEqual,      // one step size
+    kStepsWellFormed, // two step sizes with two sizes of every interval class
+    kStepsMOS,        // two step sizes with at most two sizes of every interval class
+    kStepsTwoSizes,   // two step sizes which don't form a MOS
+    kStepsMultiple    // three or more step sizes
+};
+
+struct StepSignature
+{
+    std::vector<double> sizes;   // distinct step sizes in cents, increasing
+    std::vector<int64_t> counts; // number of steps of each size
+    StepSizeClass classification{kStepsEmpty};
+};
+
+/*
+ * Group values into clusters where every value is within tolerance of the
+ * smallest value in its cluster, returning the mean and size of each cluster.
+ */
+inline void cluster(std::vector<double> values, double tolerance, std::vector<double> &means,
+                    std::vector<int64_t> &counts)
+{
+    means.clear();
+    counts.clear();
+    std::sort(values.begin(), values.end());
+    size_t start = 0;
+    for (size_t i = 1; i <= values.size(); i++)
+    {
+        if (i == values.size() || values[i] - values[start] > tolerance)
+        {
+            double sum = 0;
+            for (size_t j = start; j < i; j++)
+                sum += values[j];
+            means.push_back(sum / (i - start));
+            counts.push_back(static_cast<int64_t>(i - start));
+            start = i;
+        }
+    }
+}
+
+/*
+ * Number of distinct sizes, within tolerance per step, of the intervals
+ * spanning k steps of the scale, starting from each pitch and wrapping
+ * around the period.
+ */
+inline size_t interval_class_sizes(const std::vector<double> &steps, size_t k, double tolerance)
+{
+    auto n = steps.size();
+    std::vector<double> intervals(n), means;
+    std::vector<int64_t> counts;
+    double x = 0;
+    for (size_t j = 0; j < k; j++)
+        x += steps[j];
+    for (size_t i = 0; i < n; i++)
+    {
+        intervals[i] = x;
+        x += steps[(i + k) % n] - steps[i];
+    }
+    cluster(std::move(intervals), tolerance * k, means, counts);
+    return means.size();
+}
+
+inline StepSignature step_signature(const Tunings::Scale &s, double tolerance)
+{
+    StepSignature sig;
+    auto n = s.tones.size();
+    if (n == 0)
+        return sig;
+
+    std::vector<double> steps(n);
+    auto p = pitch_cents(s);
+    fill_table(p, kSteps, steps.data(), std::minus<>(), std::plus<>());
+    cluster(steps, tolerance, sig.sizes, sig.counts);
+
+    if (sig.sizes.size() == 1)
+        sig.classification = kStepsEqual;
+    else if (sig.sizes.size() > 2)
+        sig.classification = kStepsMultiple;
+    else
+    {
+        size_t most = 0, least = std::numeric_limits<size_t>::max();
+        for (size_t k = 2; k < n; k++)
+        {
+            auto sizes = interval_class_sizes(steps, k, tolerance);
+            most = std::max(most, sizes);
+            least = std::min(least, sizes);
+        }
+        if (most > 2)
+            sig.classification = kStepsTwoSizes;
+        else if (least == 2 || least > n)
+            sig.classification = kStepsWellFormed;
+        else
+            sig.classification = kStepsMOS;
+    }
+    return sig;
+}
+
+/*
+ * Keys identifying scales for hashing and duplicate detection. The content key
+ * depends only on the tones, with ratios reduced, so is the same for scales
+ * differing only in formatting, comments, name or description. The canonical
+ * steps are the steps quantized to multiples of resolution cents, rotated to
+ * the lexicographically least rotation, so are the same for all modes of a
+ * scale.
+ */
+inline std::vector<int64_t> content_key(const Tunings::Scale &s)
+{
+    std::vector<int64_t> key;
+    key.reserve(3 * s.tones.size());
+    for (const auto &t : s.tones)
+    {
+        if (t.type == Tunings::Tone::kToneRatio)
+        {
+            auto r = reduced(t.ratio_n, t.ratio_d);
+            key.insert(key.end(), {1, r.n, r.d});
+        }
+        else
+        {
+            double c = t.cents == 0 ? 0.0 : t.cents; // -0.0 is the same as 0.0
+            int64_t bits;
+            std::memcpy(&bits, &c, sizeof(bits));
+            key.insert(key.end(), {0, bits, 0});
+        }
+    }
+    return key;
+}
+
+// Start of the lexicographically least rotation of v
+inline size_t least_rotation(const std::vector<int64_t> &v)
+{
+    size_t n = v.size(), i = 0, j = 1, k = 0;
+    while (i < n && j < n && k < n)
+    {
+        auto a = v[(i + k) % n], b = v[(j + k) % n];
+        if (a == b)
+        {
+            k++;
+            continue;
+        }
+        if (a > b)
+            i += k + 1;
+        else
+            j += k + 1;
+        if (i == j)
+            j++;
+        k = 0;
+    }
+    return std::min(i, j);
+}
+
+inline std::vector<int64_t> canonical_steps(const Tunings::Scale &s, double resolution)
+{
+    if (!(resolution > 0))
+        throw Tunings::TuningError("Resolution should be a positive number of cents. You entered " +
+                                   std::to_string(resolution));
+    auto p = pitch_cents(s);
+    auto n = s.tones.size();
+    /*
+     * Round each step rather than each pitch, so a step rounds the same way in
+     * every mode, whatever the pitch it starts from. Steps are first snapped
+     * to a millionth of the resolution, so rounding error in the pitches
+     * doesn't decide which way a step exactly halfway between two multiples
+     * of the resolution goes.
+     */
+    std::vector<int64_t> quantized(n), steps(n);
+    for (size_t k = 0; k < n; k++)
+        quantized[k] = std::llround(std::nearbyint((p[k + 1] - p[k]) / resolution * 1e6) / 1e6);
+    auto start = least_rotation(quantized);
+    for (size_t k = 0; k < n; k++)
+        steps[k] = quantized[(start + k) % n];
+    return steps;
+}
+
+// 64 bit hash of a key which is the same on all platforms
+inline uint64_t hash_key(const std::vector<int64_t> &key)
+{
+    // splitmix64 finalizer applied to each value in turn
+    auto mix = [](uint64_t x) {
+        x ^= x >> 30;
+        x *= 0xbf58476d1ce4e5b9ULL;
+        x ^= x >> 27;
+        x *= 0x94d049bb133111ebULL;
+        x ^= x >> 31;
+        return x;
+    };
+    uint64_t h = mix(key.size() + 0x9e3779b97f4a7c15ULL);
+    for (auto v : key)
+        h = mix(h ^ (static_cast<uint64_t>(v) + 0x9e3779b97f4a7c15ULL));
+    return h;
+}
+
+/*
+ * Label each scale with the index of the first scale with the same key, so
+ * scales with equal labels form an equivalence class.
+ */
+template <typename Key>
+std::vector<int64_t> equivalence_classes(const std::vector<const Tunings::Scale *> &scales, Key key)
+{
+    std::map<std::vector<int64_t>, int64_t> first;
+    std::vector<int64_t> labels(scales.size());
+    for (size_t i = 0; i < scales.size(); i++)
+        labels[i] = first.emplace(key(*scales[i]), static_cast<int64_t>(i)).first->second;
+    return labels;
+}
+
+/*
+ * A rotation invariant profile of a scale, the smoothed histogram of the
+ * intervals between every pair of its pitch classes, as fractions of the
+ * period. The intervals x and 1 - x are the same interval class, so only
+ * bins covering [0, 1/2] of the period are written to out. Each interval is
+ * shared between the two nearest bins, then the histogram is smoothed by a
+ * Gaussian of standard deviation width cents, wrapping around the period,
+ * and scaled to unit length. A scale with fewer than two pitch classes, or a
+ * period which is not a positive number of cents, has a profile of zeros.
+ */
+inline void interval_profile(const Tunings::Scale &s, size_t bins, double width, double *out)
+{
+    std::fill(out, out + bins, 0.0);
+    auto p = pitch_cents(s);
+    auto n = p.size() - 1;
+    double period = p[n];
+    if (n < 2 || !(period > 0) || !std::isfinite(period))
+        return;
+
+    // Bins of the whole period, of which the first half are written out, with
+    // positions measured in bins from the centre of bin 0
+    auto full = static_cast<std::ptrdiff_t>(2 * bins);
+    auto wrap = [full](std::ptrdiff_t k) { return ((k % full) + full) % full; };
+    std::vector<double> x(n), hist(full, 0.0);
+    for (size_t i = 0; i < n; i++)
+    {
+        double f = std::fmod(p[i] / period, 1.0);
+        x[i] = f < 0 ? f + 1 : f;
+    }
+    for (size_t i = 0; i < n; i++)
+        for (size_t j = 0; j < n; j++)
+        {
+            if (i == j)
+                continue;
+            double d = x[j] - x[i];
+            double b = (d < 0 ? d + 1 : d) * full - 0.5;
+            double lower = std::floor(b), frac = b - lower;
+            auto k = static_cast<std::ptrdiff_t>(lower);
+            hist[wrap(k)] += 1 - frac;
+            hist[wrap(k + 1)] += frac;
+        }
+
+    double sigma = width / period * full;
+    auto reach = std::min(static_cast<std::ptrdiff_t>(std::ceil(3 * sigma)), full / 2);
+    if (reach > 0)
+    {
+        std::vector<double> kernel(2 * reach + 1);
+        for (std::ptrdiff_t k = -reach; k <= reach; k++)
+            kernel[k + reach] = std::exp(-0.5 * (k / sigma) * (k / sigma));
+        for (size_t b = 0; b < bins; b++)
+        {
+            double v = 0;
+            for (std::ptrdiff_t k = -reach; k <= reach; k++)
+                v += kernel[k + reach] * hist[wrap(static_cast<std::ptrdiff_t>(b) + k)];
+            out[b] = v;
+        }
+    }
+    else
+        std::copy(hist.begin(), hist.begin() + bins, out);
+
+    double norm = 0;
+    for (size_t k = 0; k < bins; k++)
+        norm += out[k] * out[k];
+    norm = std::sqrt(norm);
+    if (norm > 0)
+        for (size_t k = 0; k < bins; k++)
+            out[k] /= norm;
+}
+
+} // namespace analysis
@@ -0,0 +1,134 @@
+"""
+Read scl and kbm files directly from zip and tar archives.
+"""
+
+import os
+import tarfile
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from ._tuning_library import TuningError, parse_kbm_data, parse_scl_data
+
+PARSERS = {".scl": parse_scl_data, ".kbm": parse_kbm_data}
+
+
+def _suffix(name):
+    return os.path.splitext(name)[1].lower()
+
+
+def _zip_members(archive, suffixes):
+    with zipfile.ZipFile(archive) as zf:
+        for info in zf.infolist():
+            if not info.is_dir() and _suffix(info.filename) in suffixes:
+                yield info.filename, zf.read(info)
+
+
+def _tar_members(tf, suffixes):
+    with tf:
+        for member in tf:
+            if member.isfile() and _suffix(member.name) in suffixes:
+                yield member.name, tf.extractfile(member).read()
+
+
+def _members(archive, suffixes):
+    """Yield (name, contents) for each archive member with one of `suffixes`."""
+    if isinstance(archive, (str, os.PathLike)):
+        if zipfile.is_zipfile(archive):
+            return _zip_members(archive, suffixes)
+        return _tar_members(tarfile.open(archive, mode="r:*"), suffixes)
+
+    if not archive.seekable():
+        # Zip files need random access, so a stream must be a tar file
+        return _tar_members(tarfile.open(fileobj=archive, mode="r|*"), suffixes)
+    position = archive.tell()
+    is_zip = zipfile.is_zipfile(archive)
+    archive.seek(position)
+    if is_zip:
+        return _zip_members(archive, suffixes)
+    return _tar_members(tarfile.open(fileobj=archive, mode="r:*"), suffixes)
+
+
+def _parse(name, contents, skip_errors):
+    try:
+        return name, PARSERS[_suffix(name)](contents)
+    except TuningError:
+        if skip_errors:
+            return None
+        raise
+
+
+def iter_archive(archive, suffixes=(".scl", ".kbm"), workers=None, skip_errors=False):
+    """
+    Parse the scl and kbm files in a zip or tar archive.
+
+    Members are read and parsed in memory without extracting the archive, with
+    the bytes of each member parsed in place rather than decoded to str. They
+    are yielded as they are parsed so the whole archive is never held in
+    memory.
+
+    Parameters
+    ----------
+    archive : str, Path or file-like object
+        Filename of, or binary file object containing, a zip or tar archive
+        (optionally gzip, bz2 or xz compressed). A file object which isn't
+        seekable must be a tar archive.
+    suffixes : iterable of str, optional
+        Which kinds of file to parse, ".scl" and/or ".kbm".
+    workers : int, optional
+        Number of threads to parse with. By default members are parsed in the
+        calling thread.
+    skip_errors : bool, optional
+        Skip members which fail to parse, instead of raising `TuningError`.
+
+    Yields
+    ------
+    (str, Scale or KeyboardMapping)
+        Name of each member in the archive and the parsed Scale or
+        KeyboardMapping, in archive order.
+    """
+    suffixes = {s.lower() for s in suffixes}
+    unknown = suffixes - PARSERS.keys()
+    if unknown:
+        raise ValueError(f"Unknown suffixes {sorted(unknown)}, expected .scl or .kbm")
+    members = _members(archive, suffixes)
+
+    if workers is None or workers <= 1:
+        for name, contents in members:
+            parsed = _parse(name, contents, skip_errors)
+            if parsed is not None:
+                yield parsed
+        return
+
+    # Keep a bounded number of members in flight so memory use doesn't grow
+    # with the size of the archive
+    with ThreadPoolExecutor(workers) as executor:
+        pending = deque()
+        for name, contents in members:
+            pending.append(executor.submit(_parse, name, contents, skip_errors))
+            if len(pending) >= 4 * workers:
+                parsed = pending.popleft().result()
+                if parsed is not None:
+                    yield parsed
+        while pending:
+            parsed = pending.popleft().result()
+            if parsed is not None:
+                yield parsed
+
+
+def iter_scl_archive(archive, workers=None, skip_errors=False):
+    """
+    Parse the scl files in a zip or tar archive, yielding (name, Scale).
+
+    See `iter_archive` for a description of the parameters.
+    """
+    return iter_archive(archive, (".scl",), workers, skip_errors)
+
+
+def iter_kbm_archive(archive, workers=None, skip_errors=False):
+    """
+    Parse the kbm files in a zip or tar archive, yielding (name, KeyboardMapping).
+
+    See `iter_archive` for a description of the parameters.
+    """
+    return iter_archive(archive, (".kbm",), workers, skip_errors)
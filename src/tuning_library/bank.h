@@ -0,0 +1,117 @@
+#pragma once
+
+#include <algorithm>
+#include <atomic>
+#include <cstdint>
+#include <mutex>
+#include <string>
+#include <vector>
+#include "Tunings.h"
+
+/*
+ * A bank of tunings, one per slot such as a midi channel or MPE voice, with
+ * the frequency and pitch in cents of every midi note of every slot packed
+ * into contiguous slots x 128 tables.
+ *
+ * Slots can be retuned while other threads look up notes. A slot's new rows
+ * are computed before taking the lock, so lookups only wait for a copy of
+ * two rows, and see each slot entirely before or after the swap. Readers of
+ * the tables themselves, which don't take the lock, can check the version of
+ * a slot, which is odd while the slot is being written and increases with
+ * every swap, before and after reading it.
+ */
+namespace bank
+{
+
+inline constexpr size_t kNotes = 128;
+
+class Bank
+{
+  public:
+    explicit Bank(std::vector<Tunings::Tuning> tunings)
+        : tunings_(std::move(tunings)), frequencies_(tunings_.size() * kNotes),
+          cents_(tunings_.size() * kNotes), versions_(tunings_.size(), 0)
+    {
+        for (size_t slot = 0; slot < tunings_.size(); slot++)
+            fill(tunings_[slot], &frequencies_[slot * kNotes], &cents_[slot * kNotes]);
+    }
+
+    Bank(const Bank &) = delete;
+    Bank &operator=(const Bank &) = delete;
+
+    size_t size() const { return tunings_.size(); }
+
+    Tunings::Tuning get(int64_t slot) const
+    {
+        check_slot(slot);
+        std::lock_guard<std::mutex> lock(mutex_);
+        return tunings_[slot];
+    }
+
+    // Put tuning in slot, returning the tuning it replaces
+    Tunings::Tuning swap(int64_t slot, Tunings::Tuning tuning)
+    {
+        check_slot(slot);
+        double frequencies[kNotes], cents[kNotes];
+        fill(tuning, frequencies, cents);
+
+        std::lock_guard<std::mutex> lock(mutex_);
+        std::atomic_ref<uint64_t> version(versions_[slot]);
+        version.fetch_add(1, std::memory_order_relaxed);
+        std::atomic_thread_fence(std::memory_order_release);
+        std::copy(frequencies, frequencies + kNotes, &frequencies_[slot * kNotes]);
+        std::copy(cents, cents + kNotes, &cents_[slot * kNotes]);
+        version.fetch_add(1, std::memory_order_release);
+        std::swap(tunings_[slot], tuning);
+        return tuning;
+    }
+
+    /*
+     * Write the frequency, or if cents the pitch in cents, of notes[i] of
+     * slots[i] to out[i] for i < n, where an input of length 1 is used for
+     * every i.
+     */
+    void lookup(const int64_t *slots, size_t num_slots, const int64_t *notes, size_t num_notes,
+                size_t n, bool cents, double *out) const
+    {
+        for (size_t k = 0; k < num_slots; k++)
+            check_slot(slots[k]);
+        for (size_t k = 0; k < num_notes; k++)
+            if (notes[k] < 0 || notes[k] >= static_cast<int64_t>(kNotes))
+                throw Tunings::TuningError("Midi note should be between 0 and 127. You entered " +
+                                           std::to_string(notes[k]));
+        const auto &table = cents ? cents_ : frequencies_;
+        std::lock_guard<std::mutex> lock(mutex_);
+        for (size_t i = 0; i < n; i++)
+            out[i] = table[slots[num_slots == 1 ? 0 : i] * kNotes + notes[num_notes == 1 ? 0 : i]];
+    }
+
+    const double *frequencies() const { return frequencies_.data(); }
+    const double *cents() const { return cents_.data(); }
+    const uint64_t *versions() const { return versions_.data(); }
+
+  private:
+    static void fill(const Tunings::Tuning &t, double *frequencies, double *cents)
+    {
+        for (size_t note = 0; note < kNotes; note++)
+        {
+            frequencies[note] = t.frequencyForMidiNote(static_cast<int>(note));
+            cents[note] = 1200 * t.logScaledFrequencyForMidiNote(static_cast<int>(note));
+        }
+    }
+
+    void check_slot(int64_t slot) const
+    {
+        if (slot < 0 || slot >= static_cast<int64_t>(tunings_.size()))
+            throw Tunings::TuningError("Slot should be between 0 and " +
+                                       std::to_string(tunings_.size() - 1) + ". You entered " +
+                                       std::to_string(slot));
+    }
+
+    mutable std::mutex mutex_;
+    std::vector<Tunings::Tuning> tunings_;
+    std::vector<double> frequencies_, cents_;
+    std::vector<uint64_t> versions_;
+};
+
+} // namespace bank
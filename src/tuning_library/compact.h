@@ -0,0 +1,127 @@
+#pragma once
+
+#include <cstdint>
+#include <string>
+#include <vector>
+#include "Tunings.h"
+
+/*
+ * A compact form of a collection of scales, with the tones of every scale in
+ * one array of fixed size records and every string in one shared pool.
+ *
+ * The strings of scale i are entries string_offsets[i] to string_offsets[i + 1]
+ * of the pool, in the order name, description, raw text, the string form of
+ * each tone, then the comments. Pool entry k is the bytes
+ * pool[string_bounds[k]:string_bounds[k + 1]].
+ */
+namespace compact
+{
+
+struct ToneRecord
+{
+    int32_t type;
+    int32_t lineno;
+    double cents;
+    int64_t ratio_n, ratio_d;
+    double float_value;
+};
+
+// Strings of each scale before the string forms of its tones
+inline constexpr int64_t kScaleStrings = 3;
+
+struct Packed
+{
+    std::vector<ToneRecord> tones;
+    std::vector<int64_t> offsets{0};
+    std::vector<int64_t> counts;
+    std::string pool;
+    std::vector<int64_t> string_bounds{0};
+    std::vector<int64_t> string_offsets{0};
+
+    void add_string(const std::string &s)
+    {
+        pool += s;
+        string_bounds.push_back(static_cast<int64_t>(pool.size()));
+    }
+
+    void add(const Tunings::Scale &s)
+    {
+        add_string(s.name);
+        add_string(s.description);
+        add_string(s.rawText);
+        for (const auto &t : s.tones)
+        {
+            tones.push_back({static_cast<int32_t>(t.type), t.lineno, t.cents, t.ratio_n, t.ratio_d,
+                             t.floatValue});
+            add_string(t.stringRep);
+        }
+        for (const auto &c : s.comments)
+            add_string(c);
+        offsets.push_back(static_cast<int64_t>(tones.size()));
+        counts.push_back(s.count);
+        string_offsets.push_back(static_cast<int64_t>(string_bounds.size()) - 1);
+    }
+};
+
+// Borrowed pointers to the arrays of a packed collection of `size` scales
+struct View
+{
+    size_t size;
+    const ToneRecord *tones;
+    size_t num_tones;
+    const int64_t *offsets;
+    const int64_t *counts;
+    const char *pool;
+    size_t pool_size;
+    const int64_t *string_bounds;
+    size_t num_strings;
+    const int64_t *string_offsets;
+};
+
+inline Tunings::Scale unpack(const View &v, size_t i)
+{
+    auto invalid = [i](const std::string &what) {
+        return Tunings::TuningError("Invalid compact scale " + std::to_string(i) + ": " + what);
+    };
+    if (i >= v.size)
+        throw invalid("index out of range");
+    auto t0 = v.offsets[i], t1 = v.offsets[i + 1];
+    auto s0 = v.string_offsets[i], s1 = v.string_offsets[i + 1];
+    if (t0 < 0 || t1 < t0 || static_cast<size_t>(t1) > v.num_tones)
+        throw invalid("tone offsets out of range");
+    if (s0 < 0 || s1 < s0 + kScaleStrings + (t1 - t0) || static_cast<size_t>(s1) > v.num_strings)
+        throw invalid("string offsets out of range");
+
+    auto str = [&](int64_t k) {
+        auto b0 = v.string_bounds[k], b1 = v.string_bounds[k + 1];
+        if (b0 < 0 || b1 < b0 || static_cast<size_t>(b1) > v.pool_size)
+            throw invalid("string bounds out of range");
+        return std::string(v.pool + b0, static_cast<size_t>(b1 - b0));
+    };
+
+    Tunings::Scale s;
+    s.name = str(s0);
+    s.description = str(s0 + 1);
+    s.rawText = str(s0 + 2);
+    s.count = static_cast<int>(v.counts[i]);
+    s.tones.resize(static_cast<size_t>(t1 - t0));
+    for (int64_t j = 0; j < t1 - t0; j++)
+    {
+        const auto &r = v.tones[t0 + j];
+        if (r.type != Tunings::Tone::kToneCents && r.type != Tunings::Tone::kToneRatio)
+            throw invalid("unknown tone type " + std::to_string(r.type));
+        auto &t = s.tones[j];
+        t.type = static_cast<Tunings::Tone::Type>(r.type);
+        t.lineno = r.lineno;
+        t.cents = r.cents;
+        t.ratio_n = r.ratio_n;
+        t.ratio_d = r.ratio_d;
+        t.floatValue = r.float_value;
+        t.stringRep = str(s0 + kScaleStrings + j);
+    }
+    for (auto k = s0 + kScaleStrings + (t1 - t0); k < s1; k++)
+        s.comments.push_back(str(k));
+    return s;
+}
+
+} // namespace compact
@@ -0,0 +1,145 @@
+"""
+Compact storage of large collections of scales.
+"""
+
+import numpy as np
+
+from ._tuning_library import pack_scales, unpack_scales
+
+# Strings of each scale before the string forms of its tones
+_SCALE_STRINGS = 3
+
+
+class CompactScales:
+    """
+    A collection of scales stored as a few arrays rather than Python objects.
+
+    The tones of every scale are held in one NumPy structured array, and every
+    string (names, descriptions, raw text, the string form of each tone and
+    comments) in one shared bytes pool which is only decoded when a string is
+    accessed. Indexing converts back to a regular `Scale`, losslessly.
+
+    Parameters
+    ----------
+    scales : iterable of Scale
+        Scales to store.
+
+    Attributes
+    ----------
+    tones : numpy.ndarray
+        Structured array with fields type, cents, ratio_n, ratio_d,
+        float_value and lineno, with the tones of scale i in
+        ``tones[offsets[i]:offsets[i + 1]]``.
+    offsets : numpy.ndarray
+        Offsets of the tones of each scale in `tones`.
+    counts : numpy.ndarray
+        The count of each scale.
+    """
+
+    def __init__(self, scales=()):
+        self._set_arrays(pack_scales(scales))
+
+    def _set_arrays(self, arrays):
+        self.tones = arrays["tones"]
+        self.offsets = arrays["offsets"]
+        self.counts = arrays["counts"]
+        self._pool = arrays["pool"]
+        self._string_bounds = arrays["string_bounds"]
+        self._string_offsets = arrays["string_offsets"]
+
+    @classmethod
+    def from_arrays(cls, tones, offsets, counts, pool, string_bounds, string_offsets):
+        """
+        Build from the arrays returned by `arrays`, e.g. after saving them with
+        ``numpy.savez``.
+        """
+        compact = cls.__new__(cls)
+        compact._set_arrays(
+            {
+                "tones": np.asarray(tones),
+                "offsets": np.asarray(offsets, dtype=np.int64),
+                "counts": np.asarray(counts, dtype=np.int64),
+                "pool": bytes(pool),
+                "string_bounds": np.asarray(string_bounds, dtype=np.int64),
+                "string_offsets": np.asarray(string_offsets, dtype=np.int64),
+            }
+        )
+        return compact
+
+    def arrays(self):
+        """
+        The arrays holding the scales, as a dict of tones, offsets, counts,
+        pool (as a uint8 array), string_bounds and string_offsets.
+        """
+        arrays = {name: getattr(self, name) for name in ("tones", "offsets", "counts")}
+        arrays["pool"] = np.frombuffer(self._pool, dtype=np.uint8)
+        arrays["string_bounds"] = self._string_bounds
+        arrays["string_offsets"] = self._string_offsets
+        return arrays
+
+    @property
+    def nbytes(self):
+        """Total size in bytes of the arrays holding the scales."""
+        return sum(a.nbytes for a in self.arrays().values())
+
+    def __len__(self):
+        return len(self.counts)
+
+    def __getitem__(self, index):
+        """
+        Scale `index` as a regular Scale, or a list of Scales for a slice or
+        array of indices.
+        """
+        indices = np.arange(len(self))[index]
+        scales = self._unpack(np.atleast_1d(indices))
+        return scales if np.ndim(indices) else scales[0]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._unpack([i])[0]
+
+    def _unpack(self, indices):
+        return unpack_scales(
+            self.tones,
+            self.offsets,
+            self.counts,
+            self._pool,
+            self._string_bounds,
+            self._string_offsets,
+            indices,
+        )
+
+    def to_scales(self):
+        """All of the scales as a list of regular Scales."""
+        return self._unpack(None)
+
+    def _check_index(self, i):
+        return range(len(self))[i]
+
+    def scale_tones(self, i):
+        """View of the records of the tones of scale `i`."""
+        i = self._check_index(i)
+        return self.tones[self.offsets[i] : self.offsets[i + 1]]
+
+    def _string(self, k):
+        start, end = self._string_bounds[k], self._string_bounds[k + 1]
+        return self._pool[start:end].decode()
+
+    def name(self, i):
+        """Name of scale `i`."""
+        return self._string(self._string_offsets[self._check_index(i)])
+
+    def description(self, i):
+        """Description of scale `i`."""
+        return self._string(self._string_offsets[self._check_index(i)] + 1)
+
+    def raw_text(self, i):
+        """Raw text of scale `i`."""
+        return self._string(self._string_offsets[self._check_index(i)] + 2)
+
+    def string_reps(self, i):
+        """String forms of the tones of scale `i`."""
+        i = self._check_index(i)
+        first = self._string_offsets[i] + _SCALE_STRINGS
+        count = self.offsets[i + 1] - self.offsets[i]
+        return [self._string(k) for k in range(first, first + count)]
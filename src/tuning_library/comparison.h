@@ -0,0 +1,138 @@
+#pragma once
+
+#include <algorithm>
+#include <atomic>
+#include <cmath>
+#include <cstdint>
+#include <limits>
+#include <thread>
+#include <vector>
+#include "Tunings.h"
+
+/*
+ * Deviations in cents between the pitches of tunings over a range of midi
+ * notes, for ranking and clustering many tunings at once.
+ *
+ * The pitches of each tuning are looked up once, so comparing every pair of n
+ * tunings costs n lookups of the note range rather than n * n.
+ */
+namespace comparison
+{
+
+struct Options
+{
+    int first_note{0}, last_note{127};
+    bool skip_unmapped{true};     // skip notes unmapped in either tuning
+    bool octave_equivalent{false}; // compare after the best whole octave transposition
+};
+
+struct Deviation
+{
+    double max{std::numeric_limits<double>::quiet_NaN()};
+    double rms{std::numeric_limits<double>::quiet_NaN()};
+    double mean_abs{std::numeric_limits<double>::quiet_NaN()};
+    int64_t count{0}; // number of notes compared
+};
+
+// The pitch in cents above midi note 0 and whether each note is mapped
+struct Pitches
+{
+    std::vector<double> cents;
+    std::vector<uint8_t> mapped;
+
+    Pitches(const Tunings::Tuning &t, const Options &o)
+    {
+        for (int note = o.first_note; note <= o.last_note; note++)
+        {
+            cents.push_back(1200 * t.logScaledFrequencyForMidiNote(note));
+            mapped.push_back(t.isMidiNoteMapped(note));
+        }
+    }
+};
+
+/*
+ * With octave_equivalent, b is first transposed by the whole number of octaves
+ * nearest its mean difference from a, which is the transposition minimising
+ * the rms deviation. Every note is transposed by the same amount, so a note
+ * 1100 cents off still counts as 1100 cents.
+ */
+inline Deviation deviation(const Pitches &a, const Pitches &b, const Options &o)
+{
+    Deviation d;
+    auto compared = [&](size_t k) { return !o.skip_unmapped || (a.mapped[k] && b.mapped[k]); };
+    double offset = 0;
+    if (o.octave_equivalent)
+    {
+        double total = 0;
+        int64_t count = 0;
+        for (size_t k = 0; k < a.cents.size(); k++)
+            if (compared(k))
+            {
+                total += b.cents[k] - a.cents[k];
+                count++;
+            }
+        if (count > 0)
+            offset = 1200 * std::nearbyint(total / count / 1200);
+    }
+    double max = 0, squares = 0, total = 0;
+    for (size_t k = 0; k < a.cents.size(); k++)
+    {
+        if (!compared(k))
+            continue;
+        double diff = std::fabs(b.cents[k] - a.cents[k] - offset);
+        max = std::max(max, diff);
+        squares += diff * diff;
+        total += diff;
+        d.count++;
+    }
+    if (d.count > 0)
+    {
+        d.max = max;
+        d.rms = std::sqrt(squares / d.count);
+        d.mean_abs = total / d.count;
+    }
+    return d;
+}
+
+/*
+ * Call f(i) for each i in [0, n) on up to threads threads, handing out rows
+ * one at a time so uneven rows, such as those of a triangle, balance out.
+ */
+template <typename F> void parallel_for(size_t n, unsigned threads, F f)
+{
+    if (threads == 0)
+        threads = std::max(1u, std::thread::hardware_concurrency());
+    threads = static_cast<unsigned>(std::min<size_t>(threads, n));
+    std::atomic<size_t> next{0};
+    auto work = [&]() {
+        for (size_t i = next++; i < n; i = next++)
+            f(i);
+    };
+    std::vector<std::thread> pool;
+    for (unsigned t = 1; t < threads; t++)
+        pool.emplace_back(work);
+    work();
+    for (auto &t : pool)
+        t.join();
+}
+
+/*
+ * Deviations between every pair of rows and columns, written row major to
+ * out. If symmetric the columns are the rows, and only the upper triangle is
+ * computed and mirrored.
+ */
+inline void deviation_matrix(const std::vector<Pitches> &rows, const std::vector<Pitches> &columns,
+                             bool symmetric, const Options &o, unsigned threads, Deviation *out)
+{
+    auto m = columns.size();
+    parallel_for(rows.size(), threads, [&](size_t i) {
+        for (size_t j = symmetric ? i : 0; j < m; j++)
+        {
+            out[i * m + j] = deviation(rows[i], columns[j], o);
+            if (symmetric)
+                out[j * m + i] = out[i * m + j];
+        }
+    });
+}
+
+} // namespace comparison
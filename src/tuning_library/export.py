@@ -0,0 +1,405 @@
+"""
+Export the frequency tables of many scl files in bulk.
+
+Run it with
+
+    $ python -m tuning_library export scales/ -o frequencies.npy
+
+to write one row of 128 midi note frequencies for each scl file found, in
+sorted order. The output can be
+
+npy
+    A float64 numpy array of shape (n, 128), written through a memory map,
+    which can be loaded with ``numpy.load(path, mmap_mode="r")``.
+csv
+    A header row, then the filename and 128 frequencies of each scale.
+bin
+    Raw little endian float64 values, 128 per scale.
+
+The npy and bin formats also write the filename of each row, one per line,
+to a sidecar file with ".names.txt" appended to the output path. Files which
+fail to parse get a row of NaN, so rows always line up with the filenames.
+
+Files are parsed and tuned in chunks on a pool of threads, with a bounded
+number of chunks in flight, so memory use doesn't grow with the number of
+files. Progress is recorded in a file with ".progress" appended to the output
+path after each chunk is written, and an interrupted export with the same
+inputs continues from the last recorded chunk. Inputs are the same if the
+files have the same names, sizes and modification times, so an export starts
+again if any file was changed in between.
+"""
+
+import argparse
+import csv
+import glob
+import hashlib
+import io
+import json
+import os
+import sys
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from ._tuning_library import (
+    KeyboardMapping,
+    TuningError,
+    _read_kbm_file,
+    _read_scl_file,
+    tuning_frequencies,
+)
+
+FORMATS = ("npy", "csv", "bin")
+
+ExportStats = namedtuple(
+    "ExportStats", ["files", "written", "resumed", "errors", "seconds", "bytes"]
+)
+ExportStats.__doc__ = """
+Statistics of an export.
+
+files : int
+    Number of scl files found.
+written : int
+    Number of rows written by this run.
+resumed : int
+    Number of rows already written by an interrupted run.
+errors : dict of str to str
+    Files which failed to parse, and the error message.
+seconds : float
+    Time taken by this run.
+bytes : int
+    Number of bytes written by this run.
+"""
+
+
+def find_scl_files(paths):
+    """
+    Find the scl files given by directories, glob patterns and filenames.
+
+    Directories are searched recursively. The files from each path are sorted,
+    and files found more than once are only included the first time.
+
+    Parameters
+    ----------
+    paths : iterable of str or Path
+
+    Returns
+    -------
+    list of str
+    """
+    found = {}
+    for path in map(os.fspath, paths):
+        if os.path.isdir(path):
+            files = [
+                os.path.join(root, name)
+                for root, _, names in os.walk(path)
+                for name in names
+                if name.lower().endswith(".scl")
+            ]
+        elif glob.has_magic(path):
+            files = [f for f in glob.glob(path, recursive=True) if os.path.isfile(f)]
+        else:
+            files = [path]
+        found.update(dict.fromkeys(sorted(files)))
+    return list(found)
+
+
+def _paired_kbm(scl_file):
+    kbm_file = os.path.splitext(scl_file)[0] + ".kbm"
+    return kbm_file if os.path.isfile(kbm_file) else None
+
+
+def _tune_chunk(scl_files, kbm_files):
+    """Frequencies of a chunk of files, with NaN rows for errors."""
+    scales, mappings, rows, errors = [], [], [], {}
+    parsed_mappings = {}
+    for row, (scl_file, kbm_file) in enumerate(zip(scl_files, kbm_files)):
+        try:
+            scale = _read_scl_file(scl_file)
+            if kbm_file is None:
+                mapping = KeyboardMapping()
+            elif kbm_file in parsed_mappings:
+                mapping = parsed_mappings[kbm_file]
+            else:
+                mapping = parsed_mappings[kbm_file] = _read_kbm_file(kbm_file)
+        except TuningError as e:
+            errors[scl_file] = str(e)
+            continue
+        scales.append(scale)
+        mappings.append(mapping)
+        rows.append(row)
+    frequencies = np.full((len(scl_files), 128), np.nan)
+    try:
+        frequencies[rows] = tuning_frequencies(scales, mappings)
+    except TuningError:
+        # Tune one at a time to find which scale and mapping don't fit
+        for row, scale, mapping in zip(rows, scales, mappings):
+            try:
+                frequencies[row] = tuning_frequencies([scale], [mapping])
+            except TuningError as e:
+                errors[scl_files[row]] = str(e)
+    return frequencies, errors
+
+
+class _Writer:
+    """Writes rows in order to one of the output formats from a given row."""
+
+    def __init__(self, path, format, names, start):
+        self.format = format
+        self.names = names
+        self.row = start
+        self.bytes = 0
+        if format == "npy":
+            mode = "r+" if start else "w+"
+            self.array = np.lib.format.open_memmap(
+                path, mode=mode, dtype=np.float64, shape=(len(names), 128)
+            )
+            if self.array.shape != (len(names), 128):
+                raise ValueError(f"{path} doesn't have {len(names)} rows to resume")
+        else:
+            self.file = open(path, "r+b" if start else "wb")
+
+    def seek(self, offset):
+        # Discard anything written after the last recorded chunk
+        if self.format != "npy":
+            self.file.seek(offset)
+            self.file.truncate()
+
+    def tell(self):
+        return 0 if self.format == "npy" else self.file.tell()
+
+    def write_header(self):
+        if self.format == "csv":
+            self._write_csv([["name", *range(128)]])
+
+    def _write_csv(self, rows):
+        text = io.StringIO()
+        csv.writer(text, lineterminator="\n").writerows(rows)
+        data = text.getvalue().encode()
+        self.file.write(data)
+        self.bytes += len(data)
+
+    def write(self, frequencies):
+        n = len(frequencies)
+        if self.format == "npy":
+            self.array[self.row : self.row + n] = frequencies
+            self.bytes += frequencies.nbytes
+        elif self.format == "bin":
+            data = frequencies.astype("<f8").tobytes()
+            self.file.write(data)
+            self.bytes += len(data)
+        else:
+            names = self.names[self.row : self.row + n]
+            self._write_csv(
+                [name, *map(repr, row)] for name, row in zip(names, frequencies.tolist())
+            )
+        self.row += n
+        if self.format != "npy":
+            self.file.flush()
+
+    def close(self):
+        if self.format == "npy":
+            self.array.flush()
+            del self.array
+        else:
+            self.file.close()
+
+
+def _file_version(path):
+    if path is None:
+        return None
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+def _signature(format, scl_files, kbm_files):
+    h = hashlib.sha256(format.encode())
+    versions = {}
+    for scl_file, kbm_file in zip(scl_files, kbm_files):
+        if kbm_file not in versions:
+            versions[kbm_file] = _file_version(kbm_file)
+        h.update(f"\0{scl_file}\0{_file_version(scl_file)}".encode())
+        h.update(f"\0{kbm_file}\0{versions[kbm_file]}".encode())
+    return h.hexdigest()
+
+
+def _read_progress(path, signature):
+    try:
+        with open(path) as f:
+            progress = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if progress.get("signature") != signature:
+        return None
+    return progress
+
+
+def _write_progress(path, progress):
+    with open(path + ".tmp", "w") as f:
+        json.dump(progress, f)
+    os.replace(path + ".tmp", path)
+
+
+def export_frequencies(
+    paths, output, format=None, kbm=None, pair_kbm=False, workers=None, chunk_size=256
+):
+    """
+    Write the frequency tables of scl files to one output file.
+
+    Parameters
+    ----------
+    paths : iterable of str or Path
+        Directories, glob patterns and filenames of scl files, see
+        `find_scl_files`.
+    output : str or Path
+        Output filename.
+    format : {"npy", "csv", "bin"}, optional
+        Output format. By default the suffix of `output`, or npy.
+    kbm : str or Path, optional
+        Keyboard mapping for every scale. By default the default mapping.
+    pair_kbm : bool, optional
+        Use the kbm file with the same name as each scl file, e.g.
+        "scale.kbm" for "scale.scl", where there is one.
+    workers : int, optional
+        Number of threads, by default the number of cores.
+    chunk_size : int, optional
+        Number of files tuned together, and written between progress records.
+
+    Returns
+    -------
+    ExportStats
+    """
+    start_time = time.perf_counter()
+    output = os.fspath(output)
+    if format is None:
+        suffix = os.path.splitext(output)[1].lower().lstrip(".")
+        format = suffix if suffix in FORMATS else "npy"
+    if format not in FORMATS:
+        raise ValueError(f"Unknown format {format!r}, expected one of {FORMATS}")
+    if chunk_size < 1:
+        raise ValueError("chunk_size should be at least 1")
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    scl_files = find_scl_files(paths)
+    default_kbm = os.fspath(kbm) if kbm is not None else None
+    kbm_files = [
+        (_paired_kbm(f) if pair_kbm else None) or default_kbm for f in scl_files
+    ]
+    progress_path = output + ".progress"
+    signature = _signature(format, scl_files, kbm_files)
+    progress = _read_progress(progress_path, signature) if os.path.exists(output) else None
+    if progress is None:
+        progress = {"signature": signature, "rows": 0, "offset": 0, "errors": {}}
+    resumed = progress["rows"]
+
+    if format != "csv" and not resumed:
+        with open(output + ".names.txt", "w") as f:
+            f.writelines(name + "\n" for name in scl_files)
+    writer = _Writer(output, format, scl_files, resumed)
+    errors = dict(progress["errors"])
+    try:
+        if resumed:
+            writer.seek(progress["offset"])
+        else:
+            writer.write_header()
+        chunks = (
+            (scl_files[i : i + chunk_size], kbm_files[i : i + chunk_size])
+            for i in range(resumed, len(scl_files), chunk_size)
+        )
+
+        def write(result):
+            frequencies, chunk_errors = result
+            writer.write(frequencies)
+            errors.update(chunk_errors)
+            progress.update(rows=writer.row, offset=writer.tell(), errors=errors)
+            _write_progress(progress_path, progress)
+
+        # Keep a bounded number of chunks in flight so memory use doesn't
+        # grow with the number of files
+        with ThreadPoolExecutor(workers) as executor:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(executor.submit(_tune_chunk, *chunk))
+                if len(pending) >= 2 * workers:
+                    write(pending.popleft().result())
+            while pending:
+                write(pending.popleft().result())
+    finally:
+        writer.close()
+    if os.path.exists(progress_path):
+        os.remove(progress_path)
+
+    return ExportStats(
+        files=len(scl_files),
+        written=len(scl_files) - resumed,
+        resumed=resumed,
+        errors=errors,
+        seconds=time.perf_counter() - start_time,
+        bytes=writer.bytes,
+    )
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m tuning_library export",
+        description="Write the frequency tables of scl files to a npy, csv or binary file",
+    )
+    parser.add_argument(
+        "paths", nargs="+", help="Directories, glob patterns or names of scl files"
+    )
+    parser.add_argument("--output", "-o", required=True, help="Output filename")
+    parser.add_argument(
+        "--format",
+        "-f",
+        choices=FORMATS,
+        default=None,
+        help="Output format, by default from the output suffix or npy",
+    )
+    parser.add_argument("--kbm", "-k", help="kbm file to use for every scale")
+    parser.add_argument(
+        "--pair-kbm",
+        action="store_true",
+        help="Use the kbm file with the same name as each scl file if there is one",
+    )
+    parser.add_argument(
+        "--workers", "-w", type=int, default=None, help="Number of threads"
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=256,
+        help="Number of files tuned and written at a time",
+    )
+    return parser
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+    stats = export_frequencies(
+        args.paths,
+        args.output,
+        format=args.format,
+        kbm=args.kbm,
+        pair_kbm=args.pair_kbm,
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+    )
+    for name, error in stats.errors.items():
+        print(f"{name}: {error}", file=sys.stderr)
+    seconds = max(stats.seconds, 1e-9)
+    print(
+        f"Exported {stats.files} files to {args.output} "
+        f"({stats.resumed} already written, {len(stats.errors)} errors) "
+        f"in {stats.seconds:.2f} s, {stats.written / seconds:.0f} files/s, "
+        f"{stats.bytes / seconds / 1e6:.1f} MB/s"
+    )
+
+
+if __name__ == "__main__":
+    main()
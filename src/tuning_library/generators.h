@@ -0,0 +1,178 @@
+#pragma once
+
+#include <charconv>
+#include <cmath>
+#include <locale>
+#include <sstream>
+#include <string>
+#include "Tunings.h"
+
+/*
+ * Generated scales and keyboard mappings, built directly rather than by
+ * formatting and parsing SCL and KBM text.
+ *
+ * The library generates these by writing the text of a file and parsing it, so
+ * every number is rounded through its text form. The same formatting is used
+ * here so the results are identical, apart from the raw text which is only
+ * made if asked for. Anything the fast path doesn't cover, including every
+ * error, is handed to the library function.
+ */
+namespace generators
+{
+
+/*
+ * Numbers are formatted and parsed as in the C locale whatever the global
+ * locale, as the library does, so a host which sets a locale with a decimal
+ * comma doesn't change the generated tones.
+ */
+#if defined(__cpp_lib_to_chars) && __cpp_lib_to_chars >= 201611L
+inline std::string format_chars(double v, std::chars_format format)
+{
+    char buf[512];
+    auto result = std::to_chars(buf, buf + sizeof(buf), v, format, 6);
+    return std::string(buf, result.ptr);
+}
+
+// Format like an ostream in the C locale with default flags
+inline std::string format_general(double v) { return format_chars(v, std::chars_format::general); }
+
+// Format like an ostream in the C locale with std::fixed
+inline std::string format_fixed(double v) { return format_chars(v, std::chars_format::fixed); }
+
+// Parse a number written by format_general or format_fixed
+inline double parse_number(const std::string &s)
+{
+    double v = 0;
+    std::from_chars(s.data(), s.data() + s.size(), v);
+    return v;
+}
+#else
+inline std::string format_stream(double v, bool fixed)
+{
+    std::ostringstream os;
+    os.imbue(std::locale::classic());
+    if (fixed)
+        os << std::fixed;
+    os << v;
+    return os.str();
+}
+
+// Format like an ostream in the C locale with default flags
+inline std::string format_general(double v) { return format_stream(v, false); }
+
+// Format like an ostream in the C locale with std::fixed
+inline std::string format_fixed(double v) { return format_stream(v, true); }
+
+// Parse a number written by format_general or format_fixed
+inline double parse_number(const std::string &s)
+{
+    std::istringstream is(s);
+    is.imbue(std::locale::classic());
+    double v = 0;
+    is >> v;
+    return v;
+}
+#endif
+
+// Whether readKBMStream accepts a line as a number
+inline bool valid_kbm_number(const std::string &line)
+{
+    if (line.empty())
+        return false;
+    for (char c : line)
+        if (!(c == ' ' || (c >= '0' && c <= '9') || c == '.' || c == '\r' || c == '\n'))
+            return false;
+    return true;
+}
+
+// The same as Tunings::toneFromString for a generated tone, which can't have
+// a comment, without parsing through an istringstream
+inline Tunings::Tone tone_from_string(const std::string &s, int lineno)
+{
+    if (s.find('.') == std::string::npos)
+        return Tunings::toneFromString(s, lineno);
+    Tunings::Tone t;
+    t.type = Tunings::Tone::kToneCents;
+    t.stringRep = s;
+    t.lineno = lineno;
+    t.cents = parse_number(s);
+    t.floatValue = t.cents / 1200.0 + 1.0;
+    return t;
+}
+
+inline Tunings::Tone integer_tone(int n, int lineno)
+{
+    Tunings::Tone t;
+    t.type = Tunings::Tone::kToneRatio;
+    t.stringRep = std::to_string(n) + "/1";
+    t.lineno = lineno;
+    t.ratio_n = n;
+    t.ratio_d = 1;
+    t.cents = 1200 * log(1.0 * t.ratio_n / t.ratio_d) / log(2.0);
+    t.floatValue = t.cents / 1200.0 + 1.0;
+    return t;
+}
+
+// A generated scale with the given description, of M - 1 even steps of
+// d_cents and a last tone
+inline Tunings::Scale even_scale(const std::string &description, int M, double d_cents,
+                                 Tunings::Tone last)
+{
+    Tunings::Scale s;
+    s.name = "Scale from patch";
+    s.description = description;
+    s.comments = {"! " + description, "!"};
+    s.count = M;
+    s.tones.reserve(M);
+    // Tones start on line 5, after the comment, description, count and "!"
+    for (int i = 1; i < M; ++i)
+        s.tones.push_back(tone_from_string(format_fixed(d_cents * i), 4 + i));
+    s.tones.push_back(std::move(last));
+    return s;
+}
+
+// The same as Tunings::evenDivisionOfSpanByM, without raw text unless raw_text
+inline Tunings::Scale even_division_of_span_by_m(int span, int M, bool raw_text)
+{
+    if (raw_text || span <= 0 || M <= 0)
+        return Tunings::evenDivisionOfSpanByM(span, M);
+    auto description = "Automatically generated ED" + std::to_string(span) + "-" +
+                       std::to_string(M) + " scale";
+    double top_cents = 1200.0 * log(1.0 * span) / log(2.0);
+    return even_scale(description, M, top_cents / M, integer_tone(span, 4 + M));
+}
+
+// The same as Tunings::evenDivisionOfCentsByM, without raw text unless raw_text
+inline Tunings::Scale even_division_of_cents_by_m(float cents, int M, bool raw_text)
+{
+    if (raw_text || !(cents > 0) || !std::isfinite(cents) || M <= 0)
+        return Tunings::evenDivisionOfCentsByM(cents, M);
+    auto description = "Automatically generated Even Division of " + format_general(cents) +
+                       " ct into " + std::to_string(M) + " scale";
+    // The library writes the last tone after setting std::fixed for the other
+    // tones, so it is only in the general format for a single step, where a
+    // whole number has no '.' and is parsed as a ratio
+    auto top = M > 1 ? format_fixed(cents) : format_general(cents);
+    double top_cents = cents;
+    return even_scale(description, M, top_cents / M, tone_from_string(top, 4 + M));
+}
+
+// The same as Tunings::startScaleOnAndTuneNoteTo, without raw text unless raw_text
+inline Tunings::KeyboardMapping start_scale_on_and_tune_note_to(int scale_start, int midi_note,
+                                                                double freq, bool raw_text)
+{
+    auto start = std::to_string(scale_start), note = std::to_string(midi_note);
+    auto f = format_general(freq);
+    if (raw_text || !valid_kbm_number(start) || !valid_kbm_number(note) || !valid_kbm_number(f))
+        return Tunings::startScaleOnAndTuneNoteTo(scale_start, midi_note, freq);
+    Tunings::KeyboardMapping k;
+    k.rawText.clear();
+    k.name = "Mapping from patch";
+    k.middleNote = scale_start;
+    k.tuningConstantNote = midi_note;
+    k.tuningFrequency = parse_number(f);
+    k.tuningPitch = k.tuningFrequency / Tunings::MIDI_0_FREQ;
+    return k;
+}
+
+} // namespace generators
@@ -0,0 +1,230 @@
+#pragma once
+
+#include <algorithm>
+#include <cstdint>
+#include <iterator>
+#include <map>
+#include <numeric>
+#include <optional>
+#include <string>
+#include <vector>
+#include "Tunings.h"
+#include "analysis.h"
+
+/*
+ * Prime factorization of ratio tones, for just intonation queries.
+ *
+ * Factorization uses trial division by small primes, then Miller-Rabin and
+ * Pollard's rho for any remaining large factors, so any 64 bit ratio is
+ * factored quickly.
+ */
+namespace ji
+{
+
+inline uint64_t mulmod(uint64_t a, uint64_t b, uint64_t m)
+{
+#ifdef __SIZEOF_INT128__
+    return static_cast<uint64_t>(static_cast<unsigned __int128>(a) * b % m);
+#else
+    uint64_t r = 0;
+    a %= m;
+    while (b)
+    {
+        if (b & 1)
+            r = r >= m - a ? r - (m - a) : r + a;
+        a = a >= m - a ? a - (m - a) : a + a;
+        b >>= 1;
+    }
+    return r;
+#endif
+}
+
+inline uint64_t powmod(uint64_t a, uint64_t e, uint64_t m)
+{
+    uint64_t r = 1;
+    a %= m;
+    while (e)
+    {
+        if (e & 1)
+            r = mulmod(r, a, m);
+        a = mulmod(a, a, m);
+        e >>= 1;
+    }
+    return r;
+}
+
+// Deterministic Miller-Rabin, exact for all 64 bit n
+inline bool is_prime(uint64_t n)
+{
+    if (n < 2)
+        return false;
+    for (uint64_t p : {2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37})
+        if (n % p == 0)
+            return n == p;
+    auto d = n - 1;
+    int s = 0;
+    while (d % 2 == 0)
+    {
+        d /= 2;
+        s++;
+    }
+    for (uint64_t a : {2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37})
+    {
+        auto x = powmod(a, d, n);
+        if (x == 1 || x == n - 1)
+            continue;
+        bool composite = true;
+        for (int r = 1; r < s && composite; r++)
+        {
+            x = mulmod(x, x, n);
+            composite = x != n - 1;
+        }
+        if (composite)
+            return false;
+    }
+    return true;
+}
+
+// A non trivial factor of odd composite n
+inline uint64_t pollard_rho(uint64_t n)
+{
+    for (uint64_t c = 1;; c++)
+    {
+        auto f = [&](uint64_t x) { return (mulmod(x, x, n) + c) % n; };
+        uint64_t x = 2, y = 2, d = 1;
+        while (d == 1)
+        {
+            x = f(x);
+            y = f(f(y));
+            d = std::gcd(x > y ? x - y : y - x, n);
+        }
+        if (d != n)
+            return d;
+    }
+}
+
+// Add sign times the exponents of the prime factors of n to factors
+inline void factor(uint64_t n, int sign, std::map<int64_t, int> &factors)
+{
+    for (uint64_t p = 2; p < 1000 && p * p <= n; p += (p == 2 ? 1 : 2))
+    {
+        while (n % p == 0)
+        {
+            factors[static_cast<int64_t>(p)] += sign;
+            n /= p;
+        }
+    }
+    if (n == 1)
+        return;
+    if (is_prime(n))
+    {
+        factors[static_cast<int64_t>(n)] += sign;
+        return;
+    }
+    auto d = pollard_rho(n);
+    factor(d, sign, factors);
+    factor(n / d, sign, factors);
+}
+
+/*
+ * The prime factorization of a ratio tone, as a map from primes to non zero
+ * exponents, or nullopt if the tone is not a ratio of positive integers.
+ */
+inline std::optional<std::map<int64_t, int>> tone_factors(const Tunings::Tone &t)
+{
+    if (t.type != Tunings::Tone::kToneRatio || t.ratio_n <= 0 || t.ratio_d <= 0)
+        return std::nullopt;
+    std::map<int64_t, int> factors;
+    factor(static_cast<uint64_t>(t.ratio_n), 1, factors);
+    factor(static_cast<uint64_t>(t.ratio_d), -1, factors);
+    for (auto it = factors.begin(); it != factors.end();)
+        it = it->second == 0 ? factors.erase(it) : std::next(it);
+    return factors;
+}
+
+// The largest prime in the factorization, or 1 for 1/1
+inline int64_t prime_limit(const std::map<int64_t, int> &factors)
+{
+    return factors.empty() ? 1 : factors.rbegin()->first;
+}
+
+// The larger of the odd parts of the numerator and denominator of the reduced ratio
+inline int64_t odd_limit(const Tunings::Tone &t)
+{
+    auto r = analysis::reduced(t.ratio_n, t.ratio_d);
+    auto odd = [](int64_t x) {
+        while (x % 2 == 0)
+            x /= 2;
+        return x;
+    };
+    return std::max(odd(r.n), odd(r.d));
+}
+
+// Largest prime limit for which monzos over consecutive primes are given
+inline constexpr int64_t kMaxMonzoPrime = 1 << 20;
+
+inline std::vector<int64_t> primes_up_to(int64_t n)
+{
+    std::vector<int64_t> primes;
+    std::vector<bool> composite(static_cast<size_t>(std::max<int64_t>(n + 1, 2)), false);
+    for (int64_t i = 2; i <= n; i++)
+    {
+        if (composite[i])
+            continue;
+        primes.push_back(i);
+        for (int64_t j = i * i; j <= n; j += i)
+            composite[j] = true;
+    }
+    return primes;
+}
+
+// Exponents of the factors over the consecutive primes 2, 3, 5, ... up to the prime limit
+inline std::vector<int64_t> monzo(const std::map<int64_t, int> &factors)
+{
+    auto limit = prime_limit(factors);
+    if (limit > kMaxMonzoPrime)
+        throw Tunings::TuningError("Prime limit " + std::to_string(limit) +
+                                   " is too large for a monzo over consecutive primes");
+    auto primes = primes_up_to(limit);
+    std::vector<int64_t> m(primes.size(), 0);
+    for (auto [p, e] : factors)
+        m[std::lower_bound(primes.begin(), primes.end(), p) - primes.begin()] = e;
+    return m;
+}
+
+struct ScaleLimits
+{
+    std::optional<int64_t> prime_limit, odd_limit;
+};
+
+// Limits of a scale from the factors of its tones, as given by tone_factors
+inline ScaleLimits scale_limits(const Tunings::Scale &s,
+                                const std::optional<std::map<int64_t, int>> *factors)
+{
+    int64_t p = 1, o = 1;
+    for (size_t k = 0; k < s.tones.size(); k++)
+    {
+        if (!factors[k])
+            return {};
+        p = std::max(p, prime_limit(*factors[k]));
+        o = std::max(o, odd_limit(s.tones[k]));
+    }
+    return {p, o};
+}
+
+// Limits of a scale, nullopt if any tone is not a ratio of positive integers
+inline ScaleLimits scale_limits(const Tunings::Scale &s)
+{
+    int64_t p = 1, o = 1;
+    for (const auto &t : s.tones)
+    {
+        auto factors = tone_factors(t);
+        if (!factors)
+            return {};
+        p = std::max(p, prime_limit(*factors));
+        o = std::max(o, odd_limit(t));
+    }
+    return {p, o};
+}
+
+} // namespace ji
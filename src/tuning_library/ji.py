@@ -0,0 +1,274 @@
+"""
+Index of a collection of scales for just intonation queries.
+"""
+
+import heapq
+import threading
+from collections import defaultdict
+from fractions import Fraction
+
+import numpy as np
+
+from ._tuning_library import scale_monzos
+
+
+def _ratio_key(ratio):
+    ratio = Fraction(*ratio) if isinstance(ratio, tuple) else Fraction(ratio)
+    return ratio.numerator, ratio.denominator
+
+
+def _grow(array, size):
+    """`array`, or a copy with room for at least `size` rows, doubling its capacity."""
+    if size <= len(array):
+        return array
+    grown = np.zeros((max(size, 2 * len(array)), *array.shape[1:]), array.dtype)
+    grown[: len(array)] = array
+    return grown
+
+
+class JIIndex:
+    """
+    Index of the prime factorizations of the tones of a collection of scales.
+
+    The tones of all the scales are factored once when they are added to the
+    index, so queries are lookups rather than scans over the collection.
+    Scales can be added and removed later, and only the changed scales are
+    factored again. The index is kept in buffers which grow by doubling, and
+    the indices and tones of removed scales are reused, so the cost of a
+    change doesn't grow with the size of the index, and memory use doesn't
+    grow as the same scales are removed and added again.
+
+    The index can be changed and queried from different threads, e.g. when
+    attached to a `DirectoryWatcher` refreshing in the background.
+
+    Parameters
+    ----------
+    scales : iterable of Scale, optional
+        Scales to index.
+
+    Attributes
+    ----------
+    scales : list of Scale
+        The indexed scales. Queries return indices into this list. Removed
+        scales have None in their place, until their index is reused by a
+        later addition.
+    prime_limits, odd_limits : numpy.ndarray
+        Prime and odd limits of each scale, -1 for scales with tones which are
+        not ratios.
+    primes : numpy.ndarray
+        The primes appearing in the factorization of any tone, in the order
+        they were first added.
+    monzos : numpy.ndarray
+        Exponents of `primes` for every tone, with the tones of scale i in rows
+        ``starts[i]:ends[i]``.
+    starts, ends : numpy.ndarray
+        Range of the rows of each scale in `monzos`.
+    """
+
+    def __init__(self, scales=()):
+        self.scales = []
+        self.primes = np.empty(0, dtype=np.int64)
+        self._columns = {}
+        self._prime_limits = np.empty(0, dtype=np.int64)
+        self._odd_limits = np.empty(0, dtype=np.int64)
+        self._starts = np.empty(0, dtype=np.int64)
+        self._ends = np.empty(0, dtype=np.int64)
+        self._live = np.empty(0, dtype=bool)
+        self._monzos = np.empty((0, 0), dtype=np.int64)
+        self._rows = 0
+        self._dead_rows = 0
+        self._free = []
+        self._ratios = defaultdict(set)
+        self._scale_ratios = []
+        self._lock = threading.Lock()
+        self.add(scales)
+
+    def __len__(self):
+        """Number of scales in the index, not counting removed scales."""
+        with self._lock:
+            return len(self.scales) - len(self._free)
+
+    @property
+    def prime_limits(self):
+        with self._lock:
+            return self._prime_limits[: len(self.scales)]
+
+    @property
+    def odd_limits(self):
+        with self._lock:
+            return self._odd_limits[: len(self.scales)]
+
+    @property
+    def starts(self):
+        with self._lock:
+            return self._starts[: len(self.scales)]
+
+    @property
+    def ends(self):
+        with self._lock:
+            return self._ends[: len(self.scales)]
+
+    @property
+    def monzos(self):
+        with self._lock:
+            return self._monzos[: self._rows, : len(self.primes)]
+
+    def _allocate(self, n):
+        """Indices for n new scales, reusing those of removed scales first."""
+        reused = [heapq.heappop(self._free) for _ in range(min(n, len(self._free)))]
+        first = len(self.scales)
+        size = first + n - len(reused)
+        for name in ("_prime_limits", "_odd_limits", "_starts", "_ends", "_live"):
+            setattr(self, name, _grow(getattr(self, name), size))
+        self.scales.extend([None] * (size - first))
+        self._scale_ratios.extend([None] * (size - first))
+        return np.array(reused + list(range(first, size)), dtype=np.intp)
+
+    def add(self, scales):
+        """
+        Add scales to the index.
+
+        Parameters
+        ----------
+        scales : iterable of Scale
+            Scales to add.
+
+        Returns
+        -------
+        numpy.ndarray
+            Indices of the added scales.
+        """
+        scales = list(scales)
+        data = scale_monzos(scales)
+        with self._lock:
+            indices = self._allocate(len(scales))
+
+            # Columns for any new primes
+            for p in data["primes"].tolist():
+                if p not in self._columns:
+                    self._columns[p] = len(self.primes)
+                    self.primes = np.append(self.primes, p)
+            columns = [self._columns[p] for p in data["primes"].tolist()]
+            if len(self.primes) > self._monzos.shape[1]:
+                width = max(len(self.primes), 2 * self._monzos.shape[1])
+                monzos = np.zeros((len(self._monzos), width), dtype=np.int64)
+                monzos[:, : self._monzos.shape[1]] = self._monzos
+                self._monzos = monzos
+
+            first, rows = self._rows, len(data["monzos"])
+            self._monzos = _grow(self._monzos, first + rows)
+            self._monzos[first : first + rows] = 0
+            self._monzos[first : first + rows, columns] = data["monzos"]
+            self._rows += rows
+
+            self._prime_limits[indices] = data["prime_limit"]
+            self._odd_limits[indices] = data["odd_limit"]
+            self._starts[indices] = first + data["offsets"][:-1]
+            self._ends[indices] = first + data["offsets"][1:]
+            self._live[indices] = True
+
+            scale_indices = np.repeat(indices, np.diff(data["offsets"]))
+            for i, scale in zip(indices.tolist(), scales):
+                self.scales[i] = scale
+                self._scale_ratios[i] = set()
+            for n, d, i in zip(
+                data["numerators"].tolist(),
+                data["denominators"].tolist(),
+                scale_indices.tolist(),
+            ):
+                if d:
+                    self._ratios[n, d].add(i)
+                    self._scale_ratios[i].add((n, d))
+        return indices
+
+    def remove(self, indices):
+        """
+        Remove the scales with the given indices from the index.
+
+        The indices are reused by later additions.
+        """
+        with self._lock:
+            for i in np.unique(indices).tolist():
+                if not self._live[i]:
+                    continue
+                self.scales[i] = None
+                self._live[i] = False
+                for key in self._scale_ratios[i]:
+                    self._ratios[key].discard(i)
+                    if not self._ratios[key]:
+                        del self._ratios[key]
+                self._scale_ratios[i] = None
+                self._dead_rows += int(self._ends[i] - self._starts[i])
+                self._starts[i] = self._ends[i] = 0
+                heapq.heappush(self._free, i)
+            if self._dead_rows > max(1024, self._rows - self._dead_rows):
+                self._compact()
+
+    def _compact(self):
+        """Drop the tones of removed scales, and primes no longer used."""
+        live = np.flatnonzero(self._live[: len(self.scales)])
+        lengths = self._ends[live] - self._starts[live]
+        starts = np.concatenate(([0], np.cumsum(lengths)[:-1])).astype(np.int64)
+        rows = np.repeat(self._starts[live] - starts, lengths) + np.arange(lengths.sum())
+        monzos = self._monzos[rows, : len(self.primes)]
+        used = (monzos != 0).any(axis=0)
+        self.primes = self.primes[used]
+        self._columns = {p: c for c, p in enumerate(self.primes.tolist())}
+        self._monzos = np.ascontiguousarray(monzos[:, used])
+        self._starts[live] = starts
+        self._ends[live] = starts + lengths
+        self._rows = len(self._monzos)
+        self._dead_rows = 0
+
+    def within_prime_limit(self, limit):
+        """Indices of the just intonation scales with prime limit at most `limit`."""
+        with self._lock:
+            n = len(self.scales)
+            limits = self._prime_limits[:n]
+            return np.flatnonzero(self._live[:n] & (limits >= 0) & (limits <= limit))
+
+    def within_odd_limit(self, limit):
+        """Indices of the just intonation scales with odd limit at most `limit`."""
+        with self._lock:
+            n = len(self.scales)
+            limits = self._odd_limits[:n]
+            return np.flatnonzero(self._live[:n] & (limits >= 0) & (limits <= limit))
+
+    def containing(self, ratio):
+        """
+        Indices of the scales containing a tone with the given ratio.
+
+        Parameters
+        ----------
+        ratio : str, Fraction, int or tuple of (int, int)
+            Ratio to search for, e.g. "13/11", Fraction(13, 11) or (13, 11).
+            Ratios are compared in lowest terms, so "26/22" finds 13/11.
+
+        Returns
+        -------
+        numpy.ndarray
+            Increasing indices of scales containing the ratio.
+        """
+        with self._lock:
+            indices = list(self._ratios.get(_ratio_key(ratio), ()))
+        return np.sort(np.array(indices, dtype=np.intp))
+
+    def using_primes(self, primes):
+        """
+        Indices of the just intonation scales whose tones only use the given primes.
+
+        Parameters
+        ----------
+        primes : iterable of int
+            Allowed primes, e.g. (2, 3, 7) for scales without any 5s.
+        """
+        primes = list(primes)
+        with self._lock:
+            n = len(self.scales)
+            excluded = np.flatnonzero(~np.isin(self.primes, primes))
+            uses_excluded = (self._monzos[: self._rows, excluded] != 0).any(axis=1)
+            cumulative = np.concatenate(([0], np.cumsum(uses_excluded)))
+            counts = cumulative[self._ends[:n]] - cumulative[self._starts[:n]]
+            return np.flatnonzero(
+                self._live[:n] & (counts == 0) & (self._prime_limits[:n] >= 0)
+            )
@@ -0,0 +1,96 @@
+#pragma once
+
+#include <cstdint>
+#include <string>
+#include <vector>
+#include "Tunings.h"
+
+/*
+ * Isomorphic layouts of a tuning on a grid controller, where moving one
+ * column right moves x_step notes of the tuning and moving one row up moves
+ * y_step notes.
+ *
+ * Rows are numbered from 0 at the bottom and columns from 0 at the left. The
+ * pad at (row, column) plays tuning note
+ *
+ *     origin_note + column * x_step + row * y_step + transpose
+ *
+ * and sends midi note first_note + row * row_stride + column.
+ */
+namespace layout
+{
+
+struct Grid
+{
+    int rows, columns;
+    int x_step, y_step, transpose;
+    int origin_note;
+    int first_note, row_stride;
+};
+
+struct Layout
+{
+    std::vector<int64_t> steps;          // tuning notes from the origin note
+    std::vector<double> frequencies;     // frequency of each pad
+    std::vector<int64_t> labels;         // scale position of each pad, -1 if unmapped
+    std::vector<int64_t> pad_notes;      // midi note sent by each pad
+    std::vector<double> note_frequencies; // frequency for each of the 128 midi notes
+};
+
+inline int64_t floor_div(int64_t a, int64_t b)
+{
+    auto q = a / b;
+    return (a % b != 0 && ((a < 0) != (b < 0))) ? q - 1 : q;
+}
+
+inline void check(const Grid &g)
+{
+    if (g.rows < 0 || g.columns < 0)
+        throw Tunings::TuningError("Grid should have a non negative number of rows and columns. "
+                                   "You entered " +
+                                   std::to_string(g.rows) + " x " + std::to_string(g.columns));
+    if (g.row_stride <= 0)
+        throw Tunings::TuningError("Row stride should be a positive number. You entered " +
+                                   std::to_string(g.row_stride));
+}
+
+inline Layout grid_layout(const Tunings::Tuning &tuning, const Grid &g)
+{
+    check(g);
+    Layout l;
+    auto pads = static_cast<size_t>(g.rows) * g.columns;
+    l.steps.resize(pads);
+    l.frequencies.resize(pads);
+    l.labels.resize(pads);
+    l.pad_notes.resize(pads);
+    for (int r = 0; r < g.rows; r++)
+    {
+        for (int c = 0; c < g.columns; c++)
+        {
+            auto i = static_cast<size_t>(r) * g.columns + c;
+            int step = c * g.x_step + r * g.y_step + g.transpose;
+            int note = g.origin_note + step;
+            l.steps[i] = step;
+            l.frequencies[i] = tuning.frequencyForMidiNote(note);
+            l.labels[i] = tuning.isMidiNoteMapped(note) ? tuning.scalePositionForMidiNote(note) : -1;
+            l.pad_notes[i] = g.first_note + r * g.row_stride + c;
+        }
+    }
+
+    // Every midi note gets the frequency of the pad it would be sent by if the
+    // grid were extended, with each block of row_stride notes starting on a
+    // multiple of row_stride as a row, like the side buttons of a controller
+    l.note_frequencies.resize(128);
+    auto first_row = floor_div(g.first_note, g.row_stride);
+    auto first_column = g.first_note - first_row * g.row_stride;
+    for (int n = 0; n < 128; n++)
+    {
+        auto r = floor_div(n, g.row_stride) - first_row;
+        auto c = n - floor_div(n, g.row_stride) * g.row_stride - first_column;
+        auto step = c * g.x_step + r * g.y_step + g.transpose;
+        l.note_frequencies[n] = tuning.frequencyForMidiNote(static_cast<int>(g.origin_note + step));
+    }
+    return l;
+}
+
+} // namespace layout
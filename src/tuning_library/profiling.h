@@ -0,0 +1,195 @@
+#pragma once
+
+#include <array>
+#include <atomic>
+#include <chrono>
+#include <cstdint>
+#include <limits>
+#include <mutex>
+#include <pybind11/pybind11.h>
+
+namespace py = pybind11;
+
+/*
+ * Opt-in instrumentation of the module entry points.
+ *
+ * When profiling is disabled each instrumented call costs a single relaxed
+ * atomic load. When enabled, each call updates a counter, the cumulative, min
+ * and max time, and a histogram with log2 spaced nanosecond buckets, and then
+ * calls the user hook (if one is set) with the entry point name and elapsed
+ * time in nanoseconds. Exceptions raised by the hook are reported through
+ * sys.unraisablehook rather than raised from the instrumented call.
+ */
+namespace profiling
+{
+
+enum Entry
+{
+    kReadSCLFile,
+    kParseSCLData,
+    kReadKBMFile,
+    kParseKBMData,
+    kTuningInit,
+    kFrequencyForMidiNote,
+    kFrequencyForMidiNoteScaledByMidi0,
+    kLogScaledFrequencyForMidiNote,
+    kRetuningFromEqualInCentsForMidiNote,
+    kRetuningFromEqualInSemitonesForMidiNote,
+    kScalePositionForMidiNote,
+    kIsMidiNoteMapped,
+    kNumEntries
+};
+
+inline constexpr std::array<const char *, kNumEntries> entry_names = {
+    "_read_scl_file",
+    "parse_scl_data",
+    "_read_kbm_file",
+    "parse_kbm_data",
+    "Tuning.__init__",
+    "Tuning.frequency_for_midi_note",
+    "Tuning.frequency_for_midi_note_scaled_by_midi_0",
+    "Tuning.log_scaled_frequency_for_midi_note",
+    "Tuning.retuning_from_equal_in_cents_for_midi_note",
+    "Tuning.retuning_from_equal_in_semitones_for_midi_note",
+    "Tuning.scale_position_for_midi_note",
+    "Tuning.is_midi_note_mapped",
+};
+
+// Bucket i counts calls taking [2^i, 2^(i+1)) ns, bucket 0 also counts 0 ns
+inline constexpr int kHistogramBuckets = 40;
+
+struct Counter
+{
+    std::atomic<uint64_t> count{0};
+    std::atomic<uint64_t> total_ns{0};
+    std::atomic<uint64_t> min_ns{std::numeric_limits<uint64_t>::max()};
+    std::atomic<uint64_t> max_ns{0};
+    std::array<std::atomic<uint64_t>, kHistogramBuckets> histogram{};
+
+    void reset()
+    {
+        count = 0;
+        total_ns = 0;
+        min_ns = std::numeric_limits<uint64_t>::max();
+        max_ns = 0;
+        for (auto &h : histogram)
+            h = 0;
+    }
+
+    void add(uint64_t ns)
+    {
+        count.fetch_add(1, std::memory_order_relaxed);
+        total_ns.fetch_add(ns, std::memory_order_relaxed);
+        auto lo = min_ns.load(std::memory_order_relaxed);
+        while (ns < lo && !min_ns.compare_exchange_weak(lo, ns, std::memory_order_relaxed))
+        {
+        }
+        auto hi = max_ns.load(std::memory_order_relaxed);
+        while (ns > hi && !max_ns.compare_exchange_weak(hi, ns, std::memory_order_relaxed))
+        {
+        }
+        int bucket = 0;
+        while (bucket < kHistogramBuckets - 1 && (ns >> (bucket + 1)) != 0)
+            bucket++;
+        histogram[bucket].fetch_add(1, std::memory_order_relaxed);
+    }
+};
+
+inline std::atomic<bool> enabled{false};
+inline std::array<Counter, kNumEntries> counters;
+
+// The hook is only touched with a strong reference taken under hook_mutex, so
+// it can be swapped while other threads are calling it
+inline std::mutex hook_mutex;
+inline PyObject *hook = nullptr;
+
+inline void set_hook(py::object h)
+{
+    PyObject *old;
+    {
+        std::lock_guard<std::mutex> lock(hook_mutex);
+        old = hook;
+        hook = h.is_none() ? nullptr : h.release().ptr();
+    }
+    Py_XDECREF(old);
+}
+
+inline py::object get_hook()
+{
+    std::lock_guard<std::mutex> lock(hook_mutex);
+    return hook ? py::reinterpret_borrow<py::object>(hook) : py::none();
+}
+
+inline void reset()
+{
+    for (auto &c : counters)
+        c.reset();
+}
+
+inline py::dict stats()
+{
+    py::dict d;
+    for (int e = 0; e < kNumEntries; e++)
+    {
+        const auto &c = counters[e];
+        auto count = c.count.load();
+        py::list histogram;
+        for (const auto &h : c.histogram)
+            histogram.append(h.load());
+        py::dict entry;
+        entry["count"] = count;
+        entry["total_ns"] = c.total_ns.load();
+        entry["min_ns"] = count ? c.min_ns.load() : 0;
+        entry["max_ns"] = c.max_ns.load();
+        entry["histogram"] = histogram;
+        d[entry_names[e]] = entry;
+    }
+    return d;
+}
+
+/*
+ * Call f, recording its timing under entry e if profiling is enabled. Must be
+ * called with the GIL held, since the hook is called after f returns.
+ */
+template <typename F> auto timed(Entry e, F &&f) -> decltype(f())
+{
+    if (!enabled.load(std::memory_order_relaxed))
+        return f();
+
+    // Calls are recorded whether or not f throws, the hook is only called
+    // for calls which return
+    uint64_t ns = 0;
+    auto result = [&]() {
+        struct Record
+        {
+            Entry e;
+            uint64_t &ns;
+            std::chrono::steady_clock::time_point start = std::chrono::steady_clock::now();
+            ~Record()
+            {
+                ns = static_cast<uint64_t>(std::chrono::duration_cast<std::chrono::nanoseconds>(
+                                               std::chrono::steady_clock::now() - start)
+                                               .count());
+                counters[e].add(ns);
+            }
+        } record{e, ns};
+        return f();
+    }();
+    // An error in the hook shouldn't lose the result of the call, so it is
+    // reported as unraisable, like errors in __del__
+    auto h = get_hook();
+    if (!h.is_none())
+    {
+        try
+        {
+            h(entry_names[e], ns);
+        }
+        catch (py::error_already_set &error)
+        {
+            error.discard_as_unraisable(h);
+        }
+    }
+    return result;
+}
+
+} // namespace profiling
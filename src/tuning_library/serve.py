@@ -0,0 +1,506 @@
+"""
+A local tuning service answering frequency lookups over a Unix domain socket.
+
+Start the daemon with
+
+    $ python -m tuning_library.serve --socket /tmp/tunings.sock
+
+and query it from any process with a `TuningClient`
+
+    >>> client = TuningClient("/tmp/tunings.sock")
+    >>> client.frequencies("scale.scl", "mapping.kbm")  # all 128 midi notes
+    >>> client.lookup([60, 64, 67], "scale.scl")
+
+The daemon parses each scale and mapping once and caches the frequency table
+of each tuning, so clients never parse scl or kbm files themselves. Files are
+read by the daemon, with its permissions, and are reloaded when they change,
+so by default the socket is only accessible to the user running the daemon.
+
+Protocol
+--------
+Every message is a little endian uint32 payload length followed by the
+payload. A request payload is
+
+    uint8 op, scale source, mapping source, then for OP_LOOKUP
+    uint32 n and n int32 midi notes
+
+where a source is a uint8 kind (SOURCE_DEFAULT, SOURCE_FILE or
+SOURCE_CONTENT), a uint32 length and that many bytes of the file path or the
+file contents. A response payload is a uint8 status, followed by float64
+frequencies if the status is STATUS_OK or a UTF-8 error message if it is
+STATUS_ERROR. Connections stay open for any number of requests, including
+after an error response to a malformed request.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import os
+import queue
+import signal
+import socket
+import stat
+import struct
+import tempfile
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+
+from ._tuning_library import (
+    KeyboardMapping,
+    TuningError,
+    _read_kbm_file,
+    _read_scl_file,
+    even_temperament_12_note_scale,
+    parse_kbm_data,
+    parse_scl_data,
+    tuning_frequencies,
+)
+
+OP_FREQUENCIES = 1
+OP_LOOKUP = 2
+
+SOURCE_DEFAULT = 0
+SOURCE_FILE = 1
+SOURCE_CONTENT = 2
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+MAX_MESSAGE_SIZE = 64 << 20
+
+_LENGTH = struct.Struct("<I")
+_SOURCE = struct.Struct("<BI")
+
+
+class ProtocolError(ValueError):
+    """A malformed message."""
+
+
+class _StaleConnection(Exception):
+    """A pooled connection which the service has closed."""
+
+
+def default_socket_path():
+    """Default socket path, in the temporary directory and unique per user."""
+    return os.path.join(tempfile.gettempdir(), f"tuning_library-{os.getuid()}.sock")
+
+
+def _encode_source(source):
+    if source is None:
+        return _SOURCE.pack(SOURCE_DEFAULT, 0)
+    if isinstance(source, (str, os.PathLike)):
+        data = os.fsencode(os.path.abspath(source))
+        return _SOURCE.pack(SOURCE_FILE, len(data)) + data
+    data = bytes(source)
+    return _SOURCE.pack(SOURCE_CONTENT, len(data)) + data
+
+
+def _decode_source(payload, offset):
+    if len(payload) < offset + _SOURCE.size:
+        raise ProtocolError("Truncated source")
+    kind, length = _SOURCE.unpack_from(payload, offset)
+    offset += _SOURCE.size
+    if kind not in (SOURCE_DEFAULT, SOURCE_FILE, SOURCE_CONTENT):
+        raise ProtocolError(f"Unknown source kind {kind}")
+    if len(payload) < offset + length:
+        raise ProtocolError("Truncated source")
+    return (kind, bytes(payload[offset : offset + length])), offset + length
+
+
+def encode_request(op, scale=None, mapping=None, notes=None):
+    """
+    Encode a request, without the length prefix.
+
+    `scale` and `mapping` are a filename (str or Path), the contents of a file
+    (a bytes like object) or None for the default scale or mapping.
+    """
+    parts = [bytes([op]), _encode_source(scale), _encode_source(mapping)]
+    if op == OP_LOOKUP:
+        notes = np.ascontiguousarray(notes, dtype="<i4").ravel()
+        parts += [_LENGTH.pack(len(notes)), notes.tobytes()]
+    return b"".join(parts)
+
+
+def decode_request(payload):
+    """Decode a request payload into (op, scale source, mapping source, notes)."""
+    if not payload:
+        raise ProtocolError("Empty request")
+    op = payload[0]
+    scale, offset = _decode_source(payload, 1)
+    mapping, offset = _decode_source(payload, offset)
+    notes = None
+    if op == OP_LOOKUP:
+        if len(payload) < offset + _LENGTH.size:
+            raise ProtocolError("Truncated notes")
+        (n,) = _LENGTH.unpack_from(payload, offset)
+        offset += _LENGTH.size
+        if len(payload) != offset + 4 * n:
+            raise ProtocolError("Wrong number of notes")
+        notes = np.frombuffer(payload, dtype="<i4", count=n, offset=offset)
+    elif op != OP_FREQUENCIES:
+        raise ProtocolError(f"Unknown op {op}")
+    elif len(payload) != offset:
+        raise ProtocolError("Trailing data in request")
+    return op, scale, mapping, notes
+
+
+class TuningCache:
+    """
+    Least recently used cache of the frequency tables of tunings.
+
+    Tunings are keyed by the path, modification time and size of their files,
+    or by a hash of their contents, so a file is reloaded when it changes.
+
+    Parameters
+    ----------
+    maxsize : int, optional
+        Maximum number of tunings to keep.
+    """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._tables = OrderedDict()
+        self._pending = {}
+
+    def __len__(self):
+        return len(self._tables)
+
+    def evict(self, paths):
+        """
+        Remove the cached tunings using any of the given scl or kbm files.
+
+        Returns the number of tunings removed.
+        """
+        paths = {os.fsencode(os.path.abspath(p)) for p in paths}
+        stale = [
+            key
+            for key in self._tables
+            if any(k[0] == SOURCE_FILE and k[1] in paths for k in key)
+        ]
+        for key in stale:
+            del self._tables[key]
+        return len(stale)
+
+    @staticmethod
+    def _key(source):
+        kind, data = source
+        if kind == SOURCE_FILE:
+            st = os.stat(os.fsdecode(data))
+            return kind, data, st.st_mtime_ns, st.st_size
+        if kind == SOURCE_CONTENT:
+            return kind, hashlib.blake2b(data, digest_size=16).digest()
+        return (kind,)
+
+    @classmethod
+    def _keys(cls, scale, mapping):
+        return cls._key(scale), cls._key(mapping)
+
+    @staticmethod
+    def _load(scale, mapping):
+        kind, data = scale
+        if kind == SOURCE_FILE:
+            scale = _read_scl_file(os.fsdecode(data))
+        elif kind == SOURCE_CONTENT:
+            scale = parse_scl_data(data)
+        else:
+            scale = even_temperament_12_note_scale()
+        kind, data = mapping
+        if kind == SOURCE_FILE:
+            mapping = _read_kbm_file(os.fsdecode(data))
+        elif kind == SOURCE_CONTENT:
+            mapping = parse_kbm_data(data)
+        else:
+            mapping = KeyboardMapping()
+        return tuning_frequencies([scale], [mapping])[0]
+
+    async def get(self, scale, mapping):
+        """
+        Frequency table of the 128 midi notes for the tuning of a scale and
+        mapping source, loading it in a worker thread if it isn't cached.
+        """
+        loop = asyncio.get_running_loop()
+        if SOURCE_FILE in (scale[0], mapping[0]):
+            # Files are checked for changes with os.stat, which can block on
+            # slow or network file systems, so not on the event loop
+            key = await loop.run_in_executor(None, self._keys, scale, mapping)
+        else:
+            key = self._keys(scale, mapping)
+        table = self._tables.get(key)
+        if table is not None:
+            self.hits += 1
+            self._tables.move_to_end(key)
+            return table
+
+        # Concurrent requests for the same tuning share one load
+        self.misses += 1
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = loop.run_in_executor(None, self._load, scale, mapping)
+            self._pending[key] = pending
+            try:
+                table = await asyncio.shield(pending)
+            finally:
+                del self._pending[key]
+            self._tables[key] = table
+            while len(self._tables) > self.maxsize:
+                self._tables.popitem(last=False)
+            return table
+        return await asyncio.shield(pending)
+
+
+async def _respond(cache, payload):
+    try:
+        op, scale, mapping, notes = decode_request(payload)
+        table = await cache.get(scale, mapping)
+        if op == OP_LOOKUP:
+            if notes.size and (notes.min() < 0 or notes.max() > 127):
+                raise ValueError("Midi notes should be between 0 and 127")
+            table = table[notes]
+    except (TuningError, OSError, ValueError) as e:
+        return bytes([STATUS_ERROR]) + str(e).encode()
+    return bytes([STATUS_OK]) + table.astype("<f8").tobytes()
+
+
+async def _handle(cache, reader, writer):
+    try:
+        while True:
+            try:
+                header = await reader.readexactly(_LENGTH.size)
+            except asyncio.IncompleteReadError:
+                break
+            (length,) = _LENGTH.unpack(header)
+            if length > MAX_MESSAGE_SIZE:
+                break
+            response = await _respond(cache, await reader.readexactly(length))
+            writer.write(_LENGTH.pack(len(response)) + response)
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+def _remove_socket(path):
+    try:
+        if stat.S_ISSOCK(os.stat(path).st_mode):
+            os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+async def start_server(path, cache=None, mode=0o600):
+    """
+    Start serving on a Unix domain socket at `path`, returning the
+    asyncio.Server.
+
+    Parameters
+    ----------
+    path : str or Path
+        Path of the socket. An existing socket at the path, e.g. left by a
+        previous run, is replaced.
+    cache : TuningCache, optional
+        Cache of tunings to serve from.
+    mode : int, optional
+        Permissions of the socket. Clients can read any file the daemon can,
+        so by default only the owner can connect.
+    """
+    cache = TuningCache() if cache is None else cache
+    path = os.fspath(path)
+    _remove_socket(path)
+    # Set the mode before listening, so no one can connect in between
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.bind(path)
+        os.chmod(path, mode)
+    except OSError:
+        sock.close()
+        raise
+    return await asyncio.start_unix_server(lambda r, w: _handle(cache, r, w), sock=sock)
+
+
+async def serve(path, cache=None, mode=0o600):
+    """Serve on a Unix domain socket at `path` until cancelled."""
+    server = await start_server(path, cache, mode)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        _remove_socket(path)
+
+
+class TuningClient:
+    """
+    Client for the tuning service, keeping a pool of open connections.
+
+    Can be shared between threads, each request using a connection from the
+    pool.
+
+    Parameters
+    ----------
+    path : str or Path, optional
+        Path of the service's socket.
+    pool_size : int, optional
+        Maximum number of idle connections to keep open.
+    timeout : float, optional
+        Timeout in seconds for each request.
+    """
+
+    def __init__(self, path=None, pool_size=4, timeout=None):
+        self.path = os.fspath(path) if path is not None else default_socket_path()
+        self.timeout = timeout
+        self._pool = queue.LifoQueue(pool_size)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Close all pooled connections."""
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+    @contextmanager
+    def _connection(self, reuse=True):
+        """A connection, and whether it was reused from the pool."""
+        sock = None
+        if reuse:
+            try:
+                sock = self._pool.get_nowait()
+            except queue.Empty:
+                pass
+        reused = sock is not None
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.path)
+            except OSError:
+                sock.close()
+                raise
+        try:
+            yield sock, reused
+        except BaseException:
+            sock.close()
+            raise
+        try:
+            self._pool.put_nowait(sock)
+        except queue.Full:
+            sock.close()
+
+    @staticmethod
+    def _read(sock, n):
+        buffer = bytearray(n)
+        view = memoryview(buffer)
+        while view:
+            read = sock.recv_into(view)
+            if not read:
+                raise ConnectionError("Tuning service closed the connection")
+            view = view[read:]
+        return buffer
+
+    def _exchange(self, message, reuse):
+        with self._connection(reuse) as (sock, reused):
+            try:
+                sock.sendall(message)
+                (length,) = _LENGTH.unpack(self._read(sock, _LENGTH.size))
+            except ConnectionError:
+                if reused:
+                    raise _StaleConnection from None
+                raise
+            return self._read(sock, length)
+
+    def _request(self, payload):
+        message = _LENGTH.pack(len(payload)) + payload
+        try:
+            response = self._exchange(message, reuse=True)
+        except _StaleConnection:
+            # The service closed the idle connection, e.g. when it restarted,
+            # so retry once on a new one
+            response = self._exchange(message, reuse=False)
+        if response[0] != STATUS_OK:
+            raise TuningError(response[1:].decode())
+        return np.frombuffer(response, dtype="<f8", offset=1)
+
+    def frequencies(self, scale=None, mapping=None):
+        """
+        Frequencies of the 128 midi notes for a scale and keyboard mapping.
+
+        Parameters
+        ----------
+        scale, mapping : str, Path, bytes like object or None
+            Filename of an scl or kbm file (read by the service), the contents
+            of one, or None for the default scale or mapping.
+
+        Returns
+        -------
+        numpy.ndarray
+            Frequency in Hz of each midi note.
+        """
+        return self._request(encode_request(OP_FREQUENCIES, scale, mapping))
+
+    def lookup(self, notes, scale=None, mapping=None):
+        """
+        Frequencies of the given midi notes for a scale and keyboard mapping.
+
+        See `frequencies` for the scale and mapping parameters.
+        """
+        return self._request(encode_request(OP_LOOKUP, scale, mapping, notes))
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m tuning_library.serve",
+        description="Serve tuning frequency tables over a Unix domain socket",
+    )
+    parser.add_argument(
+        "--socket", "-s", default=None, help="Path of the socket to listen on"
+    )
+    parser.add_argument(
+        "--cache-size",
+        "-c",
+        type=int,
+        default=256,
+        help="Maximum number of tunings to cache",
+    )
+    parser.add_argument(
+        "--mode",
+        "-m",
+        type=lambda mode: int(mode, 8),
+        default=0o600,
+        help="Permissions of the socket in octal, by default 600",
+    )
+    return parser
+
+
+async def _serve_until_terminated(path, cache, mode):
+    # Stop cleanly on SIGTERM, so the socket is removed
+    task = asyncio.current_task()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, task.cancel)
+    try:
+        await serve(path, cache, mode)
+    except asyncio.CancelledError:
+        pass
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+    path = args.socket if args.socket is not None else default_socket_path()
+    print(f"Serving tunings on {path}", flush=True)
+    try:
+        cache = TuningCache(args.cache_size)
+        asyncio.run(_serve_until_terminated(path, cache, args.mode))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""
+Nearest neighbour search for similar scales, whatever their number of tones.
+"""
+
+import heapq
+import threading
+
+import numpy as np
+
+from ._tuning_library import Scale, scale_features
+from .ji import _grow
+
+
+class SimilarityIndex:
+    """
+    Index of a collection of scales for finding the most similar scales.
+
+    Each scale is described by a fixed length feature vector, the profile of
+    the intervals between all its pitches from `scale_features`, followed by
+    its period in octaves scaled by `period_weight`. The profile is the same
+    for every mode of a scale, and scales with different numbers of tones can
+    be compared, e.g. 12 equal is close to 24 equal.
+
+    The vectors are kept in a k-d tree over their projections onto the first
+    few principal components. A projection is never further from the query
+    than the full vector, so the tree prunes whole branches while the results
+    are ranked by the distance between the full vectors. Searches visit the
+    leaves of the tree nearest the query first and by default stop after a
+    fixed number of leaves, so their time doesn't grow with the number of
+    scales, but they can miss some of the nearest scales. Searches with
+    ``max_leaves=None`` are exact.
+
+    Scales can be added and removed later. Added scales are searched directly
+    until enough have been added to rebuild the tree. Vectors are kept in
+    buffers which grow by doubling, and the indices of removed scales are
+    reused once the tree has been rebuilt without them, so memory use doesn't
+    grow as the same scales are removed and added again. The index can be
+    changed and queried from different threads.
+
+    Parameters
+    ----------
+    scales : iterable of Scale, optional
+        Scales to index.
+    bins : int, optional
+        Number of bins in the interval profile.
+    width : float, optional
+        Width in cents of the smoothing of the interval profile, so intervals
+        differing by much less than this count as the same.
+    period_weight : float, optional
+        Weight of the period, in octaves, in the feature vector. 0 ignores the
+        period so, e.g., 13 equal divisions of 3/1 match 13 equal divisions of
+        the octave.
+    dims : int, optional
+        Number of principal components for the k-d tree.
+    leaf_size : int, optional
+        Maximum number of scales in a leaf of the k-d tree.
+
+    Attributes
+    ----------
+    scales : list of Scale
+        The indexed scales. Queries return indices into this list. Removed
+        scales have None in their place, until their index is reused by a
+        later addition.
+    features : numpy.ndarray
+        Feature vector of each scale.
+    """
+
+    def __init__(
+        self, scales=(), bins=32, width=20.0, period_weight=1.0, dims=12, leaf_size=32
+    ):
+        self.bins = bins
+        self.width = width
+        self.period_weight = period_weight
+        self.dims = dims
+        self.leaf_size = leaf_size
+        self.scales = []
+        self._features = np.empty((0, bins + 1))
+        self._live = np.empty(0, dtype=bool)
+        self._free = []
+        self._retired = []
+        self._lock = threading.Lock()
+        self._build([])
+        self.add(scales)
+
+    def __len__(self):
+        """Number of scales in the index, not counting removed scales."""
+        with self._lock:
+            return len(self.scales) - len(self._free) - len(self._retired)
+
+    @property
+    def features(self):
+        with self._lock:
+            return self._features[: len(self.scales)]
+
+    def scale_features(self, scales):
+        """
+        Feature vectors of scales, as used by this index.
+
+        Parameters
+        ----------
+        scales : iterable of Scale
+
+        Returns
+        -------
+        numpy.ndarray
+            Array of shape (len(scales), bins + 1).
+        """
+        return scale_features(scales, self.bins, self.width, self.period_weight)
+
+    def add(self, scales):
+        """
+        Add scales to the index.
+
+        Parameters
+        ----------
+        scales : iterable of Scale
+            Scales to add.
+
+        Returns
+        -------
+        numpy.ndarray
+            Indices of the added scales.
+        """
+        scales = list(scales)
+        features = self.scale_features(scales)
+        with self._lock:
+            reused = [
+                heapq.heappop(self._free) for _ in range(min(len(scales), len(self._free)))
+            ]
+            first = len(self.scales)
+            size = first + len(scales) - len(reused)
+            self._features = _grow(self._features, size)
+            self._live = _grow(self._live, size)
+            self.scales.extend([None] * (size - first))
+            added = np.array(reused + list(range(first, size)), dtype=np.intp)
+            for i, scale in zip(added.tolist(), scales):
+                self.scales[i] = scale
+            self._features[added] = features
+            self._live[added] = True
+            self._pending.update(added.tolist())
+            if len(self._pending) > max(256, len(self._ids) // 4):
+                self._build(np.flatnonzero(self._live[: len(self.scales)]))
+        return added
+
+    def remove(self, indices):
+        """
+        Remove the scales with the given indices from the index.
+
+        The indices are reused by later additions.
+        """
+        with self._lock:
+            for i in np.unique(indices).tolist():
+                if not self._live[i]:
+                    continue
+                self.scales[i] = None
+                self._live[i] = False
+                # The tree still has the vectors of removed scales, so their
+                # indices are only reused once it is rebuilt
+                if i in self._pending:
+                    self._pending.remove(i)
+                    heapq.heappush(self._free, i)
+                else:
+                    self._retired.append(i)
+            if len(self._retired) > len(self._ids) // 2:
+                self._build(np.flatnonzero(self._live[: len(self.scales)]))
+
+    def _build(self, ids):
+        ids = np.asarray(ids, dtype=np.intp)
+        self._pending = set()
+        for i in self._retired:
+            heapq.heappush(self._free, i)
+        self._retired = []
+        features = self._features[ids]
+
+        # Principal components, from a sample of the scales for large indexes
+        self._mean = features.mean(axis=0) if len(ids) else np.zeros(self.bins + 1)
+        sample = features
+        if len(sample) > 20000:
+            sample = sample[np.random.default_rng(0).choice(len(sample), 20000, replace=False)]
+        if len(sample):
+            _, _, vt = np.linalg.svd(sample - self._mean, full_matrices=False)
+            self._components = vt[: self.dims]
+        else:
+            self._components = np.empty((0, self.bins + 1))
+        projected = (features - self._mean) @ self._components.T
+
+        # Nodes cover ranges of the scales in tree order, with a bounding box
+        # of their projections. Leaves have no children.
+        order = np.arange(len(ids))
+        starts, ends, children, lows, highs = [], [], [], [], []
+        stack = [(0, len(ids), -1, 0)]
+        while stack:
+            start, end, parent, side = stack.pop()
+            node = len(starts)
+            if parent >= 0:
+                children[parent][side] = node
+            points = projected[order[start:end]]
+            starts.append(start)
+            ends.append(end)
+            children.append([-1, -1])
+            lows.append(points.min(axis=0) if len(points) else np.zeros(projected.shape[1]))
+            highs.append(points.max(axis=0) if len(points) else np.zeros(projected.shape[1]))
+            if end - start <= self.leaf_size:
+                continue
+            axis = int(np.argmax(highs[-1] - lows[-1]))
+            middle = (end - start) // 2
+            split = np.argpartition(points[:, axis], middle)
+            order[start:end] = order[start:end][split]
+            stack.append((start + middle, end, node, 1))
+            stack.append((start, start + middle, node, 0))
+
+        self._ids = ids[order]
+        self._tree_features = features[order]
+        self._starts, self._ends = starts, ends
+        self._children = children
+        self._lows, self._highs = np.array(lows), np.array(highs)
+
+    def _bound(self, node, q):
+        gap = np.maximum(self._lows[node] - q, 0) + np.maximum(q - self._highs[node], 0)
+        return float(np.sqrt(gap @ gap))
+
+    def query(self, scale, k=10, max_leaves=64, eps=0.0):
+        """
+        Find the scales most similar to a scale.
+
+        Parameters
+        ----------
+        scale : Scale or array_like
+            Scale to match, or its feature vector.
+        k : int, optional
+            Number of scales to find.
+        max_leaves : int or None, optional
+            Stop after ranking the scales in this many leaves of the k-d tree,
+            which bounds the time of a search. If None the search continues
+            until no nearer scale can be found.
+        eps : float, optional
+            Allowed relative error of an exact search. With eps > 0 the
+            distance to the ith scale found is at most 1 + eps times the
+            distance to the true ith nearest scale, and searches stop sooner.
+
+        Returns
+        -------
+        indices : numpy.ndarray
+            Indices of the most similar scales, nearest first.
+        distances : numpy.ndarray
+            Distances between the feature vectors.
+        """
+        if isinstance(scale, Scale):
+            q = self.scale_features([scale])[0]
+        else:
+            q = np.asarray(scale, dtype=float)
+            if q.shape != (self.bins + 1,):
+                raise ValueError(f"Feature vector should have shape ({self.bins + 1},)")
+        with self._lock:
+            return self._query(q, k, max_leaves, eps)
+
+    def _query(self, q, k, max_leaves, eps):
+        best_ids = np.empty(0, dtype=np.intp)
+        best_distances = np.empty(0)
+
+        def merge(ids, features):
+            nonlocal best_ids, best_distances
+            live = self._live[ids]
+            ids, features = ids[live], features[live]
+            distances = np.sqrt(((features - q) ** 2).sum(axis=1))
+            best_ids = np.concatenate((best_ids, ids))
+            best_distances = np.concatenate((best_distances, distances))
+            if len(best_ids) > k:
+                keep = np.argpartition(best_distances, k - 1)[:k]
+                best_ids, best_distances = best_ids[keep], best_distances[keep]
+
+        if k > 0:
+            pending = np.fromiter(self._pending, np.intp, len(self._pending))
+            merge(pending, self._features[pending])
+        if k > 0 and len(self._ids):
+            qp = (q - self._mean) @ self._components.T
+            heap = [(self._bound(0, qp), 0)]
+            leaves = 0
+            while heap and (max_leaves is None or leaves < max_leaves):
+                bound, node = heapq.heappop(heap)
+                if len(best_ids) == k and bound * (1 + eps) >= best_distances.max():
+                    break
+                left, right = self._children[node]
+                if left < 0:
+                    start, end = self._starts[node], self._ends[node]
+                    merge(self._ids[start:end], self._tree_features[start:end])
+                    leaves += 1
+                else:
+                    heapq.heappush(heap, (self._bound(left, qp), left))
+                    heapq.heappush(heap, (self._bound(right, qp), right))
+
+        order = np.lexsort((best_ids, best_distances))
+        return best_ids[order], best_distances[order]
@@ -1,10 +1,261 @@
+#include <functional>
+#include <istream>
+#include <streambuf>
 #include <pybind11/pybind11.h>
+#include <pybind11/numpy.h>
 #include <pybind11/stl.h>
 #include "Tunings.h"
+#include "analysis.h"
+#include "bank.h"
+#include "compact.h"
+#include "comparison.h"
+#include "generators.h"
+#include "ji.h"
+#include "layout.h"
+#include "profiling.h"
 
 namespace py = pybind11;
 
-PYBIND11_MODULE(_tuning_library, m)
+// Wrap a Tuning lookup method so it is recorded when profiling is enabled
+template <profiling::Entry E, auto Method>
+auto timed_lookup(const Tunings::Tuning &t, int mn)
+{
+    return profiling::timed(E, [&]() { return (t.*Method)(mn); });
+}
+
+// Objects of type T borrowed from a Python iterable, with the references held
+// in objects keeping the pointers valid
+template <typename T> struct Borrowed
+{
+    py::list objects;
+    std::vector<const T *> ptrs;
+
+    explicit Borrowed(const py::iterable &items) : objects(items)
+    {
+        ptrs.reserve(objects.size());
+        for (auto o : objects)
+            ptrs.push_back(&o.cast<const T &>());
+    }
+};
+
+// Copy a vector into a new 1D array
+template <typename T> py::array_t<T> to_array(const std::vector<T> &v)
+{
+    return py::array_t<T>(static_cast<py::ssize_t>(v.size()), v.data());
+}
+
+// Copy a vector into a new array of the given shape
+template <typename T>
+py::array_t<T> to_array(const std::vector<T> &v, std::vector<py::ssize_t> shape)
+{
+    return py::array_t<T>(shape, v.data());
+}
+
+using Int64Array = py::array_t<int64_t, py::array::c_style | py::array::forcecast>;
+using DoubleArray = py::array_t<double, py::array::c_style | py::array::forcecast>;
+
+// Length of 1D parameter arrays broadcast together, where each array has that
+// length or length 1
+template <typename... A> size_t broadcast_size(const A &...arrays)
+{
+    size_t n = 1;
+    for (const py::array *a : {static_cast<const py::array *>(&arrays)...})
+    {
+        if (a->ndim() > 1)
+            throw Tunings::TuningError("Parameters should be scalars or 1D arrays");
+        auto size = static_cast<size_t>(a->size());
+        if (size == 1)
+            continue;
+        if (n != 1 && size != n)
+            throw Tunings::TuningError("Parameters of lengths " + std::to_string(n) + " and " +
+                                       std::to_string(size) + " can't be broadcast together");
+        n = size;
+    }
+    return n;
+}
+
+// Element i of a parameter array broadcast by broadcast_size
+template <typename T>
+T broadcast_at(const py::array_t<T, py::array::c_style | py::array::forcecast> &a, size_t i)
+{
+    return a.data()[a.size() == 1 ? 0 : i];
+}
+
+inline int to_int(int64_t v)
+{
+    if (v < std::numeric_limits<int>::min() || v > std::numeric_limits<int>::max())
+        throw Tunings::TuningError(std::to_string(v) + " is out of range for an int");
+    return static_cast<int>(v);
+}
+
+// A contiguous buffer borrowed from a Python object, read in place through an
+// istream without copying it into a std::string
+struct BufferStream
+{
+    struct membuf : std::streambuf
+    {
+        membuf(char *p, size_t n) { setg(p, p, p + n); }
+    };
+
+    Py_buffer view;
+
+    explicit BufferStream(const py::buffer &b)
+    {
+        if (PyObject_GetBuffer(b.ptr(), &view, PyBUF_SIMPLE) != 0)
+            throw py::error_already_set();
+    }
+    ~BufferStream() { PyBuffer_Release(&view); }
+    BufferStream(const BufferStream &) = delete;
+    BufferStream &operator=(const BufferStream &) = delete;
+
+    // Call read with an istream over the buffer, with the GIL released
+    template <typename F> auto parse(F &&read)
+    {
+        py::gil_scoped_release release;
+        membuf buf(static_cast<char *>(view.buf), static_cast<size_t>(view.len));
+        std::istream is(&buf);
+        return read(is);
+    }
+};
+
+// The numpy dtype of compact::ToneRecord, registered on first use so that
+// importing the module doesn't import numpy
+py::dtype tone_dtype()
+{
+    PYBIND11_CONSTINIT static py::gil_safe_call_once_and_store<py::dtype> storage;
+    return storage
+        .call_once_and_store_result([]() {
+            PYBIND11_NUMPY_DTYPE(compact::ToneRecord, type, cents, ratio_n, ratio_d, float_value,
+                                 lineno);
+            return py::dtype::of<compact::ToneRecord>();
+        })
+        .get_stored();
+}
+
+// Comparison options, checking the note range
+comparison::Options comparison_options(int first_note, int last_note, bool skip_unmapped,
+                                       bool octave_equivalent)
+{
+    if (first_note < 0 || last_note > 127 || first_note > last_note)
+        throw Tunings::TuningError("Note range should be within 0 to 127 with first_note <= "
+                                   "last_note. You entered " +
+                                   std::to_string(first_note) + " to " +
+                                   std::to_string(last_note));
+    return {first_note, last_note, skip_unmapped, octave_equivalent};
+}
+
+// The pitches of a collection of tunings, with the GIL released
+std::vector<comparison::Pitches> tuning_pitches(const Borrowed<Tunings::Tuning> &tunings,
+                                                const comparison::Options &o)
+{
+    py::gil_scoped_release release;
+    std::vector<comparison::Pitches> pitches;
+    pitches.reserve(tunings.ptrs.size());
+    for (const auto *t : tunings.ptrs)
+        pitches.emplace_back(*t, o);
+    return pitches;
+}
+
+// A dict of arrays of the given shape of the fields of deviations
+py::dict deviation_arrays(const std::vector<comparison::Deviation> &deviations,
+                          std::vector<py::ssize_t> shape)
+{
+    std::vector<double> max, rms, mean_abs;
+    std::vector<int64_t> count;
+    for (const auto &d : deviations)
+    {
+        max.push_back(d.max);
+        rms.push_back(d.rms);
+        mean_abs.push_back(d.mean_abs);
+        count.push_back(d.count);
+    }
+    py::dict result;
+    result["max"] = to_array(max, shape);
+    result["rms"] = to_array(rms, shape);
+    result["mean_abs"] = to_array(mean_abs, shape);
+    result["count"] = to_array(count, shape);
+    return result;
+}
+
+// A read only array over memory owned by owner, which it keeps alive
+template <typename T>
+py::array_t<T> readonly_view(const T *data, std::vector<py::ssize_t> shape, py::handle owner)
+{
+    py::array_t<T> view(shape, data, owner);
+    view.attr("setflags")(py::arg("write") = false);
+    return view;
+}
+
+/*
+ * Make values of enum e equal to integers of the same value on either side of
+ * ==, e.g. to the elements of the integer arrays returned by batch functions.
+ * By default pybind11 enums only compare equal to Python ints on the left, so
+ * np.int64(1) == e(1) but not e(1) == np.int64(1). Values of other enums are
+ * still never equal.
+ */
+template <typename E> void compare_as_integers(py::enum_<E> &e)
+{
+    auto equal = [](const py::object &self, const py::object &other) -> py::object {
+        auto not_implemented = py::reinterpret_borrow<py::object>(Py_NotImplemented);
+        if (!py::type::handle_of(other).is(py::type::handle_of(self)))
+        {
+            // Other enums and arrays are left to their own comparisons
+            if (py::hasattr(other, "__entries") || !PyIndex_Check(other.ptr()))
+                return not_implemented;
+            auto value = py::reinterpret_steal<py::object>(PyNumber_Index(other.ptr()));
+            if (!value)
+            {
+                PyErr_Clear();
+                return not_implemented;
+            }
+            return py::bool_(py::int_(self).equal(value));
+        }
+        return py::bool_(py::int_(self).equal(py::int_(other)));
+    };
+    e.attr("__eq__") = py::cpp_function(equal, py::name("__eq__"), py::is_method(e),
+                                        py::arg("other"));
+    e.attr("__ne__") = py::cpp_function(
+        [equal](const py::object &self, const py::object &other) -> py::object {
+            auto result = equal(self, other);
+            if (result.is(py::handle(Py_NotImplemented)))
+                return result;
+            return py::bool_(!py::cast<bool>(result));
+        },
+        py::name("__ne__"), py::is_method(e), py::arg("other"));
+}
+
+// Table t of scale s as an array of cents, or if exact is true as a tuple of
+// numerator and denominator arrays with denominator 0 where not an exact ratio
+py::object scale_table(const Tunings::Scale &s, analysis::Table t, bool exact)
+{
+    auto shape = analysis::table_shape(s.tones.size(), t);
+    if (!exact)
+    {
+        py::array_t<double> cents(shape);
+        auto *out = cents.mutable_data();
+        py::gil_scoped_release release;
+        analysis::fill_table(analysis::pitch_cents(s), t, out, std::minus<>(), std::plus<>());
+        return std::move(cents);
+    }
+
+    py::array_t<int64_t> numerators(shape), denominators(shape);
+    auto *n = numerators.mutable_data();
+    auto *d = denominators.mutable_data();
+    {
+        py::gil_scoped_release release;
+        std::vector<analysis::Ratio> ratios(numerators.size());
+        analysis::fill_table(analysis::pitch_ratios(s), t, ratios.data(), analysis::divide,
+                             analysis::multiply);
+        for (size_t i = 0; i < ratios.size(); i++)
+        {
+            n[i] = ratios[i].n;
+            d[i] = ratios[i].d;
+        }
+    }
+    return py::make_tuple(numerators, denominators);
+}
+
+PYBIND11_MODULE(_tuning_library, m, py::mod_gil_not_used())
 {
     m.doc() = "Wrapper for Surge Synth Team Tuning Library";
 
@@ -25,6 +276,47 @@ PYBIND11_MODULE(_tuning_library, m)
         .def_readonly("string_rep", &Tunings::Tone::stringRep)
         .def_readonly("float_value", &Tunings::Tone::floatValue)
         .def_readonly("lineno", &Tunings::Tone::lineno)
+        .def(
+            "prime_factors",
+            [](const Tunings::Tone &t) { return ji::tone_factors(t); },
+            "Returns a dict mapping each prime in the factorization of the "
+            "ratio of the tone to its (non zero) exponent, or None if the tone "
+            "is not a ratio of positive integers"
+        )
+        .def(
+            "monzo",
+            [](const Tunings::Tone &t) -> py::object {
+                auto factors = ji::tone_factors(t);
+                if (!factors)
+                    return py::none();
+                return to_array(ji::monzo(*factors));
+            },
+            "Returns an array of the exponents of the primes 2, 3, 5, ... up to "
+            "the prime limit in the factorization of the ratio of the tone, or "
+            "None if the tone is not a ratio of positive integers"
+        )
+        .def(
+            "prime_limit",
+            [](const Tunings::Tone &t) -> std::optional<int64_t> {
+                auto factors = ji::tone_factors(t);
+                if (!factors)
+                    return std::nullopt;
+                return ji::prime_limit(*factors);
+            },
+            "Returns the largest prime in the factorization of the ratio of the "
+            "tone, 1 for 1/1, or None if the tone is not a ratio of positive integers"
+        )
+        .def(
+            "odd_limit",
+            [](const Tunings::Tone &t) -> std::optional<int64_t> {
+                if (!ji::tone_factors(t))
+                    return std::nullopt;
+                return ji::odd_limit(t);
+            },
+            "Returns the larger of the odd parts of the numerator and "
+            "denominator of the reduced ratio of the tone, or None if the tone "
+            "is not a ratio of positive integers"
+        )
         .def("__repr__",
             [](const Tunings::Tone &t) {
                 return "Tone(\"" + t.stringRep + "\")";
@@ -41,11 +333,380 @@ PYBIND11_MODULE(_tuning_library, m)
         .def_readonly("raw_text", &Tunings::Scale::rawText)
         .def_readonly("count", &Tunings::Scale::count)
         .def_readonly("tones", &Tunings::Scale::tones)
+        .def(
+            "step_vector",
+            [](const Tunings::Scale &s, bool exact) {
+                return scale_table(s, analysis::kSteps, exact);
+            },
+            "Returns the count steps between successive pitches of the scale, "
+            "starting from the unison, as an array of cents. If exact is True "
+            "returns a tuple of arrays of the step ratio numerators and "
+            "denominators, with denominator 0 for steps which are not exact ratios",
+            py::arg("exact") = false
+        )
+        .def(
+            "interval_matrix",
+            [](const Tunings::Scale &s, bool exact) {
+                return scale_table(s, analysis::kIntervals, exact);
+            },
+            "Returns the (count + 1, count + 1) array of intervals in cents where "
+            "entry [i, j] is the interval from pitch i up to pitch j, and pitch 0 "
+            "is the unison and pitch count is the period. If exact is True returns "
+            "a tuple of arrays of the interval ratio numerators and denominators, "
+            "with denominator 0 for intervals which are not exact ratios",
+            py::arg("exact") = false
+        )
+        .def(
+            "modes",
+            [](const Tunings::Scale &s, bool exact) {
+                return scale_table(s, analysis::kModes, exact);
+            },
+            "Returns the (count, count + 1) array where row i is the mode of the "
+            "scale starting on pitch i, in cents from the first pitch of the mode "
+            "up to the period. If exact is True returns a tuple of arrays of the "
+            "ratio numerators and denominators, with denominator 0 for pitches "
+            "which are not exact ratios",
+            py::arg("exact") = false
+        )
+        .def(
+            "prime_limit",
+            [](const Tunings::Scale &s) { return ji::scale_limits(s).prime_limit; },
+            "Returns the largest prime limit of the tones of the scale, or None "
+            "if any tone is not a ratio of positive integers"
+        )
+        .def(
+            "odd_limit",
+            [](const Tunings::Scale &s) { return ji::scale_limits(s).odd_limit; },
+            "Returns the largest odd limit of the tones of the scale, or None if "
+            "any tone is not a ratio of positive integers"
+        )
+        .def(
+            "content_hash",
+            [](const Tunings::Scale &s) {
+                return analysis::hash_key(analysis::content_key(s));
+            },
+            "Returns a 64 bit hash of the tones of the scale, which is the same "
+            "for scales differing only in formatting, comments, name or "
+            "description, and the same on all platforms"
+        )
+        .def(
+            "canonical_steps",
+            [](const Tunings::Scale &s, double resolution) {
+                return to_array(analysis::canonical_steps(s, resolution));
+            },
+            "Returns the steps of the scale as integer multiples of resolution "
+            "cents, rotated to the lexicographically least rotation so that all "
+            "modes of a scale have the same canonical steps",
+            py::arg("resolution") = 1e-3
+        )
+        .def(
+            "mode_fingerprint",
+            [](const Tunings::Scale &s, double resolution) {
+                return analysis::hash_key(analysis::canonical_steps(s, resolution));
+            },
+            "Returns a 64 bit hash of the canonical steps of the scale, which is "
+            "the same for all modes of a scale, and the same on all platforms",
+            py::arg("resolution") = 1e-3
+        )
         .def("__repr__", [](const Tunings::Scale &s){
             return "Scale(name=\"" + s.name + "\")";
         })
     ;
 
+    // Batch functions return these as integer codes, 0 to 5 in this order
+    py::enum_<analysis::StepSizeClass> step_size_class(m, "StepSizeClass");
+    step_size_class
+        .value("kStepsEmpty", analysis::kStepsEmpty)
+        .value("kStepsEqual", analysis::kStepsEqual)
+        .value("kStepsWellFormed", analysis::kStepsWellFormed)
+        .value("kStepsMOS", analysis::kStepsMOS)
+        .value("kStepsTwoSizes", analysis::kStepsTwoSizes)
+        .value("kStepsMultiple", analysis::kStepsMultiple)
+        .export_values()
+    ;
+    compare_as_integers(step_size_class);
+
+    m.def(
+        "step_size_signature",
+        [](const Tunings::Scale &scale, double tolerance) {
+            analysis::StepSignature sig;
+            {
+                py::gil_scoped_release release;
+                sig = analysis::step_signature(scale, tolerance);
+            }
+            py::dict d;
+            d["sizes"] = to_array(sig.sizes);
+            d["counts"] = to_array(sig.counts);
+            d["classification"] = sig.classification;
+            return d;
+        },
+        "Returns a dict with the distinct step sizes of the scale in cents as "
+        "\"sizes\", the number of steps of each size as \"counts\", and the "
+        "StepSizeClass of the scale as \"classification\". Steps within "
+        "tolerance cents of the smallest step of a size count as that size",
+        py::arg("scale"),
+        py::arg("tolerance") = 1e-3
+    );
+
+    m.def(
+        "step_size_signatures",
+        [](const py::iterable &scales, double tolerance) {
+            Borrowed<Tunings::Scale> borrowed(scales);
+            auto n = borrowed.ptrs.size();
+            std::vector<int64_t> num_sizes(n), classification(n), offsets(n + 1, 0);
+            std::vector<double> sizes;
+            std::vector<int64_t> counts;
+            {
+                py::gil_scoped_release release;
+                for (size_t i = 0; i < n; i++)
+                {
+                    const auto sig = analysis::step_signature(*borrowed.ptrs[i], tolerance);
+                    num_sizes[i] = static_cast<int64_t>(sig.sizes.size());
+                    classification[i] = sig.classification;
+                    offsets[i + 1] = offsets[i] + num_sizes[i];
+                    sizes.insert(sizes.end(), sig.sizes.begin(), sig.sizes.end());
+                    counts.insert(counts.end(), sig.counts.begin(), sig.counts.end());
+                }
+            }
+            py::dict d;
+            d["num_sizes"] = to_array(num_sizes);
+            d["classification"] = to_array(classification);
+            d["offsets"] = to_array(offsets);
+            d["sizes"] = to_array(sizes);
+            d["counts"] = to_array(counts);
+            return d;
+        },
+        "Returns a dict of arrays of the step size signatures of a collection "
+        "of scales, with the number of distinct step sizes of each scale as "
+        "\"num_sizes\" and the integer values of their StepSizeClass, which "
+        "compare equal to the StepSizeClass members, as \"classification\". The "
+        "step sizes and counts of scale i are \"sizes\"[offsets[i]:offsets[i + 1]] "
+        "and \"counts\"[offsets[i]:offsets[i + 1]]",
+        py::arg("scales"),
+        py::arg("tolerance") = 1e-3
+    );
+
+    m.def(
+        "scale_monzos",
+        [](const py::iterable &scales) {
+            Borrowed<Tunings::Scale> borrowed(scales);
+            auto n = borrowed.ptrs.size();
+            std::vector<int64_t> offsets(n + 1, 0), prime_limits(n), odd_limits(n);
+            std::vector<int64_t> numerators, denominators, primes, monzos;
+            std::vector<uint8_t> is_ji;
+            {
+                py::gil_scoped_release release;
+                std::vector<std::optional<std::map<int64_t, int>>> factors;
+                for (size_t i = 0; i < n; i++)
+                {
+                    const auto &s = *borrowed.ptrs[i];
+                    offsets[i + 1] = offsets[i] + static_cast<int64_t>(s.tones.size());
+                    for (const auto &t : s.tones)
+                    {
+                        factors.push_back(ji::tone_factors(t));
+                        is_ji.push_back(factors.back().has_value());
+                        auto r = factors.back() ? analysis::reduced(t.ratio_n, t.ratio_d)
+                                                : analysis::inexact;
+                        numerators.push_back(r.n);
+                        denominators.push_back(r.d);
+                        if (factors.back())
+                            for (auto [p, e] : *factors.back())
+                                primes.push_back(p);
+                    }
+                    // Limits from the factors already found, so each tone is only factored once
+                    auto limits = ji::scale_limits(s, factors.data() + offsets[i]);
+                    prime_limits[i] = limits.prime_limit.value_or(-1);
+                    odd_limits[i] = limits.odd_limit.value_or(-1);
+                }
+                std::sort(primes.begin(), primes.end());
+                primes.erase(std::unique(primes.begin(), primes.end()), primes.end());
+                monzos.assign(factors.size() * primes.size(), 0);
+                for (size_t j = 0; j < factors.size(); j++)
+                    if (factors[j])
+                        for (auto [p, e] : *factors[j])
+                            monzos[j * primes.size() +
+                                   (std::lower_bound(primes.begin(), primes.end(), p) -
+                                    primes.begin())] = e;
+            }
+            auto tones = static_cast<py::ssize_t>(is_ji.size());
+            auto columns = static_cast<py::ssize_t>(primes.size());
+            py::dict d;
+            d["offsets"] = to_array(offsets);
+            d["prime_limit"] = to_array(prime_limits);
+            d["odd_limit"] = to_array(odd_limits);
+            d["primes"] = to_array(primes);
+            d["monzos"] = to_array(monzos, {tones, columns});
+            d["numerators"] = to_array(numerators);
+            d["denominators"] = to_array(denominators);
+            d["is_ji"] = to_array(is_ji).attr("astype")("bool");
+            return d;
+        },
+        "Returns a dict of arrays of the prime factorizations of the tones of a "
+        "collection of scales. \"prime_limit\" and \"odd_limit\" give the limits "
+        "of each scale, -1 if any tone is not a ratio of positive integers. The "
+        "tones of scale i are rows offsets[i]:offsets[i + 1] of \"monzos\", which "
+        "has a column of exponents for each prime in \"primes\" (only the primes "
+        "which appear in some tone), of \"numerators\" and \"denominators\" of "
+        "the reduced ratios, with denominator 0 for tones which are not ratios, "
+        "and of \"is_ji\", whether each tone is a ratio of positive integers",
+        py::arg("scales")
+    );
+
+    m.def(
+        "scale_equivalence_classes",
+        [](const py::iterable &scales, bool mode_invariant, double resolution) {
+            Borrowed<Tunings::Scale> borrowed(scales);
+            std::vector<int64_t> labels;
+            {
+                py::gil_scoped_release release;
+                if (mode_invariant)
+                    labels = analysis::equivalence_classes(
+                        borrowed.ptrs, [resolution](const Tunings::Scale &s) {
+                            return analysis::canonical_steps(s, resolution);
+                        });
+                else
+                    labels = analysis::equivalence_classes(borrowed.ptrs, analysis::content_key);
+            }
+            return to_array(labels);
+        },
+        "Groups a collection of scales into classes of duplicates, returning an "
+        "array labelling each scale with the index of the first scale in its "
+        "class. If mode_invariant is True scales are duplicates if they have the "
+        "same canonical steps at the given resolution in cents, so modes of a "
+        "scale are duplicates, else if they have the same tones",
+        py::arg("scales"),
+        py::arg("mode_invariant") = true,
+        py::arg("resolution") = 1e-3
+    );
+
+    m.def(
+        "scale_features",
+        [](const py::iterable &scales, size_t bins, double width, double period_weight) {
+            if (bins == 0)
+                throw Tunings::TuningError("Number of bins should be positive");
+            if (!(width >= 0) || !std::isfinite(width))
+                throw Tunings::TuningError(
+                    "Width should be a non negative number of cents. You entered " +
+                    std::to_string(width));
+            Borrowed<Tunings::Scale> borrowed(scales);
+            auto n = borrowed.ptrs.size();
+            std::vector<double> features(n * (bins + 1));
+            {
+                py::gil_scoped_release release;
+                for (size_t i = 0; i < n; i++)
+                {
+                    const auto &s = *borrowed.ptrs[i];
+                    auto *row = features.data() + i * (bins + 1);
+                    analysis::interval_profile(s, bins, width, row);
+                    row[bins] = s.tones.empty() ? 0.0 : period_weight * s.tones.back().cents / 1200;
+                }
+            }
+            return to_array(features,
+                            {static_cast<py::ssize_t>(n), static_cast<py::ssize_t>(bins + 1)});
+        },
+        "Returns an array of shape (len(scales), bins + 1) of fixed length "
+        "feature vectors which don't depend on the mode or the number of tones "
+        "of each scale. The first bins columns of row i are the histogram of the "
+        "intervals between every pair of pitch classes of scale i, as fractions "
+        "of its period folded into [0, 1/2], smoothed by a Gaussian of standard "
+        "deviation width cents and scaled to unit length, or zeros for scales "
+        "with fewer than two tones. The last column is the period in octaves "
+        "times period_weight",
+        py::arg("scales"),
+        py::arg("bins") = 32,
+        py::arg("width") = 20.0,
+        py::arg("period_weight") = 1.0
+    );
+
+    m.def(
+        "pack_scales",
+        [](const py::iterable &scales) {
+            Borrowed<Tunings::Scale> borrowed(scales);
+            tone_dtype();
+            compact::Packed packed;
+            {
+                py::gil_scoped_release release;
+                for (const auto *s : borrowed.ptrs)
+                    packed.add(*s);
+            }
+            py::dict d;
+            d["tones"] = to_array(packed.tones);
+            d["offsets"] = to_array(packed.offsets);
+            d["counts"] = to_array(packed.counts);
+            d["pool"] = py::bytes(packed.pool);
+            d["string_bounds"] = to_array(packed.string_bounds);
+            d["string_offsets"] = to_array(packed.string_offsets);
+            return d;
+        },
+        "Packs a collection of scales into a dict of arrays. \"tones\" is a "
+        "structured array of the tones of every scale, with fields type, cents, "
+        "ratio_n, ratio_d, float_value and lineno, and the tones of scale i are "
+        "\"tones\"[offsets[i]:offsets[i + 1]]. \"counts\" is the count of each "
+        "scale. All strings are stored in the bytes \"pool\", with string k "
+        "being pool[string_bounds[k]:string_bounds[k + 1]]. The strings of scale "
+        "i are string_offsets[i] to string_offsets[i + 1], in the order name, "
+        "description, raw text, the string form of each tone, then comments",
+        py::arg("scales")
+    );
+
+    m.def(
+        "unpack_scales",
+        [](const py::array &tones, const Int64Array &offsets, const Int64Array &counts,
+           const py::buffer &pool, const Int64Array &string_bounds,
+           const Int64Array &string_offsets, std::optional<Int64Array> indices) {
+            tone_dtype();
+            auto records =
+                py::array_t<compact::ToneRecord, py::array::c_style | py::array::forcecast>::ensure(
+                    tones);
+            if (!records)
+                throw py::error_already_set();
+            auto size = static_cast<size_t>(counts.size());
+            if (offsets.size() != counts.size() + 1 || string_offsets.size() != counts.size() + 1 ||
+                string_bounds.size() < 1)
+                throw Tunings::TuningError(
+                    "Compact scale arrays have inconsistent sizes. offsets and "
+                    "string_offsets should have one more entry than counts");
+            BufferStream pool_buffer(pool);
+            compact::View view{size,
+                               records.data(),
+                               static_cast<size_t>(records.size()),
+                               offsets.data(),
+                               counts.data(),
+                               static_cast<const char *>(pool_buffer.view.buf),
+                               static_cast<size_t>(pool_buffer.view.len),
+                               string_bounds.data(),
+                               static_cast<size_t>(string_bounds.size()) - 1,
+                               string_offsets.data()};
+            std::vector<Tunings::Scale> scales;
+            {
+                py::gil_scoped_release release;
+                if (indices)
+                {
+                    scales.reserve(static_cast<size_t>(indices->size()));
+                    for (py::ssize_t k = 0; k < indices->size(); k++)
+                        scales.push_back(
+                            compact::unpack(view, static_cast<size_t>(indices->data()[k])));
+                }
+                else
+                {
+                    scales.reserve(size);
+                    for (size_t i = 0; i < size; i++)
+                        scales.push_back(compact::unpack(view, i));
+                }
+            }
+            return scales;
+        },
+        "Unpacks the scales packed by pack_scales, returning a list of Scale. If "
+        "indices are given only those scales are unpacked",
+        py::arg("tones"),
+        py::arg("offsets"),
+        py::arg("counts"),
+        py::arg("pool"),
+        py::arg("string_bounds"),
+        py::arg("string_offsets"),
+        py::arg("indices") = py::none()
+    );
+
     py::class_<Tunings::KeyboardMapping>(m, "KeyboardMapping")
         .def(py::init<>())
         .def_readonly("count", &Tunings::KeyboardMapping::count)
@@ -68,13 +729,37 @@ PYBIND11_MODULE(_tuning_library, m)
 
     m.def(
         "_read_scl_file",
-        &Tunings::readSCLFile,
+        [](const std::string &fname) {
+            return profiling::timed(profiling::kReadSCLFile, [&]() {
+                py::gil_scoped_release release;
+                return Tunings::readSCLFile(fname);
+            });
+        },
         "readSCLFile returns a Scale from the SCL File in fname"
     );
 
     m.def(
         "parse_scl_data",
-        &Tunings::parseSCLData,
+        [](const py::buffer &scl_contents) {
+            return profiling::timed(profiling::kParseSCLData, [&]() {
+                auto res = BufferStream(scl_contents).parse(Tunings::readSCLStream);
+                res.name = "Scale from patch";
+                return res;
+            });
+        },
+        "parseSCLData returns a scale from the SCL file contents in a bytes like "
+        "object, such as bytes, a memoryview or an mmap, parsed in place",
+        py::arg("scl_contents")
+    );
+
+    m.def(
+        "parse_scl_data",
+        [](const std::string &scl_contents) {
+            return profiling::timed(profiling::kParseSCLData, [&]() {
+                py::gil_scoped_release release;
+                return Tunings::parseSCLData(scl_contents);
+            });
+        },
         "parseSCLData returns a scale from the SCL file contents in memory",
         py::arg("scl_contents")
     );
@@ -109,13 +794,37 @@ PYBIND11_MODULE(_tuning_library, m)
 
     m.def(
         "_read_kbm_file",
-        &Tunings::readKBMFile,
+        [](const std::string &fname) {
+            return profiling::timed(profiling::kReadKBMFile, [&]() {
+                py::gil_scoped_release release;
+                return Tunings::readKBMFile(fname);
+            });
+        },
         "readKBMFile returns a KeyboardMapping from a KBM file name"
     );
 
     m.def(
         "parse_kbm_data",
-        &Tunings::parseKBMData,
+        [](const py::buffer &kbm_contents) {
+            return profiling::timed(profiling::kParseKBMData, [&]() {
+                auto res = BufferStream(kbm_contents).parse(Tunings::readKBMStream);
+                res.name = "Mapping from patch";
+                return res;
+            });
+        },
+        "parseKBMData returns a KeyboardMapping from KBM data in a bytes like "
+        "object, such as bytes, a memoryview or an mmap, parsed in place",
+        py::arg("kbm_contents")
+    );
+
+    m.def(
+        "parse_kbm_data",
+        [](const std::string &kbm_contents) {
+            return profiling::timed(profiling::kParseKBMData, [&]() {
+                py::gil_scoped_release release;
+                return Tunings::parseKBMData(kbm_contents);
+            });
+        },
         "parseKBMData returns a KeyboardMapping from a KBM data in memory",
         py::arg("kbm_contents")
     );
@@ -147,25 +856,132 @@ PYBIND11_MODULE(_tuning_library, m)
         py::arg("freq")
     );
 
+    m.def(
+        "even_divisions_of_span_by_m",
+        [](const Int64Array &span, const Int64Array &M, bool raw_text) {
+            auto n = broadcast_size(span, M);
+            std::vector<Tunings::Scale> scales(n);
+            py::gil_scoped_release release;
+            for (size_t i = 0; i < n; i++)
+                scales[i] = generators::even_division_of_span_by_m(
+                    to_int(broadcast_at(span, i)), to_int(broadcast_at(M, i)), raw_text);
+            return scales;
+        },
+        "Returns a list of the scales even_division_of_span_by_m(span[i], M[i]) "
+        "for arrays or scalars of span and M, broadcast together. The scales are "
+        "identical to those of even_division_of_span_by_m, except that raw_text "
+        "is empty unless raw_text is True",
+        py::arg("span"),
+        py::arg("M"),
+        py::arg("raw_text") = false
+    );
+
+    m.def(
+        "even_divisions_of_cents_by_m",
+        [](const DoubleArray &cents, const Int64Array &M, bool raw_text) {
+            auto n = broadcast_size(cents, M);
+            std::vector<Tunings::Scale> scales(n);
+            py::gil_scoped_release release;
+            for (size_t i = 0; i < n; i++)
+                scales[i] = generators::even_division_of_cents_by_m(
+                    static_cast<float>(broadcast_at(cents, i)), to_int(broadcast_at(M, i)),
+                    raw_text);
+            return scales;
+        },
+        "Returns a list of the scales even_division_of_cents_by_m(cents[i], M[i]) "
+        "for arrays or scalars of cents and M, broadcast together. The scales are "
+        "identical to those of even_division_of_cents_by_m, except that raw_text "
+        "is empty unless raw_text is True",
+        py::arg("cents"),
+        py::arg("M"),
+        py::arg("raw_text") = false
+    );
+
+    m.def(
+        "tune_notes_to",
+        [](const Int64Array &midi_note, const DoubleArray &freq, bool raw_text) {
+            auto n = broadcast_size(midi_note, freq);
+            std::vector<Tunings::KeyboardMapping> mappings(n);
+            py::gil_scoped_release release;
+            for (size_t i = 0; i < n; i++)
+                mappings[i] = generators::start_scale_on_and_tune_note_to(
+                    60, to_int(broadcast_at(midi_note, i)), broadcast_at(freq, i), raw_text);
+            return mappings;
+        },
+        "Returns a list of the mappings tune_note_to(midi_note[i], freq[i]) for "
+        "arrays or scalars of midi_note and freq, broadcast together. The mappings "
+        "are identical to those of tune_note_to, except that raw_text is empty "
+        "unless raw_text is True",
+        py::arg("midi_note"),
+        py::arg("freq"),
+        py::arg("raw_text") = false
+    );
+
+    m.def(
+        "start_scales_on_and_tune_notes_to",
+        [](const Int64Array &scale_start, const Int64Array &midi_note, const DoubleArray &freq,
+           bool raw_text) {
+            auto n = broadcast_size(scale_start, midi_note, freq);
+            std::vector<Tunings::KeyboardMapping> mappings(n);
+            py::gil_scoped_release release;
+            for (size_t i = 0; i < n; i++)
+                mappings[i] = generators::start_scale_on_and_tune_note_to(
+                    to_int(broadcast_at(scale_start, i)), to_int(broadcast_at(midi_note, i)),
+                    broadcast_at(freq, i), raw_text);
+            return mappings;
+        },
+        "Returns a list of the mappings start_scale_on_and_tune_note_to("
+        "scale_start[i], midi_note[i], freq[i]) for arrays or scalars of the "
+        "arguments, broadcast together. The mappings are identical to those of "
+        "start_scale_on_and_tune_note_to, except that raw_text is empty unless "
+        "raw_text is True",
+        py::arg("scale_start"),
+        py::arg("midi_note"),
+        py::arg("freq"),
+        py::arg("raw_text") = false
+    );
+
     py::class_<Tunings::Tuning>(m, "Tuning")
-        .def(py::init<>())
-        .def(py::init<const Tunings::Scale &>(), py::arg("scale"))
-        .def(py::init<const Tunings::KeyboardMapping &>(), py::arg("keyboard_mapping"))
+        .def(py::init([]() {
+            return profiling::timed(profiling::kTuningInit, []() {
+                return Tunings::Tuning();
+            });
+        }))
+        .def(
+            py::init([](const Tunings::Scale &s) {
+                return profiling::timed(profiling::kTuningInit, [&]() {
+                    return Tunings::Tuning(s);
+                });
+            }),
+            py::arg("scale")
+        )
         .def(
-            py::init<const Tunings::Scale &, const Tunings::KeyboardMapping &, bool>(),
+            py::init([](const Tunings::KeyboardMapping &k) {
+                return profiling::timed(profiling::kTuningInit, [&]() {
+                    return Tunings::Tuning(k);
+                });
+            }),
+            py::arg("keyboard_mapping")
+        )
+        .def(
+            py::init([](const Tunings::Scale &s, const Tunings::KeyboardMapping &k, bool allow) {
+                return profiling::timed(profiling::kTuningInit, [&]() {
+                    return Tunings::Tuning(s, k, allow);
+                });
+            }),
             py::arg("scale"),
             py::arg("keyboard_mapping"),
             py::arg("allow_tuning_center_on_unmapped") = false
         )
         .def_property_readonly("N", [](const Tunings::Tuning t){return t.N;})
         .def("with_skipped_notes_interpolated", &Tunings::Tuning::withSkippedNotesInterpolated)
-        .def("frequency_for_midi_note", &Tunings::Tuning::frequencyForMidiNote)
-        .def("frequency_for_midi_note_scaled_by_midi_0", &Tunings::Tuning::frequencyForMidiNoteScaledByMidi0)
-        .def("log_scaled_frequency_for_midi_note", &Tunings::Tuning::logScaledFrequencyForMidiNote)
-        .def("retuning_from_equal_in_cents_for_midi_note", &Tunings::Tuning::retuningFromEqualInCentsForMidiNote)
-        .def("retuning_from_equal_in_semitones_for_midi_note", &Tunings::Tuning::retuningFromEqualInSemitonesForMidiNote)
-        .def("scale_position_for_midi_note", &Tunings::Tuning::scalePositionForMidiNote)
-        .def("is_midi_note_mapped", &Tunings::Tuning::isMidiNoteMapped)
+        .def("frequency_for_midi_note", timed_lookup<profiling::kFrequencyForMidiNote, &Tunings::Tuning::frequencyForMidiNote>)
+        .def("frequency_for_midi_note_scaled_by_midi_0", timed_lookup<profiling::kFrequencyForMidiNoteScaledByMidi0, &Tunings::Tuning::frequencyForMidiNoteScaledByMidi0>)
+        .def("log_scaled_frequency_for_midi_note", timed_lookup<profiling::kLogScaledFrequencyForMidiNote, &Tunings::Tuning::logScaledFrequencyForMidiNote>)
+        .def("retuning_from_equal_in_cents_for_midi_note", timed_lookup<profiling::kRetuningFromEqualInCentsForMidiNote, &Tunings::Tuning::retuningFromEqualInCentsForMidiNote>)
+        .def("retuning_from_equal_in_semitones_for_midi_note", timed_lookup<profiling::kRetuningFromEqualInSemitonesForMidiNote, &Tunings::Tuning::retuningFromEqualInSemitonesForMidiNote>)
+        .def("scale_position_for_midi_note", timed_lookup<profiling::kScalePositionForMidiNote, &Tunings::Tuning::scalePositionForMidiNote>)
+        .def("is_midi_note_mapped", timed_lookup<profiling::kIsMidiNoteMapped, &Tunings::Tuning::isMidiNoteMapped>)
         .def_readonly("scale", &Tunings::Tuning::scale)
         .def_readonly("keyboard_mapping", &Tunings::Tuning::keyboardMapping)
         .def("__repr__",
@@ -178,4 +994,315 @@ PYBIND11_MODULE(_tuning_library, m)
             }
         );
     ;
+
+    m.def(
+        "set_profiling_enabled",
+        [](bool enabled) { profiling::enabled = enabled; },
+        "Turn on or off recording of call counts and timings for parsing, file "
+        "reading, Tuning construction and Tuning lookups",
+        py::arg("enabled") = true
+    );
+
+    m.def(
+        "is_profiling_enabled",
+        []() { return profiling::enabled.load(); },
+        "Whether call counts and timings are being recorded"
+    );
+
+    m.def(
+        "profiling_stats",
+        &profiling::stats,
+        "Returns a dict of recorded stats for each instrumented entry point, with "
+        "the number of calls, total, min and max time in nanoseconds, and a "
+        "histogram where bucket i counts calls taking between 2**i and 2**(i+1) ns"
+    );
+
+    m.def(
+        "reset_profiling_stats",
+        &profiling::reset,
+        "Reset all recorded call counts and timings to zero"
+    );
+
+    m.def(
+        "set_profiling_hook",
+        &profiling::set_hook,
+        "Set a callable hook(name, elapsed_ns) to be called after each recorded "
+        "call while profiling is enabled, or None to remove the hook. Exceptions "
+        "raised by the hook are passed to sys.unraisablehook, and don't affect "
+        "the recorded call",
+        py::arg("hook")
+    );
+
+    m.def(
+        "get_profiling_hook",
+        &profiling::get_hook,
+        "Returns the current profiling hook, or None if no hook is set"
+    );
+
+    m.def(
+        "grid_layout",
+        [](const Tunings::Tuning &tuning, int rows, int columns, int x_step, int y_step,
+           int transpose, int origin_note, int first_note, std::optional<int> row_stride) {
+            layout::Grid grid{rows, columns, x_step, y_step, transpose, origin_note, first_note,
+                              row_stride.value_or(std::max(columns, 1))};
+            layout::Layout l;
+            {
+                py::gil_scoped_release release;
+                l = layout::grid_layout(tuning, grid);
+            }
+            std::vector<py::ssize_t> shape{rows, columns};
+            py::dict d;
+            d["frequencies"] = to_array(l.frequencies, shape);
+            d["steps"] = to_array(l.steps, shape);
+            d["labels"] = to_array(l.labels, shape);
+            d["pad_notes"] = to_array(l.pad_notes, shape);
+            d["note_frequencies"] = to_array(l.note_frequencies);
+            return d;
+        },
+        "Lays out the tuning isomorphically on a grid of pads with the given "
+        "number of rows (numbered from the bottom) and columns (numbered from "
+        "the left), where moving one column right moves x_step notes of the "
+        "tuning and moving one row up moves y_step notes. The pad at (row, "
+        "column) plays tuning note origin_note + column * x_step + row * y_step "
+        "+ transpose and sends midi note first_note + row * row_stride + column, "
+        "where row_stride defaults to the number of columns. Returns a dict of "
+        "(rows, columns) arrays of the \"frequencies\" of the pads, the \"steps\" "
+        "from the origin note, the scale position \"labels\" (-1 for unmapped "
+        "notes) and the \"pad_notes\" sent, and the \"note_frequencies\" of all "
+        "128 midi notes with the grid extended to cover every note, taking each "
+        "block of row_stride notes starting on a multiple of row_stride as a row",
+        py::arg("tuning"),
+        py::arg("rows"),
+        py::arg("columns"),
+        py::arg("x_step"),
+        py::arg("y_step"),
+        py::arg("transpose") = 0,
+        py::arg("origin_note") = 0,
+        py::arg("first_note") = 0,
+        py::arg("row_stride") = py::none()
+    );
+
+    m.def(
+        "tuning_frequencies",
+        [](const py::iterable &scales, std::optional<py::iterable> keyboard_mappings) {
+            Borrowed<Tunings::Scale> s(scales);
+            Tunings::KeyboardMapping default_mapping;
+            std::optional<Borrowed<Tunings::KeyboardMapping>> k;
+            if (keyboard_mappings)
+                k.emplace(*keyboard_mappings);
+            auto num_scales = s.ptrs.size();
+            auto num_mappings = k ? k->ptrs.size() : 1;
+            if (num_scales != num_mappings && num_scales != 1 && num_mappings != 1)
+                throw Tunings::TuningError("Can't pair " + std::to_string(num_scales) +
+                                           " scales with " + std::to_string(num_mappings) +
+                                           " keyboard mappings");
+            auto n = num_scales == 1 ? num_mappings : num_scales;
+            py::array_t<double> frequencies({static_cast<py::ssize_t>(n), py::ssize_t(128)});
+            auto *out = frequencies.mutable_data();
+            {
+                py::gil_scoped_release release;
+                for (size_t i = 0; i < n; i++)
+                {
+                    const auto &scale = *s.ptrs[num_scales == 1 ? 0 : i];
+                    const auto &mapping =
+                        k ? *k->ptrs[num_mappings == 1 ? 0 : i] : default_mapping;
+                    Tunings::Tuning tuning(scale, mapping);
+                    for (int note = 0; note < 128; note++)
+                        out[i * 128 + note] = tuning.frequencyForMidiNote(note);
+                }
+            }
+            return frequencies;
+        },
+        "Returns an (n, 128) array of the frequency of each midi note for the "
+        "tuning of each scale with the corresponding keyboard mapping, without "
+        "making Tuning objects. A single scale or mapping is paired with every "
+        "mapping or scale, and if keyboard_mappings is None the default mapping "
+        "is used",
+        py::arg("scales"),
+        py::arg("keyboard_mappings") = py::none()
+    );
+
+    m.def(
+        "tuning_deviations",
+        [](const Tunings::Tuning &reference, const py::iterable &tunings, int first_note,
+           int last_note, bool skip_unmapped, bool octave_equivalent) {
+            auto o = comparison_options(first_note, last_note, skip_unmapped, octave_equivalent);
+            Borrowed<Tunings::Tuning> borrowed(tunings);
+            std::vector<comparison::Deviation> deviations;
+            {
+                py::gil_scoped_release release;
+                comparison::Pitches ref(reference, o);
+                for (const auto *t : borrowed.ptrs)
+                    deviations.push_back(comparison::deviation(ref, comparison::Pitches(*t, o), o));
+            }
+            return deviation_arrays(deviations, {static_cast<py::ssize_t>(deviations.size())});
+        },
+        "Returns a dict of arrays of the deviation in cents of each tuning from "
+        "reference over the midi notes first_note to last_note: \"max\", \"rms\" "
+        "and \"mean_abs\" give the maximum, root mean square and mean absolute "
+        "difference, and \"count\" the number of notes compared. If "
+        "skip_unmapped is True notes unmapped in either tuning are skipped, and "
+        "if octave_equivalent is True each tuning is first transposed by the "
+        "whole number of octaves nearest its mean difference from reference, "
+        "so tunings transposed by octaves match. "
+        "Deviations are NaN where no notes are compared",
+        py::arg("reference"),
+        py::arg("tunings"),
+        py::arg("first_note") = 0,
+        py::arg("last_note") = 127,
+        py::arg("skip_unmapped") = true,
+        py::arg("octave_equivalent") = false
+    );
+
+    m.def(
+        "tuning_deviation_matrix",
+        [](const py::iterable &tunings, std::optional<py::iterable> others, int first_note,
+           int last_note, bool skip_unmapped, bool octave_equivalent, unsigned threads) {
+            auto o = comparison_options(first_note, last_note, skip_unmapped, octave_equivalent);
+            Borrowed<Tunings::Tuning> rows(tunings);
+            std::optional<Borrowed<Tunings::Tuning>> columns;
+            if (others)
+                columns.emplace(*others);
+            auto row_pitches = tuning_pitches(rows, o);
+            auto column_pitches = columns ? tuning_pitches(*columns, o) : row_pitches;
+            std::vector<comparison::Deviation> deviations(row_pitches.size() *
+                                                          column_pitches.size());
+            {
+                py::gil_scoped_release release;
+                comparison::deviation_matrix(row_pitches, column_pitches, !columns, o, threads,
+                                             deviations.data());
+            }
+            return deviation_arrays(deviations, {static_cast<py::ssize_t>(row_pitches.size()),
+                                                 static_cast<py::ssize_t>(column_pitches.size())});
+        },
+        "Returns a dict of (n, m) arrays of the deviations, as given by "
+        "tuning_deviations, of each of the m others from each of the n tunings, "
+        "or if others is None of the (n, n) deviations between every pair of "
+        "tunings. Rows are computed on threads threads, by default one per core",
+        py::arg("tunings"),
+        py::arg("others") = py::none(),
+        py::arg("first_note") = 0,
+        py::arg("last_note") = 127,
+        py::arg("skip_unmapped") = true,
+        py::arg("octave_equivalent") = false,
+        py::arg("threads") = 0
+    );
+
+    auto bank_lookup = [](const bank::Bank &b, const Int64Array &slots, const Int64Array &notes,
+                          bool cents) {
+        auto n = broadcast_size(slots, notes);
+        py::array_t<double> out(static_cast<py::ssize_t>(n));
+        {
+            py::gil_scoped_release release;
+            b.lookup(slots.data(), static_cast<size_t>(slots.size()), notes.data(),
+                     static_cast<size_t>(notes.size()), n, cents, out.mutable_data());
+        }
+        return out;
+    };
+
+    py::class_<bank::Bank>(m, "TuningBank", py::buffer_protocol(),
+                           "A bank of tunings, one for each slot such as a midi channel or MPE "
+                           "voice, with the frequencies and pitches of all 128 midi notes of "
+                           "every slot packed into contiguous (len(bank), 128) tables")
+        .def(py::init([](size_t size) {
+                 if (size == 0)
+                     throw Tunings::TuningError("TuningBank should have at least one slot");
+                 return new bank::Bank(std::vector<Tunings::Tuning>(size));
+             }),
+             "Makes a bank of size slots of the default tuning",
+             py::arg("size") = 16)
+        .def(py::init([](const py::iterable &tunings) {
+                 Borrowed<Tunings::Tuning> borrowed(tunings);
+                 if (borrowed.ptrs.empty())
+                     throw Tunings::TuningError("TuningBank should have at least one slot");
+                 std::vector<Tunings::Tuning> copies;
+                 for (const auto *t : borrowed.ptrs)
+                     copies.push_back(*t);
+                 py::gil_scoped_release release;
+                 return new bank::Bank(std::move(copies));
+             }),
+             "Makes a bank with a slot for each of tunings",
+             py::arg("tunings"))
+        .def("__len__", &bank::Bank::size)
+        .def("__getitem__",
+             [](const bank::Bank &b, int64_t slot) {
+                 if (slot < 0 || slot >= static_cast<int64_t>(b.size()))
+                     throw py::index_error("TuningBank slot out of range");
+                 py::gil_scoped_release release;
+                 return b.get(slot);
+             },
+             py::arg("slot"))
+        .def("__setitem__",
+             [](bank::Bank &b, int64_t slot, const Tunings::Tuning &t) {
+                 if (slot < 0 || slot >= static_cast<int64_t>(b.size()))
+                     throw py::index_error("TuningBank slot out of range");
+                 py::gil_scoped_release release;
+                 b.swap(slot, t);
+             },
+             py::arg("slot"), py::arg("tuning"))
+        .def("swap", &bank::Bank::swap,
+             "Retunes slot with tuning, returning the tuning it replaces. Lookups "
+             "see the slot entirely before or after the swap",
+             py::arg("slot"), py::arg("tuning"), py::call_guard<py::gil_scoped_release>())
+        .def("frequencies",
+             [bank_lookup](const bank::Bank &b, const Int64Array &slots, const Int64Array &notes) {
+                 return bank_lookup(b, slots, notes, false);
+             },
+             "Returns an array of the frequency of each note in the tuning of "
+             "the corresponding slot. slots and notes are broadcast together",
+             py::arg("slots"), py::arg("notes"))
+        .def("cents",
+             [bank_lookup](const bank::Bank &b, const Int64Array &slots, const Int64Array &notes) {
+                 return bank_lookup(b, slots, notes, true);
+             },
+             "Returns an array of the pitch in cents above midi note 0 of each "
+             "note in the tuning of the corresponding slot, i.e. 1200 times "
+             "log_scaled_frequency_for_midi_note. slots and notes are broadcast "
+             "together",
+             py::arg("slots"), py::arg("notes"))
+        .def_property_readonly(
+            "frequency_table",
+            [](py::object self) {
+                const auto &b = self.cast<const bank::Bank &>();
+                return readonly_view(b.frequencies(),
+                                     {static_cast<py::ssize_t>(b.size()),
+                                      static_cast<py::ssize_t>(bank::kNotes)},
+                                     self);
+            },
+            "Read only (len(bank), 128) array of the frequency of each note of "
+            "each slot, sharing the bank's memory so it shows later swaps")
+        .def_property_readonly(
+            "cents_table",
+            [](py::object self) {
+                const auto &b = self.cast<const bank::Bank &>();
+                return readonly_view(b.cents(),
+                                     {static_cast<py::ssize_t>(b.size()),
+                                      static_cast<py::ssize_t>(bank::kNotes)},
+                                     self);
+            },
+            "Read only (len(bank), 128) array of the pitch in cents of each note "
+            "of each slot, sharing the bank's memory so it shows later swaps")
+        .def_property_readonly(
+            "versions",
+            [](py::object self) {
+                const auto &b = self.cast<const bank::Bank &>();
+                return readonly_view(b.versions(), {static_cast<py::ssize_t>(b.size())}, self);
+            },
+            "Read only array of the version of each slot, sharing the bank's "
+            "memory. A version is odd while its slot is being swapped and "
+            "increases with every swap, so a slot read from the tables between "
+            "two reads of the same even version is consistent")
+        .def_buffer([](bank::Bank &b) {
+            return py::buffer_info(const_cast<double *>(b.frequencies()), sizeof(double),
+                                   py::format_descriptor<double>::format(), 2,
+                                   {static_cast<py::ssize_t>(b.size()),
+                                    static_cast<py::ssize_t>(bank::kNotes)},
+                                   {static_cast<py::ssize_t>(bank::kNotes * sizeof(double)),
+                                    static_cast<py::ssize_t>(sizeof(double))},
+                                   true);
+        })
+        .def("__repr__", [](const bank::Bank &b) {
+            return "TuningBank(size=" + std::to_string(b.size()) + ")";
+        })
+    ;
 }
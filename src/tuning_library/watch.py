@@ -0,0 +1,228 @@
+"""
+Keep collections of scales and mappings up to date with a directory of files.
+"""
+
+import logging
+import os
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from ._tuning_library import TuningError, _read_kbm_file, _read_scl_file
+
+READERS = {".scl": _read_scl_file, ".kbm": _read_kbm_file}
+
+logger = logging.getLogger(__name__)
+
+Changes = namedtuple("Changes", ["added", "modified", "removed", "errors"])
+Changes.__doc__ = """
+Changes found by one refresh of a DirectoryWatcher.
+
+added, modified : dict of str to Scale or KeyboardMapping
+    Newly parsed files.
+removed : list of str
+    Files which were deleted, or which no longer parse.
+errors : dict of str to str
+    Files which failed to parse, and the error message.
+"""
+
+
+def _suffix(name):
+    return os.path.splitext(name)[1].lower()
+
+
+class DirectoryWatcher:
+    """
+    Poll a directory tree for added, modified and removed scl and kbm files.
+
+    Each refresh compares the modification time and size of every file with
+    the previous refresh, and only parses files which changed, so the cost of
+    a refresh is a stat of each file plus parsing the changed ones.
+
+    Parsed files are kept in `scales` and `mappings`. Indexes of scales with
+    ``add(scales)`` and ``remove(indices)`` methods, such as `JIIndex`, can be
+    attached to be updated with each change, and listeners are called with
+    the `Changes` of each refresh, e.g. to evict cached tunings.
+
+    Parameters
+    ----------
+    directory : str or Path
+        Root of the directory tree to watch.
+    suffixes : iterable of str, optional
+        Kinds of file to watch, ".scl" and/or ".kbm".
+    workers : int, optional
+        Number of threads to parse changed files with. By default files are
+        parsed in the refreshing thread.
+
+    Attributes
+    ----------
+    scales : dict of str to Scale
+        Parsed scl files by path.
+    mappings : dict of str to KeyboardMapping
+        Parsed kbm files by path.
+    errors : dict of str to str
+        Files which currently fail to parse, and the error message.
+    """
+
+    def __init__(self, directory, suffixes=(".scl", ".kbm"), workers=None):
+        self.directory = Path(directory)
+        self.suffixes = {s.lower() for s in suffixes}
+        unknown = self.suffixes - READERS.keys()
+        if unknown:
+            raise ValueError(f"Unknown suffixes {sorted(unknown)}, expected .scl or .kbm")
+        self.workers = workers
+        self.scales = {}
+        self.mappings = {}
+        self.errors = {}
+        self._stats = {}
+        self._indexes = []
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._stop = None
+        self._thread = None
+
+    def attach(self, index):
+        """
+        Keep an index of the watched scales up to date.
+
+        `index` must have ``add(scales)``, returning the indices of the added
+        scales, and ``remove(indices)`` methods. The scales already loaded are
+        added straight away.
+        """
+        with self._lock:
+            paths = list(self.scales)
+            indices = index.add(self.scales[p] for p in paths)
+            self._indexes.append((index, dict(zip(paths, indices))))
+        return index
+
+    def add_listener(self, listener):
+        """
+        Call `listener(changes)` after each refresh which finds changes.
+
+        Exceptions raised by a listener are logged, and don't stop the other
+        listeners or background refreshes.
+        """
+        self._listeners.append(listener)
+        return listener
+
+    def _scan(self):
+        stats = {}
+        stack = [self.directory]
+        # Symbolic links to directories are followed, but each directory is
+        # only scanned once so links back up the tree don't loop
+        visited = set()
+        while stack:
+            path = stack.pop()
+            try:
+                st = os.stat(path)
+                if (st.st_dev, st.st_ino) in visited:
+                    continue
+                visited.add((st.st_dev, st.st_ino))
+                entries = os.scandir(path)
+            except OSError:
+                continue
+            with entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir():
+                            stack.append(entry.path)
+                        elif _suffix(entry.name) in self.suffixes:
+                            st = entry.stat()
+                            stats[entry.path] = st.st_mtime_ns, st.st_size
+                    except OSError:
+                        pass
+        return stats
+
+    @staticmethod
+    def _read(path):
+        try:
+            return path, READERS[_suffix(path)](path), None
+        except TuningError as e:
+            return path, None, str(e)
+
+    def refresh(self):
+        """
+        Scan the directory and parse any added or modified files.
+
+        Returns
+        -------
+        Changes
+            The files which were added, modified, removed or failed to parse.
+        """
+        with self._lock:
+            stats = self._scan()
+            changed = [p for p, s in stats.items() if self._stats.get(p) != s]
+            removed = [p for p in self._stats if p not in stats]
+
+            if self.workers is not None and self.workers > 1 and len(changed) > 1:
+                with ThreadPoolExecutor(self.workers) as executor:
+                    results = list(executor.map(self._read, changed))
+            else:
+                results = [self._read(p) for p in changed]
+
+            changes = Changes({}, {}, [], {})
+            for path, parsed, error in results:
+                collection = self.scales if _suffix(path) == ".scl" else self.mappings
+                existed = path in collection
+                if error is not None:
+                    changes.errors[path] = self.errors[path] = error
+                    if existed:
+                        del collection[path]
+                        changes.removed.append(path)
+                    continue
+                self.errors.pop(path, None)
+                collection[path] = parsed
+                (changes.modified if existed else changes.added)[path] = parsed
+            for path in removed:
+                self.errors.pop(path, None)
+                if path in self.scales or path in self.mappings:
+                    self.scales.pop(path, None)
+                    self.mappings.pop(path, None)
+                    changes.removed.append(path)
+            self._stats = stats
+
+            self._update_indexes(changes)
+        if any(changes):
+            for listener in self._listeners:
+                try:
+                    listener(changes)
+                except Exception:
+                    logger.exception("Listener %r of %s failed", listener, self.directory)
+        return changes
+
+    def _update_indexes(self, changes):
+        stale = [p for p in (*changes.modified, *changes.removed) if _suffix(p) == ".scl"]
+        new = [p for p in (*changes.added, *changes.modified) if _suffix(p) == ".scl"]
+        for index, positions in self._indexes:
+            old = [positions.pop(p) for p in stale if p in positions]
+            if old:
+                index.remove(old)
+            if new:
+                added = index.add(self.scales[p] for p in new)
+                positions.update(zip(new, added))
+
+    def start(self, interval=1.0):
+        """Refresh every `interval` seconds in a background thread until `stop`."""
+        if self._thread is not None:
+            raise RuntimeError("DirectoryWatcher is already running")
+        self._stop = threading.Event()
+
+        def run(stop):
+            while True:
+                try:
+                    self.refresh()
+                except Exception:
+                    logger.exception("Refreshing %s failed", self.directory)
+                if stop.wait(interval):
+                    break
+
+        self._thread = threading.Thread(target=run, args=(self._stop,), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop refreshing in the background."""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,107 @@
+"""
+Tests for tuning_library.archive
+"""
+
+import io
+import tarfile
+import zipfile
+from pathlib import Path
+
+import pytest
+
+import tuning_library as tl
+
+DATA_DIR = Path(__file__).parent / "data"
+
+MEMBERS = {
+    "scl/test.scl": (DATA_DIR / "test.scl").read_bytes(),
+    "kbm/test.kbm": (DATA_DIR / "test.kbm").read_bytes(),
+    "scl/bad.scl": b"! bad.scl\nbad\n 3\n!\n100.0\n",
+    "readme.txt": b"not a scale",
+}
+
+
+def make_zip(members=MEMBERS):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        for name, contents in members.items():
+            zf.writestr(name, contents)
+    return buffer.getvalue()
+
+
+def make_tar(members=MEMBERS, mode="w:gz"):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode=mode) as tf:
+        for name, contents in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(contents)
+            tf.addfile(info, io.BytesIO(contents))
+    return buffer.getvalue()
+
+
+class Unseekable(io.RawIOBase):
+    def __init__(self, data):
+        self._buffer = io.BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        return self._buffer.readinto(b)
+
+
+@pytest.fixture(params=["zip", "tar"])
+def archive(request):
+    return make_zip() if request.param == "zip" else make_tar()
+
+
+def test_iter_archive_file_object(archive):
+    parsed = list(tl.iter_archive(io.BytesIO(archive), skip_errors=True))
+    assert [name for name, _ in parsed] == ["scl/test.scl", "kbm/test.kbm"]
+    scale, mapping = parsed[0][1], parsed[1][1]
+    expected = tl.read_scl_file(DATA_DIR / "test.scl")
+    assert scale.raw_text == expected.raw_text
+    assert [t.cents for t in scale.tones] == [t.cents for t in expected.tones]
+    assert mapping.raw_text == tl.read_kbm_file(DATA_DIR / "test.kbm").raw_text
+
+
+def test_iter_archive_path(archive, tmp_path):
+    path = tmp_path / "scales.archive"
+    path.write_bytes(archive)
+    for fname in (path, str(path)):
+        names = [name for name, _ in tl.iter_scl_archive(fname, skip_errors=True)]
+        assert names == ["scl/test.scl"]
+
+
+def test_iter_archive_restores_position(archive):
+    f = io.BytesIO(b"header" + archive)
+    f.seek(6)
+    names = [name for name, _ in tl.iter_kbm_archive(f)]
+    assert names == ["kbm/test.kbm"]
+
+
+def test_iter_archive_unseekable_tar():
+    f = io.BufferedReader(Unseekable(make_tar(mode="w")))
+    names = [name for name, _ in tl.iter_archive(f, skip_errors=True)]
+    assert names == ["scl/test.scl", "kbm/test.kbm"]
+
+
+def test_iter_archive_errors(archive):
+    with pytest.raises(tl.TuningError):
+        list(tl.iter_archive(io.BytesIO(archive)))
+    with pytest.raises(ValueError):
+        list(tl.iter_archive(io.BytesIO(archive), suffixes=(".txt",)))
+
+
+def test_iter_archive_workers():
+    members = {
+        f"scl/{i:04}.scl": f"! {i}.scl\nscale {i}\n 2\n!\n{100 + i}.0\n2/1\n".encode()
+        for i in range(200)
+    }
+    for data in (make_zip(members), make_tar(members)):
+        serial = list(tl.iter_scl_archive(io.BytesIO(data)))
+        parallel = list(tl.iter_scl_archive(io.BytesIO(data), workers=4))
+        assert [name for name, _ in parallel] == sorted(members)
+        assert [s.description for _, s in parallel] == [
+            s.description for _, s in serial
+        ]
@@ -0,0 +1,104 @@
+"""
+Tests for tuning_library.compact
+"""
+
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+import tuning_library as tl
+
+DATA_DIR = Path(__file__).parent / "data"
+
+
+@pytest.fixture
+def scales():
+    return [
+        tl.read_scl_file(DATA_DIR / "test.scl"),
+        tl.Scale(),
+        tl.even_division_of_span_by_m(3, 13),
+        tl.parse_scl_data(b"! comment\nunicode \xc3\xa9\n 2\n! another\n 3/2\n 701.955\n"),
+    ]
+
+
+def assert_same_scale(a, b):
+    assert a.name == b.name
+    assert a.description == b.description
+    assert a.raw_text == b.raw_text
+    assert a.count == b.count
+    assert len(a.tones) == len(b.tones)
+    for s, t in zip(a.tones, b.tones):
+        assert s.type == t.type
+        assert s.cents == t.cents
+        assert s.ratio_n == t.ratio_n
+        assert s.ratio_d == t.ratio_d
+        assert s.string_rep == t.string_rep
+        assert s.float_value == t.float_value
+        assert s.lineno == t.lineno
+
+
+def test_round_trip(scales):
+    compact = tl.CompactScales(scales)
+    assert len(compact) == len(scales)
+    for scale, unpacked in zip(scales, compact.to_scales()):
+        assert_same_scale(scale, unpacked)
+    for scale, unpacked in zip(scales, compact):
+        assert_same_scale(scale, unpacked)
+    assert_same_scale(compact[-1], scales[-1])
+    for scale, unpacked in zip(scales[1:3], compact[1:3]):
+        assert_same_scale(scale, unpacked)
+    with pytest.raises(IndexError):
+        compact[len(scales)]
+
+
+def test_tones(scales):
+    compact = tl.CompactScales(scales)
+    assert compact.tones.dtype.names == (
+        "type",
+        "lineno",
+        "cents",
+        "ratio_n",
+        "ratio_d",
+        "float_value",
+    )
+    assert len(compact.tones) == sum(len(s.tones) for s in scales)
+    assert compact.counts.tolist() == [s.count for s in scales]
+    for i, scale in enumerate(scales):
+        tones = compact.scale_tones(i)
+        assert tones["cents"].tolist() == [t.cents for t in scale.tones]
+        assert tones["type"].tolist() == [int(t.type) for t in scale.tones]
+        assert compact.string_reps(i) == [t.string_rep for t in scale.tones]
+        assert compact.name(i) == scale.name
+        assert compact.description(i) == scale.description
+        assert compact.raw_text(i) == scale.raw_text
+    assert compact.description(3) == "unicode \xe9"
+
+
+def test_from_arrays(scales, tmp_path):
+    compact = tl.CompactScales(scales)
+    np.savez(tmp_path / "scales.npz", **compact.arrays())
+    with np.load(tmp_path / "scales.npz") as arrays:
+        loaded = tl.CompactScales.from_arrays(**arrays)
+    assert loaded.nbytes == compact.nbytes
+    for scale, unpacked in zip(scales, loaded):
+        assert_same_scale(scale, unpacked)
+
+
+def test_invalid_arrays(scales):
+    arrays = tl.CompactScales(scales).arrays()
+    arrays["offsets"] = arrays["offsets"].copy()
+    arrays["offsets"][1] = 10**6
+    with pytest.raises(tl.TuningError):
+        tl.CompactScales.from_arrays(**arrays)[0]
+    arrays = tl.CompactScales(scales).arrays()
+    arrays["counts"] = arrays["counts"][:-1]
+    with pytest.raises(tl.TuningError):
+        tl.CompactScales.from_arrays(**arrays).to_scales()
+
+
+def test_empty():
+    compact = tl.CompactScales()
+    assert len(compact) == 0
+    assert compact.to_scales() == []
+    assert compact.tones.shape == (0,)
@@ -0,0 +1,176 @@
+"""
+Tests for tuning_library.export
+"""
+
+import csv
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+import tuning_library as tl
+from tuning_library import export
+
+DATA_DIR = Path(__file__).parent / "data"
+
+
+@pytest.fixture
+def scale_dir(tmp_path):
+    directory = tmp_path / "scales"
+    (directory / "sub").mkdir(parents=True)
+    for m in range(5, 25):
+        parent = directory / "sub" if m % 2 else directory
+        (parent / f"edo_{m:02d}.scl").write_text(
+            tl.even_division_of_span_by_m(2, m).raw_text
+        )
+    (directory / "bad.scl").write_text("! bad.scl\nbad\n 0\n")
+    (directory / "edo_12.kbm").write_bytes((DATA_DIR / "test.kbm").read_bytes())
+    return directory
+
+
+def expected_rows(names, kbm=None):
+    rows = []
+    for name in names:
+        try:
+            rows.append(tl.scala_files_to_frequencies(name, kbm))
+        except tl.TuningError:
+            rows.append([np.nan] * 128)
+    return np.array(rows)
+
+
+def test_find_scl_files(scale_dir):
+    files = export.find_scl_files([scale_dir])
+    assert len(files) == 21
+    assert files == sorted(files)
+    pattern = str(scale_dir / "sub" / "*.scl")
+    assert export.find_scl_files([pattern, scale_dir]) == export.find_scl_files(
+        [pattern]
+    ) + [f for f in files if "sub" not in f]
+    single = scale_dir / "edo_12.scl"
+    assert export.find_scl_files([single, single]) == [str(single)]
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_export_npy(scale_dir, tmp_path, workers):
+    output = tmp_path / "out.npy"
+    stats = tl.export_frequencies([scale_dir], output, workers=workers, chunk_size=4)
+    names = (tmp_path / "out.npy.names.txt").read_text().splitlines()
+    assert names == export.find_scl_files([scale_dir])
+    assert stats.files == stats.written == 21 and stats.resumed == 0
+    assert list(stats.errors) == [str(scale_dir / "bad.scl")]
+    frequencies = np.load(output, mmap_mode="r")
+    np.testing.assert_array_equal(frequencies, expected_rows(names))
+    assert not (tmp_path / "out.npy.progress").exists()
+
+
+def test_export_csv_and_bin(scale_dir, tmp_path):
+    kbm = DATA_DIR / "test.kbm"
+    tl.export_frequencies([scale_dir], tmp_path / "out.csv", kbm=kbm, chunk_size=5)
+    tl.export_frequencies([scale_dir], tmp_path / "out.dat", format="bin", kbm=kbm)
+    names = export.find_scl_files([scale_dir])
+    expected = expected_rows(names, kbm)
+
+    with open(tmp_path / "out.csv", newline="") as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == ["name", *map(str, range(128))]
+    assert [row[0] for row in rows[1:]] == names
+    np.testing.assert_array_equal(np.array([row[1:] for row in rows[1:]], float), expected)
+
+    binary = np.fromfile(tmp_path / "out.dat", dtype="<f8").reshape(-1, 128)
+    np.testing.assert_array_equal(binary, expected)
+    assert (tmp_path / "out.dat.names.txt").read_text().splitlines() == names
+
+
+def test_export_pair_kbm(scale_dir, tmp_path):
+    output = tmp_path / "out.npy"
+    tl.export_frequencies([scale_dir], output, pair_kbm=True)
+    names = export.find_scl_files([scale_dir])
+    frequencies = np.load(output)
+    i = names.index(str(scale_dir / "edo_12.scl"))
+    expected = tl.scala_files_to_frequencies(names[i], scale_dir / "edo_12.kbm")
+    assert frequencies[i].tolist() == expected
+    assert frequencies[1].tolist() == tl.scala_files_to_frequencies(names[1])
+
+
+@pytest.mark.parametrize("format", ["npy", "csv", "bin"])
+def test_export_resume(scale_dir, tmp_path, monkeypatch, format):
+    complete = tmp_path / f"complete.{format}"
+    tl.export_frequencies([scale_dir], complete, chunk_size=3)
+
+    # Fail part way through, after some chunks have been written
+    tune_chunk = export._tune_chunk
+    calls = []
+
+    def failing(*args):
+        calls.append(1)
+        if len(calls) == 4:
+            raise RuntimeError("interrupted")
+        return tune_chunk(*args)
+
+    output = tmp_path / f"out.{format}"
+    monkeypatch.setattr(export, "_tune_chunk", failing)
+    with pytest.raises(RuntimeError, match="interrupted"):
+        tl.export_frequencies([scale_dir], output, chunk_size=3, workers=1)
+    assert (tmp_path / f"out.{format}.progress").exists()
+    monkeypatch.setattr(export, "_tune_chunk", tune_chunk)
+
+    stats = tl.export_frequencies([scale_dir], output, chunk_size=3)
+    assert stats.resumed == 9 and stats.written == 12
+    assert list(stats.errors) == [str(scale_dir / "bad.scl")]
+    assert output.read_bytes() == complete.read_bytes()
+    assert not (tmp_path / f"out.{format}.progress").exists()
+
+    # A finished export is written again from the start
+    assert tl.export_frequencies([scale_dir], output, chunk_size=3).resumed == 0
+
+
+def test_export_restarts_after_changes(scale_dir, tmp_path, monkeypatch):
+    tune_chunk = export._tune_chunk
+
+    def failing(scl_files, kbm_files):
+        if str(scale_dir / "edo_24.scl") in scl_files:
+            raise RuntimeError("interrupted")
+        return tune_chunk(scl_files, kbm_files)
+
+    output = tmp_path / "out.npy"
+    monkeypatch.setattr(export, "_tune_chunk", failing)
+    with pytest.raises(RuntimeError, match="interrupted"):
+        tl.export_frequencies([scale_dir], output, chunk_size=3, workers=1)
+    monkeypatch.setattr(export, "_tune_chunk", tune_chunk)
+
+    # Rows already written for a changed file aren't kept
+    edited = scale_dir / "bad.scl"
+    edited.write_text(tl.even_division_of_span_by_m(3, 13).raw_text)
+    stats = tl.export_frequencies([scale_dir], output, chunk_size=3)
+    assert stats.resumed == 0 and stats.errors == {}
+    names = export.find_scl_files([scale_dir])
+    np.testing.assert_array_equal(np.load(output), expected_rows(names))
+
+
+def test_export_invalid(scale_dir, tmp_path):
+    with pytest.raises(ValueError, match="format"):
+        tl.export_frequencies([scale_dir], tmp_path / "out.npy", format="txt")
+    with pytest.raises(ValueError, match="chunk_size"):
+        tl.export_frequencies([scale_dir], tmp_path / "out.npy", chunk_size=0)
+
+
+def test_command_line(scale_dir, tmp_path):
+    output = tmp_path / "out.npy"
+    result = subprocess.run(
+        [sys.executable, "-m", "tuning_library", "export", str(scale_dir), "-o", str(output)],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert "Exported 21 files" in result.stdout
+    assert "files/s" in result.stdout
+    assert "bad.scl: Invalid SCL note count" in result.stderr
+    assert np.load(output).shape == (21, 128)
+
+    result = subprocess.run(
+        [sys.executable, "-m", "tuning_library", "unknown"], capture_output=True, text=True
+    )
+    assert result.returncode == 2
+    assert "export" in result.stderr
@@ -0,0 +1,195 @@
+"""
+Tests for tuning_library.ji
+"""
+
+import threading
+from fractions import Fraction
+from pathlib import Path
+
+import pytest
+
+import tuning_library as tl
+
+DATA_DIR = Path(__file__).parent / "data"
+
+
+def make_scale(*tones):
+    return tl.parse_scl_data(
+        f"! test.scl\ntest\n {len(tones)}\n!\n" + "\n".join(tones) + "\n"
+    )
+
+
+@pytest.fixture
+def index():
+    scales = [
+        make_scale("9/8", "5/4", "4/3", "3/2", "5/3", "15/8", "2/1"),
+        make_scale("8/7", "4/3", "3/2", "7/4", "2/1"),
+        tl.read_scl_file(DATA_DIR / "test.scl"),
+        tl.Scale(),
+        make_scale("9/8", "13/11", "2/1"),
+        make_scale("9/8", "4/3", "3/2", "16/9", "2/1"),
+    ]
+    return tl.JIIndex(scales)
+
+
+def test_tone_prime_factors():
+    tone = tl.tone_from_string("45/32")
+    assert tone.prime_factors() == {2: -5, 3: 2, 5: 1}
+    assert tone.monzo().tolist() == [-5, 2, 1]
+    assert tone.prime_limit() == 5
+    assert tone.odd_limit() == 45
+
+
+def test_tone_prime_factors_unreduced():
+    tone = tl.tone_from_string("14/12")
+    assert tone.prime_factors() == {2: -1, 3: -1, 7: 1}
+    assert tone.monzo().tolist() == [-1, -1, 0, 1]
+    assert tone.odd_limit() == 7
+
+
+def test_tone_prime_factors_unison():
+    tone = tl.tone_from_string("1/1")
+    assert tone.prime_factors() == {}
+    assert tone.monzo().tolist() == []
+    assert tone.prime_limit() == 1
+    assert tone.odd_limit() == 1
+
+
+def test_tone_prime_factors_cents():
+    tone = tl.tone_from_string("701.955")
+    assert tone.prime_factors() is None
+    assert tone.monzo() is None
+    assert tone.prime_limit() is None
+    assert tone.odd_limit() is None
+
+
+def test_tone_prime_factors_large():
+    p, q = 2**31 - 1, 2**31 - 19
+    tone = tl.tone_from_string(f"{p * q}/{2**10}")
+    assert tone.prime_factors() == {2: -10, q: 1, p: 1}
+    assert tone.prime_limit() == p
+    with pytest.raises(tl.TuningError):
+        tone.monzo()
+
+
+def test_scale_limits():
+    scale = make_scale("9/8", "7/6", "3/2", "2/1")
+    assert scale.prime_limit() == 7
+    assert scale.odd_limit() == 9
+    assert tl.read_scl_file(DATA_DIR / "test.scl").prime_limit() is None
+    assert tl.Scale().prime_limit() == 1
+
+
+def test_scale_monzos():
+    scales = [make_scale("9/8", "7/4", "2/1"), make_scale("100.0", "3/2")]
+    data = tl.scale_monzos(scales)
+    assert data["offsets"].tolist() == [0, 3, 5]
+    assert data["prime_limit"].tolist() == [7, -1]
+    assert data["odd_limit"].tolist() == [9, -1]
+    assert data["primes"].tolist() == [2, 3, 7]
+    assert data["monzos"].tolist() == [
+        [-3, 2, 0],
+        [-2, 0, 1],
+        [1, 0, 0],
+        [0, 0, 0],
+        [-1, 1, 0],
+    ]
+    assert data["numerators"].tolist() == [9, 7, 2, 0, 3]
+    assert data["denominators"].tolist() == [8, 4, 1, 0, 2]
+    assert data["is_ji"].tolist() == [True, True, True, False, True]
+
+
+def test_scale_monzos_empty():
+    data = tl.scale_monzos([])
+    assert data["offsets"].tolist() == [0]
+    assert data["monzos"].shape == (0, 0)
+
+
+def test_ji_index_limits(index):
+    assert len(index) == 6
+    assert index.prime_limits.tolist() == [5, 7, -1, 1, 13, 3]
+    assert index.within_prime_limit(5).tolist() == [0, 3, 5]
+    assert index.within_prime_limit(7).tolist() == [0, 1, 3, 5]
+    assert index.within_odd_limit(9).tolist() == [1, 3, 5]
+
+
+@pytest.mark.parametrize("ratio", ["13/11", "26/22", Fraction(13, 11), (13, 11)])
+def test_ji_index_containing(index, ratio):
+    assert index.containing(ratio).tolist() == [4]
+
+
+def test_ji_index_containing_other(index):
+    assert index.containing("3/2").tolist() == [0, 1, 2, 5]
+    assert index.containing("2").tolist() == [0, 1, 2, 4, 5]
+    assert index.containing("11/10").tolist() == []
+
+
+def test_ji_index_using_primes(index):
+    assert index.using_primes([2, 3]).tolist() == [3, 5]
+    assert index.using_primes([2, 3, 7]).tolist() == [1, 3, 5]
+
+
+def test_ji_index_add_remove(index):
+    added = index.add([make_scale("11/8", "2/1"), make_scale("3/2", "2/1")])
+    assert added.tolist() == [6, 7]
+    assert index.within_prime_limit(11).tolist() == [0, 1, 3, 5, 6, 7]
+    assert index.containing("11/8").tolist() == [6]
+    index.remove([0, 6])
+    assert len(index) == 6
+    assert index.scales[0] is None
+    assert index.within_prime_limit(11).tolist() == [1, 3, 5, 7]
+    assert index.containing("3/2").tolist() == [1, 2, 5, 7]
+    assert index.using_primes([2, 3]).tolist() == [3, 5, 7]
+    # Removed indices are reused
+    assert index.add([make_scale("11/8", "2/1")]).tolist() == [0]
+    assert index.containing("11/8").tolist() == [0]
+    assert index.add([make_scale("7/4", "2/1")] * 2).tolist() == [6, 8]
+    assert index.within_prime_limit(7).tolist() == [1, 3, 5, 6, 7, 8]
+
+
+def test_ji_index_add_to_empty():
+    index = tl.JIIndex()
+    assert len(index) == 0
+    assert index.within_prime_limit(7).tolist() == []
+    assert index.add([make_scale("5/4", "2/1")]).tolist() == [0]
+    assert index.containing("5/4").tolist() == [0]
+
+
+def test_ji_index_memory_is_bounded():
+    index = tl.JIIndex([make_scale("5/4", "3/2", "2/1")] * 10)
+    scales = [make_scale("7/4", "2/1"), make_scale("11/8", "13/8", "2/1")]
+    for k in range(2000):
+        index.remove([k % 10])
+        assert index.add([scales[k % 2]]).tolist() == [k % 10]
+    assert len(index) == len(index.scales) == 10
+    assert len(index.monzos) < 2000
+    assert len(index._monzos) < 4000
+    assert sorted(index._ratios) == [(2, 1), (7, 4), (11, 8), (13, 8)]
+    assert index.primes.tolist() == [2, 7, 11, 13]
+    assert index.using_primes([2, 7]).tolist() == [0, 2, 4, 6, 8]
+    assert index.containing("13/8").tolist() == [1, 3, 5, 7, 9]
+
+
+def test_ji_index_threads():
+    scales = [make_scale("5/4", "2/1"), make_scale("7/4", "11/8", "2/1")]
+    index = tl.JIIndex(scales * 50)
+    stop = threading.Event()
+
+    def change():
+        k = 0
+        while not stop.is_set():
+            index.remove([k % 100])
+            index.add([scales[k % 2]])
+            k += 1
+
+    thread = threading.Thread(target=change)
+    thread.start()
+    try:
+        for _ in range(500):
+            for i in index.within_prime_limit(5):
+                assert index.prime_limits[i] <= 5
+            index.using_primes([2, 5])
+            index.containing("11/8")
+    finally:
+        stop.set()
+        thread.join()
@@ -0,0 +1,171 @@
+"""
+Tests for tuning_library.serve
+"""
+
+import asyncio
+import os
+import shutil
+import socket
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+import tuning_library as tl
+from tuning_library import serve
+
+DATA_DIR = Path(__file__).parent / "data"
+
+pytestmark = pytest.mark.skipif(
+    not hasattr(socket, "AF_UNIX"), reason="requires Unix domain sockets"
+)
+
+
+@pytest.fixture
+def server():
+    # Socket paths have a short length limit, so don't use pytest's tmp_path
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "tunings.sock")
+    cache = serve.TuningCache(maxsize=4)
+    loop = asyncio.new_event_loop()
+    server = loop.run_until_complete(serve.start_server(path, cache))
+    thread = threading.Thread(target=loop.run_forever)
+    thread.start()
+    yield path, cache
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+
+    async def shutdown():
+        server.close()
+        await server.wait_closed()
+        tasks = asyncio.all_tasks() - {asyncio.current_task()}
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    loop.run_until_complete(shutdown())
+    loop.close()
+    shutil.rmtree(directory)
+
+
+def expected_frequencies(scale=None, mapping=None):
+    if scale is None:
+        scale = tl.even_temperament_12_note_scale()
+    if mapping is None:
+        mapping = tl.KeyboardMapping()
+    tuning = tl.Tuning(scale, mapping)
+    return [tuning.frequency_for_midi_note(n) for n in range(128)]
+
+
+def test_frequencies(server):
+    path, cache = server
+    scl_file, kbm_file = DATA_DIR / "test.scl", DATA_DIR / "test.kbm"
+    scale, mapping = tl.read_scl_file(scl_file), tl.read_kbm_file(kbm_file)
+    with tl.TuningClient(path) as client:
+        assert client.frequencies().tolist() == expected_frequencies()
+        assert client.frequencies(scl_file).tolist() == expected_frequencies(scale)
+        frequencies = client.frequencies(scl_file, str(kbm_file))
+        assert frequencies.tolist() == expected_frequencies(scale, mapping)
+        content = client.frequencies(scl_file.read_bytes(), kbm_file.read_bytes())
+        assert content.tolist() == frequencies.tolist()
+        assert client.frequencies(scl_file, kbm_file).tolist() == frequencies.tolist()
+    assert len(cache) == 4
+    assert cache.hits == 1
+
+
+def test_lookup(server):
+    path, _ = server
+    scale = tl.read_scl_file(DATA_DIR / "test.scl")
+    expected = expected_frequencies(scale)
+    with tl.TuningClient(path) as client:
+        notes = [0, 60, 69, 127, 60]
+        result = client.lookup(notes, DATA_DIR / "test.scl")
+        assert result.tolist() == [expected[n] for n in notes]
+        assert client.lookup([], DATA_DIR / "test.scl").tolist() == []
+
+
+def test_errors(server):
+    path, _ = server
+    with tl.TuningClient(path, pool_size=1) as client:
+        with pytest.raises(tl.TuningError, match="No such file"):
+            client.frequencies(DATA_DIR / "missing.scl")
+        with pytest.raises(tl.TuningError, match="Invalid SCL note count"):
+            client.frequencies(b"! bad.scl\nbad\n 0\n")
+        with pytest.raises(tl.TuningError, match="between 0 and 127"):
+            client.lookup([128])
+        # The connection is still usable after an error
+        assert client.frequencies().tolist() == expected_frequencies()
+
+
+def test_modified_file_is_reloaded(server, tmp_path):
+    path, _ = server
+    scl_file = tmp_path / "scale.scl"
+    scl_file.write_text(tl.even_division_of_span_by_m(2, 12).raw_text)
+    with tl.TuningClient(path) as client:
+        before = client.frequencies(scl_file)
+        scl_file.write_text(tl.even_division_of_span_by_m(2, 19).raw_text + "\n")
+        after = client.frequencies(scl_file)
+    assert after.tolist() == expected_frequencies(tl.read_scl_file(scl_file))
+    assert after.tolist() != before.tolist()
+
+
+def test_pooled_threads(server):
+    path, cache = server
+    expected = expected_frequencies(tl.read_scl_file(DATA_DIR / "test.scl"))
+    with tl.TuningClient(path, pool_size=4) as client:
+
+        def work(_):
+            for _ in range(20):
+                assert client.lookup([60], DATA_DIR / "test.scl")[0] == expected[60]
+            return True
+
+        with ThreadPoolExecutor(8) as executor:
+            assert all(executor.map(work, range(8)))
+        assert 1 <= client._pool.qsize() <= 4
+    assert len(cache) == 1
+
+
+def test_protocol_round_trip():
+    payload = serve.encode_request(serve.OP_LOOKUP, b"scl data", None, [1, 2, 3])
+    op, scale, mapping, notes = serve.decode_request(payload)
+    assert op == serve.OP_LOOKUP
+    assert scale == (serve.SOURCE_CONTENT, b"scl data")
+    assert mapping == (serve.SOURCE_DEFAULT, b"")
+    assert notes.tolist() == [1, 2, 3]
+    with pytest.raises(serve.ProtocolError):
+        serve.decode_request(payload[:-1])
+    with pytest.raises(serve.ProtocolError):
+        serve.decode_request(b"\x09" + payload[1:])
+
+
+def test_socket_mode(server):
+    path, _ = server
+    assert os.stat(path).st_mode & 0o777 == 0o600
+
+
+def test_malformed_request(server):
+    path, _ = server
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path)
+        request = serve.encode_request(serve.OP_FREQUENCIES)
+        for payload in (b"\x09" + request[1:], request):
+            sock.sendall(serve._LENGTH.pack(len(payload)) + payload)
+            (length,) = serve._LENGTH.unpack(tl.TuningClient._read(sock, 4))
+            response = tl.TuningClient._read(sock, length)
+            if payload is request:
+                assert response[0] == serve.STATUS_OK
+            else:
+                assert response[0] == serve.STATUS_ERROR
+                assert b"Unknown op 9" in response
+
+
+def test_stale_connection_is_retried(server):
+    path, _ = server
+    with tl.TuningClient(path, pool_size=1) as client:
+        client.frequencies()
+        # As if the service had closed the idle connection
+        client._pool.queue[0].shutdown(socket.SHUT_RDWR)
+        assert client.frequencies().tolist() == expected_frequencies()
+        assert client._pool.qsize() == 1
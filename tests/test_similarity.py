@@ -0,0 +1,147 @@
+"""
+Tests for scale_features and tuning_library.similarity
+"""
+
+import random
+
+import numpy as np
+import pytest
+
+import tuning_library as tl
+
+
+def make_scale(*tones):
+    lines = ["! test.scl", "test", f" {len(tones)}", "!", *(f" {t}" for t in tones)]
+    return tl.parse_scl_data("\n".join(lines) + "\n")
+
+
+def random_scales(size, seed=0):
+    rng = random.Random(seed)
+    scales = []
+    for _ in range(size):
+        edo = rng.randrange(5, 41)
+        steps = sorted(rng.sample(range(1, edo), rng.randrange(1, min(edo, 13))))
+        scales.append(make_scale(*(f"{1200 * s / edo:.5f}" for s in steps), "2/1"))
+    return scales
+
+
+def test_scale_features_shape():
+    scales = [tl.even_division_of_span_by_m(2, 12), tl.Scale(), make_scale("2/1")]
+    features = tl.scale_features(scales, bins=16)
+    assert features.shape == (3, 17)
+    assert np.linalg.norm(features[0, :16]) == pytest.approx(1)
+    assert features[1:, :16].tolist() == [[0.0] * 16] * 2
+    assert features[:, 16].tolist() == [1.0, 0.0, 1.0]
+    assert tl.scale_features([], bins=16).shape == (0, 17)
+
+
+def test_scale_features_period():
+    bp = tl.even_division_of_span_by_m(3, 13)
+    edo = tl.even_division_of_cents_by_m(1200, 13)
+    # Smoothing is in cents, so only equal without it
+    features = tl.scale_features([bp, edo], width=0, period_weight=2.0)
+    assert features[0, :-1] == pytest.approx(features[1, :-1])
+    assert features[:, -1] == pytest.approx([2 * np.log2(3), 2.0])
+
+
+def test_scale_features_mode_invariant():
+    major = make_scale("9/8", "5/4", "4/3", "3/2", "5/3", "15/8", "2/1")
+    dorian = make_scale("10/9", "32/27", "4/3", "40/27", "5/3", "16/9", "2/1")
+    other = make_scale("10/9", "32/27", "4/3", "3/2", "5/3", "16/9", "2/1")
+    features = tl.scale_features([major, dorian, other])
+    assert features[0] == pytest.approx(features[1])
+    assert features[0] != pytest.approx(features[2])
+
+
+def test_scale_features_errors():
+    with pytest.raises(tl.TuningError, match="bins"):
+        tl.scale_features([tl.Scale()], bins=0)
+    with pytest.raises(tl.TuningError, match="Width"):
+        tl.scale_features([tl.Scale()], width=-1)
+
+
+def test_similar_scales_of_other_counts():
+    scales = [tl.even_division_of_span_by_m(2, m) for m in (5, 7, 12, 19, 24, 31, 36)]
+    index = tl.SimilarityIndex(scales)
+    indices, distances = index.query(scales[2], k=2)
+    assert indices.tolist() == [2, 4]
+    assert distances[0] == 0
+
+
+@pytest.mark.parametrize("eps", [0.0, 0.5])
+def test_query_matches_brute_force(eps):
+    scales = random_scales(2000)
+    index = tl.SimilarityIndex(scales, leaf_size=16)
+    for target in random_scales(20, seed=1):
+        features = index.scale_features([target])[0]
+        expected = np.sort(np.linalg.norm(index.features - features, axis=1))[:5]
+        indices, distances = index.query(target, k=5, max_leaves=None, eps=eps)
+        assert distances == pytest.approx(
+            np.linalg.norm(index.features[indices] - features, axis=1)
+        )
+        assert np.all(distances <= (1 + eps) * expected + 1e-12)
+        assert np.all(np.diff(distances) >= 0)
+
+
+def test_query_max_leaves():
+    index = tl.SimilarityIndex(random_scales(2000), leaf_size=16)
+    target = index.scales[0]
+    indices, distances = index.query(target, k=5, max_leaves=1)
+    assert len(indices) == 5
+    assert indices[0] == 0 and distances[0] == 0
+    assert index.query(target, k=0)[0].tolist() == []
+
+
+def test_add_remove():
+    scales = random_scales(600)
+    index = tl.SimilarityIndex(scales[:300])
+    assert index.add(scales[300:]).tolist() == list(range(300, 600))
+    assert len(index) == 600
+    assert index.query(scales[450], k=1, max_leaves=None)[0].tolist() == [450]
+    index.remove(np.arange(0, 600, 2))
+    assert len(index) == 300
+    assert index.scales[0] is None
+    indices, _ = index.query(scales[450], k=50, max_leaves=None)
+    assert 450 not in indices
+    assert np.all(indices % 2 == 1)
+    assert index.add([scales[450]]).tolist() == [600]
+    assert index.query(scales[450], k=1, max_leaves=None)[0].tolist() == [600]
+
+
+def test_repeated_changes_are_bounded():
+    scales = random_scales(1000)
+    index = tl.SimilarityIndex(scales[:500])
+    ids = list(range(500))
+    for k in range(3000):
+        index.remove([ids[k % 500]])
+        (ids[k % 500],) = index.add([scales[500 + k % 500]])
+    assert len(index) == 500
+    # Indices are reused once the tree has been rebuilt without them
+    assert len(index.scales) < 2000
+    assert len(index._features) < 4000
+    live = [i for i, scale in enumerate(index.scales) if scale is not None]
+    assert len(live) == 500
+    for i in live[:20]:
+        assert index.query(index.scales[i], k=1, max_leaves=None)[1][0] == 0
+
+
+def test_feature_vector_query():
+    index = tl.SimilarityIndex([tl.even_division_of_span_by_m(2, 12)])
+    features = index.scale_features([tl.even_division_of_span_by_m(2, 12)])[0]
+    assert index.query(features, k=1)[0].tolist() == [0]
+    with pytest.raises(ValueError, match="shape"):
+        index.query(features[:-1])
+
+
+def test_attach_to_watcher(tmp_path):
+    for m in (5, 12, 24):
+        (tmp_path / f"{m}.scl").write_text(tl.even_division_of_span_by_m(2, m).raw_text)
+    watcher = tl.DirectoryWatcher(tmp_path)
+    watcher.refresh()
+    index = watcher.attach(tl.SimilarityIndex())
+    assert len(index) == 3
+    (tmp_path / "24.scl").unlink()
+    watcher.refresh()
+    target = tl.even_division_of_span_by_m(2, 24)
+    nearest = index.scales[index.query(target, k=1)[0][0]]
+    assert nearest.count == 12
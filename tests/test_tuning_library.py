@@ -2,7 +2,15 @@
 Tests for tuning_library
 """
 
+import locale
 import math
+import mmap
+import random
+import subprocess
+import sys
+import sysconfig
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import pytest
@@ -105,6 +113,23 @@ def test_parse_scl_data():
     assert scale.name == DEFAULT_SCALE_NAME
 
 
+@pytest.mark.parametrize("wrap", [bytes, bytearray, memoryview])
+def test_parse_scl_data_buffer(wrap):
+    data = (DATA_DIR / "test.scl").read_bytes()
+    scale = tl.parse_scl_data(wrap(data))
+    check_scale(scale, data.decode())
+    assert scale.name == DEFAULT_SCALE_NAME
+    with pytest.raises(tl.TuningError):
+        tl.parse_scl_data(wrap(data[:20]))
+
+
+def test_read_scl_file_mmap():
+    with open(DATA_DIR / "test.scl", "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            scale = tl.read_scl_file(m)
+    check_scale(scale, (DATA_DIR / "test.scl").read_text())
+
+
 def test_scale_init():
     scale = tl.Scale()
     assert scale.name == "empty scale"
@@ -285,6 +310,16 @@ def test_parse_kbm_data():
     assert mapping.name == "Mapping from patch"
 
 
+def test_parse_kbm_data_buffer():
+    data = (DATA_DIR / "test.kbm").read_bytes()
+    mapping = tl.parse_kbm_data(memoryview(data))
+    check_mapping(mapping, data.decode())
+    assert mapping.name == "Mapping from patch"
+    with open(DATA_DIR / "test.kbm", "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            check_mapping(tl.read_kbm_file(m), data.decode())
+
+
 def test_keyboard_mapping_init():
     mapping = tl.KeyboardMapping()
     assert mapping.count == 0
@@ -478,3 +513,771 @@ def test_scala_files_to_frequencies_1():
 def test_scala_files_to_frequencies_2():
     freqs = tl.scala_files_to_frequencies(DATA_DIR / "test.scl", DATA_DIR / "test.kbm")
     assert_close(freqs[1] / freqs[0], 25 / 24)
+
+
+@pytest.fixture
+def profiling():
+    tl.reset_profiling_stats()
+    tl.set_profiling_enabled(True)
+    yield
+    tl.set_profiling_enabled(False)
+    tl.set_profiling_hook(None)
+    tl.reset_profiling_stats()
+
+
+def test_profiling_disabled_by_default():
+    assert not tl.is_profiling_enabled()
+    tl.reset_profiling_stats()
+    tl.parse_scl_data((DATA_DIR / "test.scl").read_text())
+    assert tl.profiling_stats()["parse_scl_data"]["count"] == 0
+
+
+def test_profiling_stats(profiling):
+    assert tl.is_profiling_enabled()
+    scale = tl.read_scl_file(DATA_DIR / "test.scl")
+    tl.parse_scl_data(scale.raw_text)
+    tuning = tl.Tuning(scale, tl.read_kbm_file(DATA_DIR / "test.kbm"))
+    for i in range(128):
+        tuning.frequency_for_midi_note(i)
+
+    stats = tl.profiling_stats()
+    assert stats["_read_scl_file"]["count"] == 1
+    assert stats["_read_kbm_file"]["count"] == 1
+    assert stats["parse_scl_data"]["count"] == 1
+    assert stats["parse_kbm_data"]["count"] == 0
+    assert stats["Tuning.__init__"]["count"] == 1
+    lookups = stats["Tuning.frequency_for_midi_note"]
+    assert lookups["count"] == 128
+    assert sum(lookups["histogram"]) == 128
+    assert lookups["min_ns"] <= lookups["max_ns"] <= lookups["total_ns"]
+
+    tl.reset_profiling_stats()
+    stats = tl.profiling_stats()
+    assert all(s["count"] == 0 for s in stats.values())
+    assert all(s["total_ns"] == 0 for s in stats.values())
+
+
+def test_profiling_records_errors(profiling):
+    with pytest.raises(tl.TuningError):
+        tl.read_scl_file("")
+    assert tl.profiling_stats()["_read_scl_file"]["count"] == 1
+
+
+def test_profiling_hook(profiling):
+    calls = []
+    tl.set_profiling_hook(lambda name, ns: calls.append((name, ns)))
+    assert tl.get_profiling_hook() is not None
+    tuning = tl.Tuning()
+    tuning.is_midi_note_mapped(60)
+    assert [name for name, _ in calls] == [
+        "Tuning.__init__",
+        "Tuning.is_midi_note_mapped",
+    ]
+    assert all(isinstance(ns, int) for _, ns in calls)
+
+    tl.set_profiling_hook(None)
+    assert tl.get_profiling_hook() is None
+    tuning.is_midi_note_mapped(60)
+    assert len(calls) == 2
+
+
+def test_profiling_hook_error(profiling, monkeypatch):
+    def hook(name, ns):
+        raise ValueError(name)
+
+    tl.set_profiling_hook(hook)
+    unraisable = []
+    monkeypatch.setattr(sys, "unraisablehook", unraisable.append)
+    tuning = tl.Tuning()
+    frequency = tuning.frequency_for_midi_note(69)
+    # The calls still return, and the hook's errors are reported as unraisable
+    assert frequency == pytest.approx(440.0)
+    assert [str(u.exc_value) for u in unraisable] == [
+        "Tuning.__init__",
+        "Tuning.frequency_for_midi_note",
+    ]
+    assert all(isinstance(u.exc_value, ValueError) for u in unraisable)
+    assert all(u.object is hook for u in unraisable)
+    assert tl.profiling_stats()["Tuning.__init__"]["count"] == 1
+
+
+def scale_pitches(scale):
+    return [0.0] + [t.cents for t in scale.tones]
+
+
+def test_step_vector():
+    scale = tl.read_scl_file(DATA_DIR / "test.scl")
+    pitches = scale_pitches(scale)
+    steps = scale.step_vector()
+    assert steps.shape == (12,)
+    for step, x, y in zip(steps, pitches[1:], pitches):
+        assert_close(step, x - y)
+
+
+def test_step_vector_exact():
+    scale = tl.read_scl_file(DATA_DIR / "test.scl")
+    numerators, denominators = scale.step_vector(exact=True)
+    assert (numerators[0], denominators[0]) == (25, 24)
+    assert (numerators[1], denominators[1]) == (128, 125)
+    # Steps to and from the cents tone 150.0 are not exact ratios
+    assert denominators[2] == 0
+    assert denominators[3] == 0
+    assert (numerators[-1], denominators[-1]) == (16, 15)
+
+
+def test_interval_matrix():
+    scale = tl.read_scl_file(DATA_DIR / "test.scl")
+    pitches = scale_pitches(scale)
+    intervals = scale.interval_matrix()
+    assert intervals.shape == (13, 13)
+    for i, x in enumerate(pitches):
+        for j, y in enumerate(pitches):
+            assert_close(intervals[i, j], y - x)
+
+
+def test_interval_matrix_exact():
+    scale = tl.read_scl_file(DATA_DIR / "test.scl")
+    numerators, denominators = scale.interval_matrix(exact=True)
+    assert numerators.shape == denominators.shape == (13, 13)
+    # From 9/8 up to 3/2
+    assert (numerators[4, 9], denominators[4, 9]) == (4, 3)
+    # From 3/2 down to 9/8
+    assert (numerators[9, 4], denominators[9, 4]) == (3, 4)
+    assert (numerators[0, 12], denominators[0, 12]) == (2, 1)
+    assert denominators[3, 0] == 0
+
+
+def test_modes():
+    scale = tl.read_scl_file(DATA_DIR / "test.scl")
+    pitches = scale_pitches(scale)
+    period = pitches[-1]
+    modes = scale.modes()
+    assert modes.shape == (12, 13)
+    for i, mode in enumerate(modes):
+        expected = [x - pitches[i] for x in pitches[i:-1]]
+        expected += [period + x - pitches[i] for x in pitches[:i]] + [period]
+        for x, y in zip(mode, expected):
+            assert_close(x, y)
+
+
+def test_modes_exact():
+    scale = tl.parse_scl_data("! major\nmajor\n 7\n 9/8\n 5/4\n 4/3\n 3/2\n 5/3\n 15/8\n 2/1\n")
+    numerators, denominators = scale.modes(exact=True)
+    dorian = [str(n) + "/" + str(d) for n, d in zip(numerators[1], denominators[1])]
+    assert dorian == ["1/1", "10/9", "32/27", "4/3", "40/27", "5/3", "16/9", "2/1"]
+
+
+def test_scale_tables_empty_scale():
+    scale = tl.Scale()
+    assert scale.step_vector().shape == (0,)
+    assert scale.interval_matrix().tolist() == [[0.0]]
+    assert scale.modes().shape == (0, 1)
+
+
+def test_scale_tables_overflow():
+    big = 2**62 - 57
+    scale = tl.parse_scl_data(f"! big\nbig\n 2\n {big}/{big - 1}\n 3/{big}\n")
+    with pytest.raises(tl.TuningError):
+        scale.step_vector(exact=True)
+
+
+def steps_scale(steps):
+    """Scale with the given steps in cents."""
+    pitches = [sum(steps[: i + 1]) for i in range(len(steps))]
+    tones = "\n".join(f" {x:.6f}" for x in pitches)
+    return tl.parse_scl_data(f"! steps\nsteps\n {len(steps)}\n!\n{tones}\n")
+
+
+@pytest.mark.parametrize(
+    "steps, classification",
+    [
+        ([], tl.StepSizeClass.kStepsEmpty),
+        ([100.0] * 12, tl.StepSizeClass.kStepsEqual),
+        ([200.0, 200.0, 100.0, 200.0, 200.0, 200.0, 100.0], tl.kStepsWellFormed),
+        ([250.0, 350.0, 250.0, 350.0], tl.kStepsMOS),
+        ([250.0, 250.0, 350.0, 350.0], tl.kStepsTwoSizes),
+        ([100.0, 200.0, 300.0, 600.0], tl.kStepsMultiple),
+    ],
+)
+def test_step_size_signature_classification(steps, classification):
+    scale = steps_scale(steps) if steps else tl.Scale()
+    assert tl.step_size_signature(scale)["classification"] == classification
+
+
+def test_step_size_signature():
+    scale = steps_scale([200.0, 200.0, 100.0004, 200.0, 200.0, 200.0, 99.9996])
+    signature = tl.step_size_signature(scale)
+    assert [round(x, 6) for x in signature["sizes"]] == [100.0, 200.0]
+    assert signature["counts"].tolist() == [2, 5]
+    assert signature["classification"] == tl.kStepsWellFormed
+
+    signature = tl.step_size_signature(scale, tolerance=1e-4)
+    assert len(signature["sizes"]) == 3
+    assert signature["classification"] == tl.kStepsMultiple
+
+
+def test_step_size_signatures():
+    scales = [
+        tl.even_division_of_span_by_m(2, 19),
+        tl.Scale(),
+        tl.read_scl_file(DATA_DIR / "test.scl"),
+        steps_scale([200.0, 200.0, 100.0, 200.0, 200.0, 200.0, 100.0]),
+    ]
+    signatures = tl.step_size_signatures(scales)
+    assert signatures["num_sizes"].tolist() == [1, 0, 10, 2]
+    assert signatures["offsets"].tolist() == [0, 1, 1, 11, 13]
+    assert signatures["classification"].tolist() == [
+        tl.kStepsEqual,
+        tl.kStepsEmpty,
+        tl.kStepsMultiple,
+        tl.kStepsWellFormed,
+    ]
+    for i, scale in enumerate(scales):
+        signature = tl.step_size_signature(scale)
+        start, stop = signatures["offsets"][i : i + 2]
+        assert signatures["sizes"][start:stop].tolist() == signature["sizes"].tolist()
+        assert signatures["counts"][start:stop].tolist() == signature["counts"].tolist()
+
+
+def test_step_size_class_compares_with_integers():
+    scales = [tl.even_division_of_span_by_m(2, 12), tl.Scale()]
+    classification = tl.step_size_signatures(scales)["classification"]
+    # Batch results are integer codes, equal to the enum on either side
+    assert classification[0] == tl.kStepsEqual and tl.kStepsEqual == classification[0]
+    assert tl.kStepsEmpty != classification[0] and classification[0] != tl.kStepsEmpty
+    assert (classification == tl.kStepsEqual).tolist() == [True, False]
+    assert (tl.kStepsEqual == classification).tolist() == [True, False]
+    assert int(tl.kStepsEqual) == 1 and tl.kStepsEqual == 1
+    assert tl.kStepsEmpty != tl.Type.kToneCents
+    assert {tl.kStepsMOS: "mos"}[int(tl.kStepsMOS)] == "mos"
+
+
+MAJOR_SCL = "! major.scl\nMajor\n 7\n!\n 9/8\n 5/4\n 4/3\n 3/2\n 5/3\n 15/8\n 2/1\n"
+
+
+def mode_scale(scale, i):
+    """Scale for mode i of scale, with ratio tones."""
+    numerators, denominators = scale.modes(exact=True)
+    tones = [f" {n}/{d}" for n, d in zip(numerators[i], denominators[i])][1:]
+    return tl.parse_scl_data(
+        f"! mode.scl\nMode {i}\n {len(tones)}\n!\n" + "\n".join(tones) + "\n"
+    )
+
+
+def test_content_hash():
+    scale = tl.parse_scl_data(MAJOR_SCL)
+    assert scale.content_hash() == tl.parse_scl_data(MAJOR_SCL).content_hash()
+    reformatted = tl.parse_scl_data(
+        "! other.scl\n! comment\nMajor scale\n7\n18/16\n5/4 comment\n"
+        "4/3\n3/2\n5/3\n15/8\n2/1\n"
+    )
+    assert reformatted.content_hash() == scale.content_hash()
+    assert mode_scale(scale, 1).content_hash() != scale.content_hash()
+    assert tl.Scale().content_hash() == tl.Scale().content_hash()
+    # Cents tones with the same value but different formatting
+    assert (
+        tl.even_temperament_12_note_scale().content_hash()
+        == tl.even_division_of_span_by_m(2, 12).content_hash()
+    )
+
+
+def test_content_hash_ratio_and_cents_differ():
+    ratio = tl.parse_scl_data("! a\na\n 1\n 2/1\n")
+    cents = tl.parse_scl_data("! b\nb\n 1\n 1200.0\n")
+    assert ratio.content_hash() != cents.content_hash()
+    assert ratio.mode_fingerprint() == cents.mode_fingerprint()
+
+
+def test_canonical_steps():
+    scale = tl.parse_scl_data(MAJOR_SCL)
+    steps = scale.canonical_steps()
+    assert steps.tolist() == [111731, 203910, 182404, 111731, 203910, 182404, 203910]
+    assert scale.canonical_steps(resolution=1.0).tolist() == [
+        112, 204, 182, 112, 204, 182, 204
+    ]
+    for i in range(7):
+        assert mode_scale(scale, i).canonical_steps().tolist() == steps.tolist()
+    assert tl.Scale().canonical_steps().tolist() == []
+    with pytest.raises(tl.TuningError):
+        scale.canonical_steps(resolution=0)
+
+
+def test_mode_fingerprint():
+    scale = tl.parse_scl_data(MAJOR_SCL)
+    fingerprint = scale.mode_fingerprint()
+    for i in range(7):
+        assert mode_scale(scale, i).mode_fingerprint() == fingerprint
+    assert tl.even_temperament_12_note_scale().mode_fingerprint() != fingerprint
+    assert (
+        tl.even_division_of_span_by_m(2, 12).mode_fingerprint()
+        == tl.even_temperament_12_note_scale().mode_fingerprint()
+    )
+
+
+def cents_scale(cents):
+    tones = [f" {c:.5f}" for c in cents]
+    return tl.parse_scl_data(
+        f"! cents.scl\nCents\n {len(tones)}\n!\n" + "\n".join(tones) + "\n"
+    )
+
+
+def cents_modes(cents):
+    """Scales for every mode of a scale given by its pitches in cents."""
+    n, period = len(cents), cents[-1]
+    pitches = [0.0, *cents, *(c + period for c in cents)]
+    return [
+        cents_scale(round(pitches[i + k] - pitches[i], 5) for k in range(1, n + 1))
+        for i in range(n)
+    ]
+
+
+def test_mode_fingerprint_cents():
+    modes = cents_modes([100.6, 200.2, 300.0])
+    # Rounding the pitches rather than the steps gave [99, 100, 101] for the
+    # first mode and [99, 101, 100] for the second
+    assert [m.canonical_steps(1.0).tolist() for m in modes] == [[100, 100, 101]] * 3
+    assert tl.scale_equivalence_classes(modes, resolution=1.0).tolist() == [0, 0, 0]
+
+    rng = random.Random(0)
+    for _ in range(50):
+        size = rng.randrange(2, 12)
+        cents = sorted(round(rng.uniform(0, 1200), 5) for _ in range(size))
+        modes = cents_modes([*cents, 1200.0])
+        fingerprints = {m.mode_fingerprint() for m in modes}
+        assert len(fingerprints) == 1
+        assert tl.scale_equivalence_classes(modes).tolist() == [0] * len(modes)
+
+
+def test_scale_equivalence_classes():
+    major = tl.parse_scl_data(MAJOR_SCL)
+    scales = [
+        tl.read_scl_file(DATA_DIR / "test.scl"),
+        major,
+        mode_scale(major, 3),
+        tl.parse_scl_data(MAJOR_SCL),
+        tl.Scale(),
+        tl.Scale(),
+    ]
+    assert tl.scale_equivalence_classes(scales).tolist() == [0, 1, 1, 1, 4, 4]
+    labels = tl.scale_equivalence_classes(scales, mode_invariant=False)
+    assert labels.tolist() == [0, 1, 2, 1, 4, 4]
+    assert tl.scale_equivalence_classes([]).tolist() == []
+
+
+def test_grid_layout():
+    scale = tl.read_scl_file(DATA_DIR / "test.scl")
+    tuning = tl.Tuning(scale)
+    layout = tl.grid_layout(tuning, 4, 5, 2, 3, transpose=1, origin_note=60)
+    for key in ("frequencies", "steps", "labels", "pad_notes"):
+        assert layout[key].shape == (4, 5)
+    for r in range(4):
+        for c in range(5):
+            step = 2 * c + 3 * r + 1
+            assert layout["steps"][r, c] == step
+            assert layout["frequencies"][r, c] == tuning.frequency_for_midi_note(
+                60 + step
+            )
+            assert layout["labels"][r, c] == step % 12
+            assert layout["pad_notes"][r, c] == 5 * r + c
+
+
+def test_grid_layout_note_frequencies():
+    scale = tl.read_scl_file(DATA_DIR / "test.scl")
+    tuning = tl.Tuning(scale, tl.start_scale_on_and_tune_note_to(0, 0, 32.7))
+    layout = tl.grid_layout(tuning, 8, 8, 1, 5, first_note=11, row_stride=10)
+    frequencies = layout["note_frequencies"]
+    assert frequencies.shape == (128,)
+    for n in range(128):
+        # Launchpad side buttons are in column -1 and column 8
+        row, column = divmod(n, 10)
+        step = column - 1 + 5 * (row - 1)
+        assert frequencies[n] == tuning.frequency_for_midi_note(step)
+    assert frequencies[11] == layout["frequencies"][0, 0]
+    assert frequencies[88] == layout["frequencies"][7, 7]
+
+
+def test_grid_layout_unmapped():
+    tuning = tl.Tuning(tl.read_kbm_file(DATA_DIR / "unmapped.kbm"))
+    layout = tl.grid_layout(tuning, 1, 6, 1, 0)
+    labels = layout["labels"][0].tolist()
+    assert labels[3] == -1
+    assert [tuning.is_midi_note_mapped(n) for n in range(6)] == [
+        label >= 0 for label in labels
+    ]
+
+
+def test_grid_layout_invalid():
+    tuning = tl.Tuning()
+    with pytest.raises(tl.TuningError):
+        tl.grid_layout(tuning, -1, 8, 1, 5)
+    with pytest.raises(tl.TuningError):
+        tl.grid_layout(tuning, 8, 8, 1, 5, row_stride=0)
+    assert tl.grid_layout(tuning, 0, 0, 1, 5)["frequencies"].shape == (0, 0)
+
+
+def test_import_keeps_gil_disabled():
+    if not sysconfig.get_config_var("Py_GIL_DISABLED"):
+        pytest.skip("requires a free-threaded interpreter")
+    code = "import sys, tuning_library; sys.exit(sys._is_gil_enabled())"
+    result = subprocess.run([sys.executable, "-c", code])
+    assert result.returncode == 0
+
+
+def test_threaded_shared_objects():
+    scale = tl.read_scl_file(DATA_DIR / "test.scl")
+    mapping = tl.read_kbm_file(DATA_DIR / "test.kbm")
+    tuning = tl.Tuning(scale, mapping)
+    expected = [tuning.frequency_for_midi_note(n) for n in range(128)]
+    scl_text = scale.raw_text.encode()
+    threads = 8
+    barrier = threading.Barrier(threads)
+
+    def work(i):
+        barrier.wait()
+        for _ in range(200):
+            assert [tuning.frequency_for_midi_note(n) for n in range(128)] == expected
+            assert tl.Tuning(scale, mapping).frequency_for_midi_note(i) == expected[i]
+            assert tl.parse_scl_data(scl_text).count == scale.count
+            assert tl.step_size_signature(scale)["counts"].sum() == scale.count
+            assert len(scale.tones) == scale.count
+            tl.set_profiling_enabled(i % 2 == 0)
+        return True
+
+    try:
+        with ThreadPoolExecutor(threads) as executor:
+            assert all(executor.map(work, range(threads)))
+    finally:
+        tl.set_profiling_enabled(False)
+        tl.reset_profiling_stats()
+
+
+def test_import_is_lazy():
+    code = (
+        "import sys, tuning_library as tl\n"
+        "tl.read_scl_file\n"
+        "assert 'numpy' not in sys.modules\n"
+        "assert 'tarfile' not in sys.modules\n"
+        "assert 'JIIndex' in dir(tl)\n"
+        "tl.JIIndex\n"
+        "assert 'numpy' in sys.modules\n"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def test_lazy_attributes():
+    from tuning_library import JIIndex, iter_scl_archive
+
+    assert JIIndex is tl.ji.JIIndex
+    assert iter_scl_archive is tl.archive.iter_scl_archive
+    with pytest.raises(AttributeError):
+        tl.not_an_attribute
+
+
+def assert_same_generated_scale(a, b):
+    assert (a.name, a.description, a.count) == (b.name, b.description, b.count)
+    assert [
+        (t.type, t.cents, t.ratio_n, t.ratio_d, t.string_rep, t.float_value, t.lineno)
+        for t in a.tones
+    ] == [
+        (t.type, t.cents, t.ratio_n, t.ratio_d, t.string_rep, t.float_value, t.lineno)
+        for t in b.tones
+    ]
+
+
+def assert_same_generated_mapping(a, b):
+    for attr in (
+        "name",
+        "count",
+        "first_midi",
+        "last_midi",
+        "middle_note",
+        "tuning_constant_note",
+        "tuning_frequency",
+        "tuning_pitch",
+        "octave_degrees",
+        "keys",
+    ):
+        assert getattr(a, attr) == getattr(b, attr)
+
+
+@pytest.mark.parametrize("span", [2, 3, 7])
+def test_even_divisions_of_span_by_m(span):
+    ms = list(range(1, 200))
+    scales = tl.even_divisions_of_span_by_m(span, ms)
+    assert len(scales) == len(ms)
+    for scale, m in zip(scales, ms):
+        expected = tl.even_division_of_span_by_m(span, m)
+        assert_same_generated_scale(scale, expected)
+        assert scale.raw_text == ""
+    (scale,) = tl.even_divisions_of_span_by_m([span], 12, raw_text=True)
+    assert scale.raw_text == tl.even_division_of_span_by_m(span, 12).raw_text
+
+
+@pytest.mark.parametrize("cents", [1200, 1901.955, 0.5, 3.3e-5, 1e7])
+def test_even_divisions_of_cents_by_m(cents):
+    ms = list(range(1, 100))
+    for scale, m in zip(tl.even_divisions_of_cents_by_m(cents, ms), ms):
+        assert_same_generated_scale(scale, tl.even_division_of_cents_by_m(cents, m))
+
+
+def test_tune_notes_to():
+    freqs = [1.0, 261.6255653005986, 440.123456789, 1000.5, 19999.99]
+    notes = [0, 60, 69, 127]
+    for note in notes:
+        mappings = tl.tune_notes_to(note, freqs)
+        for mapping, freq in zip(mappings, freqs):
+            assert_same_generated_mapping(mapping, tl.tune_note_to(note, freq))
+            assert mapping.raw_text == ""
+    mappings = tl.start_scales_on_and_tune_notes_to(range(128), notes[2], 440.0)
+    for start, mapping in enumerate(mappings):
+        expected = tl.start_scale_on_and_tune_note_to(start, 69, 440.0)
+        assert_same_generated_mapping(mapping, expected)
+    (mapping,) = tl.tune_notes_to([69], 432.1, raw_text=True)
+    assert mapping.raw_text == tl.tune_note_to(69, 432.1).raw_text
+
+
+@pytest.fixture
+def decimal_comma_locale():
+    previous = locale.setlocale(locale.LC_NUMERIC)
+    for name in ("de_DE.UTF-8", "de_DE.utf8", "de_DE", "fr_FR.UTF-8", "fr_FR.utf8"):
+        try:
+            locale.setlocale(locale.LC_NUMERIC, name)
+        except locale.Error:
+            continue
+        yield
+        locale.setlocale(locale.LC_NUMERIC, previous)
+        return
+    pytest.skip("No locale with a decimal comma")
+
+
+def test_batch_generators_ignore_locale(decimal_comma_locale):
+    assert locale.localeconv()["decimal_point"] == ","
+    for scale, m in zip(tl.even_divisions_of_cents_by_m(1901.955, [5, 12]), [5, 12]):
+        assert_same_generated_scale(scale, tl.even_division_of_cents_by_m(1901.955, m))
+        assert all(tone.type == tl.Type.kToneCents for tone in scale.tones)
+    (mapping,) = tl.tune_notes_to(69, [432.1])
+    assert_same_generated_mapping(mapping, tl.tune_note_to(69, 432.1))
+    assert mapping.tuning_frequency == 432.1
+
+
+def test_batch_generator_errors():
+    with pytest.raises(tl.TuningError, match="Span should be a positive number"):
+        tl.even_divisions_of_span_by_m([2, 0], 12)
+    with pytest.raises(tl.TuningError, match="broadcast"):
+        tl.even_divisions_of_span_by_m([2, 3], [5, 7, 12])
+    # Errors are the same as for the single mapping, e.g. for a negative note
+    with pytest.raises(tl.TuningError) as batch_error:
+        tl.tune_notes_to([60, -1], 440.0)
+    with pytest.raises(tl.TuningError) as single_error:
+        tl.tune_note_to(-1, 440.0)
+    assert str(batch_error.value) == str(single_error.value)
+    assert tl.even_divisions_of_cents_by_m([], 12) == []
+
+
+def test_tuning_frequencies():
+    scales = tl.even_divisions_of_span_by_m(2, [5, 12, 31])
+    mappings = tl.tune_notes_to(69, [440.0, 432.0, 415.0])
+    frequencies = tl.tuning_frequencies(scales, mappings)
+    assert frequencies.shape == (3, 128)
+    for row, scale, mapping in zip(frequencies, scales, mappings):
+        tuning = tl.Tuning(scale, mapping)
+        assert row.tolist() == [tuning.frequency_for_midi_note(n) for n in range(128)]
+    default = tl.tuning_frequencies(scales)
+    assert default[1].tolist() == [
+        tl.Tuning(scales[1]).frequency_for_midi_note(n) for n in range(128)
+    ]
+    single = tl.tuning_frequencies(scales[:1], mappings)
+    assert single.shape == (3, 128)
+    assert single[2].tolist() == [
+        tl.Tuning(scales[0], mappings[2]).frequency_for_midi_note(n) for n in range(128)
+    ]
+    assert tl.tuning_frequencies([]).shape == (0, 128)
+    with pytest.raises(tl.TuningError):
+        tl.tuning_frequencies(scales, mappings[:2])
+
+
+def cent_differences(reference, tuning, notes=range(128)):
+    return [
+        1200
+        * (
+            tuning.log_scaled_frequency_for_midi_note(n)
+            - reference.log_scaled_frequency_for_midi_note(n)
+        )
+        for n in notes
+    ]
+
+
+def test_tuning_deviations():
+    reference = tl.Tuning(tl.even_temperament_12_note_scale())
+    tunings = [tl.Tuning(s) for s in tl.even_divisions_of_span_by_m(2, [12, 19, 24])]
+    deviations = tl.tuning_deviations(reference, tunings, 48, 72)
+    assert deviations["count"].tolist() == [25, 25, 25]
+    for i, tuning in enumerate(tunings):
+        diffs = [abs(d) for d in cent_differences(reference, tuning, range(48, 73))]
+        assert deviations["max"][i] == pytest.approx(max(diffs))
+        assert deviations["mean_abs"][i] == pytest.approx(sum(diffs) / len(diffs))
+        rms = math.sqrt(sum(d * d for d in diffs) / len(diffs))
+        assert deviations["rms"][i] == pytest.approx(rms)
+    assert deviations["max"][0] == 0
+    assert tl.tuning_deviations(reference, [])["rms"].shape == (0,)
+
+
+def test_tuning_deviations_octave_equivalent():
+    scale = tl.even_temperament_12_note_scale()
+    reference = tl.Tuning(scale)
+    octave_up = tl.Tuning(scale, tl.tune_note_to(69, 880.0))
+    deviations = tl.tuning_deviations(reference, [octave_up])
+    assert deviations["max"][0] == pytest.approx(1200)
+    deviations = tl.tuning_deviations(reference, [octave_up], octave_equivalent=True)
+    assert deviations["max"][0] == pytest.approx(0, abs=1e-9)
+
+
+def test_tuning_deviations_octave_equivalent_one_transposition():
+    # The second degree is 1100 cents sharp, and the tuning an octave up
+    reference = tl.Tuning(tl.even_temperament_12_note_scale())
+    tones = ["1200.0", *(f"{100 * k}.0" for k in range(2, 12)), "2/1"]
+    scale = tl.parse_scl_data("! s.scl\ns\n 12\n!\n" + "\n".join(tones) + "\n")
+    for frequency in (440.0, 880.0):
+        tuning = tl.Tuning(scale, tl.tune_note_to(69, frequency))
+        deviations = tl.tuning_deviations(reference, [tuning], octave_equivalent=True)
+        diffs = {round(d) % 1200 for d in cent_differences(reference, tuning)}
+        assert sorted(diffs) == [0, 1100]
+        assert deviations["max"][0] == pytest.approx(1100)
+        matrix = tl.tuning_deviation_matrix([reference, tuning], octave_equivalent=True)
+        assert matrix["max"][0, 1] == matrix["max"][1, 0] == pytest.approx(1100)
+
+
+def test_tuning_deviations_unmapped():
+    scale = tl.read_scl_file(DATA_DIR / "test.scl")
+    reference = tl.Tuning(scale)
+    unmapped = tl.Tuning(scale, tl.read_kbm_file(DATA_DIR / "unmapped.kbm"))
+    mapped = [n for n in range(128) if unmapped.is_midi_note_mapped(n)]
+    skipped = tl.tuning_deviations(reference, [unmapped])
+    assert skipped["count"][0] == len(mapped) < 128
+    diffs = [abs(d) for d in cent_differences(reference, unmapped, mapped)]
+    assert skipped["max"][0] == pytest.approx(max(diffs))
+    assert tl.tuning_deviations(reference, [unmapped], skip_unmapped=False)["count"][0] == 128
+
+
+def test_tuning_deviations_errors():
+    reference = tl.Tuning()
+    with pytest.raises(tl.TuningError, match="Note range"):
+        tl.tuning_deviations(reference, [reference], 60, 59)
+    with pytest.raises(tl.TuningError, match="Note range"):
+        tl.tuning_deviation_matrix([reference], last_note=128)
+
+
+@pytest.mark.parametrize("threads", [0, 1, 3])
+def test_tuning_deviation_matrix(threads):
+    tunings = [tl.Tuning(s) for s in tl.even_divisions_of_span_by_m(2, range(5, 25))]
+    matrix = tl.tuning_deviation_matrix(tunings, threads=threads)
+    assert matrix["rms"].shape == (20, 20)
+    assert (matrix["rms"] == matrix["rms"].T).all()
+    assert (matrix["max"].diagonal() == 0).all()
+    for i in (0, 7, 19):
+        row = tl.tuning_deviations(tunings[i], tunings)
+        for key in ("max", "rms", "mean_abs", "count"):
+            assert matrix[key][i].tolist() == row[key].tolist()
+
+    others = tunings[:3]
+    rectangular = tl.tuning_deviation_matrix(tunings, others, threads=threads)
+    assert rectangular["mean_abs"].shape == (20, 3)
+    assert rectangular["mean_abs"][:3].tolist() == matrix["mean_abs"][:3, :3].tolist()
+    assert tl.tuning_deviation_matrix([])["max"].shape == (0, 0)
+
+
+def midi_frequencies(tuning):
+    return [tuning.frequency_for_midi_note(n) for n in range(128)]
+
+
+def test_tuning_bank():
+    tunings = [tl.Tuning(s) for s in tl.even_divisions_of_span_by_m(2, [12, 19, 31])]
+    bank = tl.TuningBank(tunings)
+    assert len(bank) == 3
+    assert repr(bank) == "TuningBank(size=3)"
+    table = bank.frequency_table
+    assert table.shape == (3, 128)
+    for slot, tuning in enumerate(tunings):
+        assert table[slot].tolist() == midi_frequencies(tuning)
+        assert bank[slot].frequency_for_midi_note(61) == tuning.frequency_for_midi_note(61)
+        assert bank.cents_table[slot, 61] == pytest.approx(
+            1200 * tuning.log_scaled_frequency_for_midi_note(61)
+        )
+    assert tl.TuningBank().frequency_table.shape == (16, 128)
+    assert tl.TuningBank(2).frequency_table[1].tolist() == midi_frequencies(tl.Tuning())
+
+
+def test_tuning_bank_lookup():
+    tunings = [tl.Tuning(s) for s in tl.even_divisions_of_span_by_m(2, [12, 19, 31])]
+    bank = tl.TuningBank(tunings)
+    slots, notes = [0, 2, 1, 2], [60, 61, 0, 127]
+    assert bank.frequencies(slots, notes).tolist() == [
+        tunings[s].frequency_for_midi_note(n) for s, n in zip(slots, notes)
+    ]
+    assert bank.cents(slots, notes).tolist() == bank.cents_table[slots, notes].tolist()
+    assert bank.frequencies(1, range(128)).tolist() == midi_frequencies(tunings[1])
+    assert bank.frequencies([0, 1, 2], 69).tolist() == bank.frequency_table[:, 69].tolist()
+    assert bank.frequencies([], 60).tolist() == []
+    with pytest.raises(tl.TuningError, match="Slot"):
+        bank.frequencies([3], [60])
+    with pytest.raises(tl.TuningError, match="between 0 and 127"):
+        bank.cents([0], [128])
+    with pytest.raises(tl.TuningError, match="broadcast"):
+        bank.frequencies([0, 1], [60, 61, 62])
+
+
+def test_tuning_bank_swap():
+    bank = tl.TuningBank(2)
+    table, versions = bank.frequency_table, bank.versions
+    new = tl.Tuning(tl.even_division_of_span_by_m(2, 19))
+    old = bank.swap(1, new)
+    assert midi_frequencies(old) == midi_frequencies(tl.Tuning())
+    # The views share the bank's memory
+    assert table[1].tolist() == midi_frequencies(new)
+    assert versions.tolist() == [0, 2]
+    bank[0] = new
+    assert bank.frequency_table[0].tolist() == midi_frequencies(new)
+    assert versions.tolist() == [2, 2]
+    with pytest.raises(IndexError):
+        bank[2] = new
+    with pytest.raises(IndexError):
+        bank[-1]
+    with pytest.raises(tl.TuningError, match="Slot"):
+        bank.swap(2, new)
+    with pytest.raises(ValueError):
+        table[0, 0] = 1.0
+    with pytest.raises(tl.TuningError, match="at least one slot"):
+        tl.TuningBank([])
+
+
+def test_tuning_bank_buffer():
+    bank = tl.TuningBank(3)
+    view = memoryview(bank)
+    assert view.readonly
+    assert view.shape == (3, 128)
+    assert view.format == "d"
+    bank[2] = tl.Tuning(tl.even_division_of_span_by_m(2, 7))
+    assert view[2, 60] == bank.frequency_table[2, 60]
+
+
+def test_tuning_bank_threaded_swaps():
+    tunings = [tl.Tuning(s) for s in tl.even_divisions_of_span_by_m(2, [12, 19])]
+    rows = [midi_frequencies(t) for t in tunings]
+    bank = tl.TuningBank(tunings[:1] * 4)
+    stop = threading.Event()
+
+    def retune():
+        i = 0
+        while not stop.is_set():
+            bank.swap(i % 4, tunings[i % 2])
+            i += 1
+
+    thread = threading.Thread(target=retune)
+    thread.start()
+    try:
+        notes = list(range(128))
+        for _ in range(500):
+            assert bank.frequencies(3, notes).tolist() in rows
+    finally:
+        stop.set()
+        thread.join()
@@ -0,0 +1,178 @@
+"""
+Tests for tuning_library.watch
+"""
+
+import time
+from pathlib import Path
+
+import pytest
+
+import tuning_library as tl
+
+DATA_DIR = Path(__file__).parent / "data"
+
+
+def write_edo(path, m):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(tl.even_division_of_span_by_m(2, m).raw_text)
+
+
+@pytest.fixture
+def directory(tmp_path):
+    write_edo(tmp_path / "12.scl", 12)
+    write_edo(tmp_path / "sub" / "19.scl", 19)
+    (tmp_path / "test.kbm").write_bytes((DATA_DIR / "test.kbm").read_bytes())
+    (tmp_path / "notes.txt").write_text("not a scale")
+    return tmp_path
+
+
+def test_initial_refresh(directory):
+    watcher = tl.DirectoryWatcher(directory)
+    changes = watcher.refresh()
+    assert sorted(changes.added) == sorted(
+        str(directory / p) for p in ("12.scl", "sub/19.scl", "test.kbm")
+    )
+    assert changes.modified == {} and changes.removed == [] and changes.errors == {}
+    assert watcher.scales[str(directory / "12.scl")].count == 12
+    assert watcher.mappings[str(directory / "test.kbm")].count == 12
+    assert not any(watcher.refresh())
+
+
+@pytest.mark.parametrize("workers", [None, 4])
+def test_changes(directory, workers):
+    watcher = tl.DirectoryWatcher(directory, workers=workers)
+    watcher.refresh()
+    write_edo(directory / "12.scl", 24)
+    write_edo(directory / "new" / "31.scl", 31)
+    (directory / "sub" / "19.scl").unlink()
+    changes = watcher.refresh()
+    assert list(changes.added) == [str(directory / "new" / "31.scl")]
+    assert list(changes.modified) == [str(directory / "12.scl")]
+    assert changes.removed == [str(directory / "sub" / "19.scl")]
+    assert watcher.scales[str(directory / "12.scl")].count == 24
+    assert str(directory / "sub" / "19.scl") not in watcher.scales
+
+
+def test_errors(directory):
+    watcher = tl.DirectoryWatcher(directory, suffixes=[".scl"])
+    watcher.refresh()
+    assert watcher.mappings == {}
+    bad = directory / "12.scl"
+    bad.write_text("! bad.scl\nbad\n 0\n")
+    changes = watcher.refresh()
+    assert list(changes.errors) == [str(bad)]
+    assert changes.removed == [str(bad)]
+    assert str(bad) in watcher.errors and str(bad) not in watcher.scales
+    write_edo(bad, 12)
+    changes = watcher.refresh()
+    assert list(changes.added) == [str(bad)]
+    assert watcher.errors == {}
+
+
+def test_attached_index(directory):
+    watcher = tl.DirectoryWatcher(directory)
+    watcher.refresh()
+    index = watcher.attach(tl.JIIndex())
+    assert len(index) == 2
+    assert index.containing("2/1").tolist() == [0, 1]
+
+    ji = directory / "ji.scl"
+    ji.write_text("! ji.scl\nji\n 3\n!\n 5/4\n 3/2\n 2/1\n")
+    watcher.refresh()
+    assert index.within_prime_limit(5).tolist() == [2]
+    ji.write_text("! ji.scl\nji\n 3\n!\n 7/4\n 3/2\n 2/1\n")
+    watcher.refresh()
+    # The modified scale is replaced in place
+    assert index.within_prime_limit(5).tolist() == []
+    assert index.within_prime_limit(7).tolist() == [2]
+    assert index.containing("7/4").tolist() == [2]
+    ji.unlink()
+    watcher.refresh()
+    assert index.containing("7/4").tolist() == []
+    assert len(index) == 2
+
+
+def test_listener_and_background(directory):
+    watcher = tl.DirectoryWatcher(directory)
+    seen = []
+    watcher.add_listener(seen.append)
+    watcher.start(interval=0.01)
+    try:
+        deadline = time.monotonic() + 5
+        while not seen and time.monotonic() < deadline:
+            time.sleep(0.01)
+        write_edo(directory / "5.scl", 5)
+        while len(seen) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        watcher.stop()
+    assert len(seen[0].added) == 3
+    assert list(seen[1].added) == [str(directory / "5.scl")]
+
+
+def test_evicts_cached_tunings(directory):
+    serve = pytest.importorskip("tuning_library.serve")
+    cache = serve.TuningCache()
+    source = (serve.SOURCE_FILE, str(directory / "12.scl").encode())
+    default = (serve.SOURCE_DEFAULT, b"")
+
+    async def load():
+        return await cache.get(source, default)
+
+    import asyncio
+
+    asyncio.run(load())
+    assert len(cache) == 1
+    watcher = tl.DirectoryWatcher(directory)
+    watcher.refresh()
+    watcher.add_listener(lambda c: cache.evict([*c.modified, *c.removed]))
+    write_edo(directory / "12.scl", 13)
+    watcher.refresh()
+    assert len(cache) == 0
+
+
+def test_symlink_loop(directory):
+    (directory / "sub" / "loop").symlink_to(directory, target_is_directory=True)
+    (directory / "linked").symlink_to(directory / "sub", target_is_directory=True)
+    watcher = tl.DirectoryWatcher(directory)
+    changes = watcher.refresh()
+    # Each directory is scanned once, through whichever path is found first
+    assert len(changes.added) == 3
+    assert sorted(s.count for s in watcher.scales.values()) == [12, 19]
+
+
+def test_failing_listener(directory, caplog):
+    watcher = tl.DirectoryWatcher(directory)
+    seen = []
+
+    def fail(changes):
+        raise RuntimeError("listener failed")
+
+    watcher.add_listener(fail)
+    watcher.add_listener(seen.append)
+    watcher.start(interval=0.01)
+    try:
+        deadline = time.monotonic() + 5
+        while not seen and time.monotonic() < deadline:
+            time.sleep(0.01)
+        write_edo(directory / "5.scl", 5)
+        while len(seen) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        watcher.stop()
+    assert list(seen[1].added) == [str(directory / "5.scl")]
+    assert "listener failed" in caplog.text
+
+
+def test_repeated_edits_keep_index_bounded(directory):
+    watcher = tl.DirectoryWatcher(directory)
+    watcher.refresh()
+    index = watcher.attach(tl.JIIndex())
+    scale = directory / "edited.scl"
+    for k in range(600):
+        scale.write_text(f"! edited.scl\nedited\n 2\n!\n {k + 3}/{k + 2}\n 2/1\n")
+        watcher.refresh()
+        assert index.containing(f"{k + 3}/{k + 2}").tolist() == [2]
+    assert len(index) == len(index.scales) == 3
+    assert len(index.monzos) < 1200
+    assert len(index._ratios) < 1200